@@ -0,0 +1,24 @@
+from pathlib import Path
+
+import pytest
+from loguru import logger
+
+RESOURCES = Path(__file__).parent.parent / "tests" / "resources"
+
+
+@pytest.fixture(autouse=True, scope="module")
+def disable_logging():
+    # time the code rather than writing log messages
+    logger.disable("bbc_meet_spotify")
+    yield
+    logger.enable("bbc_meet_spotify")
+
+
+def synthetic_pairs(count: int) -> list:
+    """
+    Raw artist and title pairs in the formats found on BBC pages
+    :param count: number of pairs
+    :return: list of (artist, title)
+    """
+    return [(f"Artist {index} & The Band", f"Song Title {index} (feat. Someone É'lse) [Radio Edit]")
+            for index in range(count)]
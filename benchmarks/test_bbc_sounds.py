@@ -0,0 +1,21 @@
+from unittest.mock import patch
+
+from bbc_meet_spotify import BBCSounds, music
+from bbc_meet_spotify.music import Music
+
+from .conftest import RESOURCES, synthetic_pairs
+
+HISTORY_SIZE = 50000
+SCRAPED_SIZE = 5000
+
+
+def test_get_music_dedup_against_large_history(benchmark, tmp_path):
+    bbc_sounds = BBCSounds("six_music", False, "benchmark", RESOURCES / "test_playlists.toml", history_dir=tmp_path)
+    bbc_sounds.get_playlist_history().add_music(Music(artist, title) for artist, title in synthetic_pairs(HISTORY_SIZE))
+    # newest songs are in the history, with repeats as songs are played again
+    scraped = synthetic_pairs(HISTORY_SIZE + SCRAPED_SIZE // 2)[-SCRAPED_SIZE // 2:] * 2
+
+    with patch.object(bbc_sounds.scraper, "scrape_bbc_sounds", return_value=scraped):
+        new_music = benchmark.pedantic(bbc_sounds.get_music, setup=music._cleaned_strings.clear, rounds=20)
+
+    assert len(new_music) == SCRAPED_SIZE // 2
@@ -0,0 +1,27 @@
+from bbc_meet_spotify import music
+from bbc_meet_spotify.music import Music
+
+from .conftest import synthetic_pairs
+
+STRINGS = [string for pair in synthetic_pairs(5000) for string in pair]
+
+
+def _clean_all():
+    return [Music.clean_string(string) for string in STRINGS]
+
+
+def test_clean_string_uncached(benchmark):
+    cleaned = benchmark.pedantic(_clean_all, setup=music._cleaned_strings.clear, rounds=20)
+    assert len(cleaned) == len(STRINGS)
+
+
+def test_clean_string_cached(benchmark):
+    _clean_all()
+    cleaned = benchmark(_clean_all)
+    assert len(cleaned) == len(STRINGS)
+
+
+def test_clean_pairs_uncached(benchmark):
+    pairs = synthetic_pairs(5000)
+    cleaned = benchmark.pedantic(Music.clean_pairs, args=(pairs,), setup=music._cleaned_strings.clear, rounds=20)
+    assert len(cleaned) == len(pairs)
@@ -0,0 +1,45 @@
+from unittest.mock import patch
+
+from bbc_meet_spotify.bbc_sounds import AlbumScraper, PlaylistScraper, ScraperBase, ShowScraper
+
+from .conftest import RESOURCES
+
+SHOW_PAGES = {
+    "https://www.bbc.co.uk/programmes/m000qx9p": RESOURCES / "dance-party-2021_1.html",
+    "https://www.bbc.co.uk/programmes/m000r53r": RESOURCES / "dance-party-2021_2.html",
+    "https://www.bbc.co.uk/programmes/m000rcd4": RESOURCES / "dance-party-2021_no-songs.html",
+    "https://www.bbc.co.uk/programmes/b006wqdc/episodes/guide": RESOURCES / "dance-party-2021_episodes_1.html",
+    "https://www.bbc.co.uk/programmes/b006wqdc/episodes/guide?page=2": RESOURCES / "dance-party-2021_episodes_2.html",
+}
+SHOW_URL = "https://www.bbc.co.uk/programmes/m000qx9p"
+# read pages up front so that only parsing is timed
+PAGES = {url: path.read_text() for url, path in SHOW_PAGES.items()}
+PAGES["6music"] = (RESOURCES / "bbc_sounds_6music.html").read_text()
+
+
+def test_playlist_scraper(benchmark):
+    with patch.object(ScraperBase, "read_page", side_effect=PAGES.get):
+        songs = benchmark(PlaylistScraper().scrape_bbc_sounds, "6music", [])
+    assert songs
+
+
+def test_album_scraper(benchmark):
+    with patch.object(ScraperBase, "read_page", side_effect=PAGES.get):
+        albums = benchmark(AlbumScraper().scrape_bbc_sounds, "6music", [])
+    assert albums
+
+
+def test_show_scraper(benchmark):
+    with patch.object(ScraperBase, "read_page", side_effect=PAGES.get):
+        # new scraper each round, as a scraper doesn't parse an episode twice
+        songs = benchmark.pedantic(lambda scraper: scraper.scrape_bbc_sounds(SHOW_URL, []),
+                                   setup=lambda: ((ShowScraper(),), {}), rounds=20)
+    assert len(songs) == 137
+
+
+def test_show_scraper_parse_processes(benchmark):
+    with patch.object(ScraperBase, "read_page", side_effect=PAGES.get):
+        # includes starting the parse processes, which a backfill of many episodes would make up for
+        songs = benchmark.pedantic(lambda scraper: scraper.scrape_bbc_sounds(SHOW_URL, []),
+                                   setup=lambda: ((ShowScraper(parse_processes=2),), {}), rounds=5)
+    assert len(songs) == 137
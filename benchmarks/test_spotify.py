@@ -0,0 +1,39 @@
+import json
+from unittest.mock import patch
+
+from bbc_meet_spotify import Spotify
+from bbc_meet_spotify.music import Music
+from bbc_meet_spotify.spotipy_client import SpotipyClient
+
+from .conftest import RESOURCES
+
+# the canned search results are songs by "string"
+SONGS = [Music(f"string {index}", "title") for index in range(500)]
+SEARCH_RESULTS = json.loads((RESOURCES / "spotipy" / "input" / "search.json").read_text())
+
+
+@patch("bbc_meet_spotify.spotipy_client.SpotifyOAuth")
+@patch("bbc_meet_spotify.spotipy_client.spotipy.Spotify")
+def test_get_song_ids_uncached(mock_spotify_client, mock_auth_manager, benchmark):
+    mock_spotify_client.return_value.search.return_value = SEARCH_RESULTS
+
+    def new_spotify():
+        with patch("bbc_meet_spotify.spotify.SpotipyClient"):
+            spotify = Spotify(max_workers=8)
+        # no rate limit, so that only our own overhead is timed
+        spotify.spotipy_client = SpotipyClient(RESOURCES / "config.toml", requests_per_second=1e9)
+        return (spotify,), {}
+
+    song_ids = benchmark.pedantic(lambda spotify: spotify._get_song_ids(SONGS), setup=new_spotify, rounds=20)
+    assert len(song_ids) == len(SONGS)
+
+
+@patch("bbc_meet_spotify.spotify.SpotipyClient")
+def test_get_song_ids_cached(mock_spotipy_client, benchmark):
+    spotify = Spotify(max_workers=8)
+    for index, song in enumerate(SONGS):
+        spotify.search_cache.set(song, str(index))
+
+    song_ids = benchmark(spotify._get_song_ids, SONGS)
+    assert len(song_ids) == len(SONGS)
+    mock_spotipy_client.return_value.get_song.assert_not_called()
@@ -0,0 +1,42 @@
+from unittest.mock import patch
+
+import pytest
+
+from bbc_meet_spotify import Spotify, SpotipyClient
+from bbc_meet_spotify.music import Music
+from tests.fake_spotify import FakeSpotifyCatalog, FakeSpotifyServer
+
+SONGS = [Music(f"artist {index // 20}", f"title {index}") for index in range(300)]
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    return FakeSpotifyCatalog(100000, playlists=200)
+
+
+def _add_songs(config, max_workers: int) -> Spotify:
+    with patch("bbc_meet_spotify.spotify.SpotipyClient"):
+        spotify = Spotify(max_workers=max_workers)
+    spotify.spotipy_client = SpotipyClient(config, requests_per_second=1000)
+    spotify.add_songs("benchmark", SONGS, add_date_prefix=False)
+    return spotify
+
+
+@pytest.mark.parametrize("max_workers", [1, 8])
+def test_add_songs_with_latency(benchmark, catalog, tmp_path, max_workers):
+    with FakeSpotifyServer(catalog, latency=0.005) as fake_spotify:
+        config = tmp_path / "config.toml"
+        config.write_text(f'api_url = "{fake_spotify.url}"\n')
+        spotify = benchmark.pedantic(_add_songs, args=(config, max_workers), rounds=3)
+
+    assert spotify.music_not_found == []
+
+
+def test_add_songs_when_rate_limited(benchmark, catalog, tmp_path):
+    with FakeSpotifyServer(catalog, latency=0.005, rate_limit_every=25, retry_after=0) as fake_spotify:
+        config = tmp_path / "config.toml"
+        config.write_text(f'api_url = "{fake_spotify.url}"\n')
+        spotify = benchmark.pedantic(_add_songs, args=(config, 8), rounds=3)
+
+    assert spotify.music_not_found == []
+    assert fake_spotify.rate_limited > 0
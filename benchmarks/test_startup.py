@@ -0,0 +1,23 @@
+import subprocess
+import sys
+from pathlib import Path
+
+# schedulers can launch the tool many times an hour, so --help and --version have to stay fast
+STARTUP_BUDGET_SECONDS = 0.5
+
+
+def _run_console(*args: str):
+    subprocess.run([sys.executable, "-m", "bbc_meet_spotify.console", *args], check=True,
+                   stdout=subprocess.DEVNULL, cwd=Path(__file__).parent.parent)
+
+
+def test_version_startup(benchmark):
+    benchmark.pedantic(_run_console, args=("--version",), rounds=10)
+    if benchmark.stats:
+        assert benchmark.stats.stats.min < STARTUP_BUDGET_SECONDS
+
+
+def test_help_startup(benchmark):
+    benchmark.pedantic(_run_console, args=("--help",), rounds=10)
+    if benchmark.stats:
+        assert benchmark.stats.stats.min < STARTUP_BUDGET_SECONDS
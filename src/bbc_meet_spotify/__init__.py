@@ -1,6 +1,21 @@
-from .bbc_sounds import BBCSounds
-from .spotify import Spotify
-from .spotipy_client import SpotipyClient
-from .music_not_found import MusicNotFoundError
+from importlib import import_module
 
-__version__ = "0.1.0"
\ No newline at end of file
+__version__ = "0.1.0"
+
+# imported when first used, so that the command line starts without loading spotipy, requests and beautiful soup
+_LAZY_IMPORTS = {
+    "BBCSounds": ".bbc_sounds",
+    "Spotify": ".spotify",
+    "SpotipyClient": ".spotipy_client",
+    "MusicNotFoundError": ".music_not_found",
+}
+
+
+def __getattr__(name: str):
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(import_module(_LAZY_IMPORTS[name], __name__), name)
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_IMPORTS))
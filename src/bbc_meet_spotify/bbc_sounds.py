@@ -1,36 +1,52 @@
+import hashlib
 import itertools
-from collections import defaultdict
+import json
+import re
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import get_context
 from pathlib import Path
-from typing import Dict, List, Set, Tuple, Union
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
+from urllib.parse import urljoin, urlparse
 
-import requests
-import toml
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, NavigableString, SoupStrainer, Tag
+from bs4.builder import builder_registry
 from loguru import logger
 from ordered_set import OrderedSet
 
+from .http_session import get_session
+from .metrics import get_metrics
 from .music import Music
+from .paths import HISTORY_DIR, PLAYLISTS_PATH, PROJECT_ROOT
+from .playlist_history import PlaylistHistory
+from .playlist_parsing import ParserChoices, load_playlists
 
 
 class BBCSounds:
     def __init__(self, playlist_key: str, date_prefix: bool, playlist_name: str = None,
-                 toml_path: Path = Path("./bbc_playlists.toml"), history_dir: Path = Path("./playlist_history")):
+                 toml_path: Path = PLAYLISTS_PATH, history_dir: Path = HISTORY_DIR,
+                 parser: str = "html.parser", parse_processes: int = 0):
         self.history_dir = history_dir
         self.playlist = self.get_playlist_info(playlist_key, toml_path)
         self.url = self.playlist["url"]
         self.type = self.playlist["type"]
         self.date_prefix = date_prefix
         self.playlist_suffix = self.get_playlist_suffix(self.playlist, playlist_name)
-        self.scraper = self.get_scraper_type(self.type)
+        self.scraper = self.get_scraper_type(self.type, parser, parse_processes)
+        self._history = None
+        self._history_date: Optional[str] = None
+        # music scraped for the page fingerprint, used by the next sync rather than fetching the page again
+        self._scraped: Optional[List[Tuple[str, str]]] = None
 
     @staticmethod
-    def get_scraper_type(playlist_type: str):
+    def get_scraper_type(playlist_type: str, parser: str = "html.parser", parse_processes: int = 0):
         if playlist_type == "playlist":
-            return PlaylistScraper()
+            return PlaylistScraper(parser)
         elif playlist_type == "show":
-            return ShowScraper()
+            return ShowScraper(parser, parse_processes=parse_processes)
         elif playlist_type == "album":
-            return AlbumScraper()
+            return AlbumScraper(parser)
 
     @staticmethod
     def get_playlist_suffix(playlist: dict, playlist_name: str) -> str:
@@ -47,90 +63,334 @@ class BBCSounds:
         :param playlist_key: key in the toml file
         :return: dictionary of url and verbose name for the playlist
         """
-        playlists = toml.load(toml_path)
+        playlists = load_playlists(toml_path)
         if playlist_key:
             playlists = playlists[playlist_key]
         return playlists
 
     def get_music(self) -> Set[Music]:
-        previous_music = self._get_playlist_history(self._get_playlist_history_path())
+        return OrderedSet(itertools.chain.from_iterable(self.iter_music()))
 
-        # get all bbc sounds music
-        current_music = self.scraper.scrape_bbc_sounds(self.url, previous_music["_parsed_shows"])
-
-        # remove songs/albums which have already been seen in previous versions of bbc sounds
-        new_music = OrderedSet(Music(artist, title)
-                               for artist, title in current_music
-                               if Music.clean_string(title) not in previous_music[Music.clean_string(artist)])
+    def iter_music(self) -> Iterator[List[Music]]:
+        """
+        Get new music in batches as it is scraped, e.g. each episode of a show
+        :return: batches of music which aren't in the playlist history or an earlier batch
+        """
+        if self._history_date != self._get_playlist_date():
+            # a watcher keeps syncing with the same instance, and each day's playlist starts with an empty history
+            self._history = None
+        history = self.get_playlist_history()
+        self.scraper.resume_crawl(history)
+        seen = set()
+        for current_music in self._iter_scraped(history.get_parsed_shows()):
+            # remove songs/albums which have already been seen in previous versions of bbc sounds
+            new_music = OrderedSet(Music._from_clean(artist, title)
+                                   for artist, title in Music.clean_pairs(current_music)
+                                   if not history.contains(artist, title))
+            new_music = [music for music in new_music if music not in seen]
+            seen.update(new_music)
+            if new_music:
+                yield new_music
+
+    def get_current_music(self) -> List[Music]:
+        """
+        Get all music on the bbc sounds page, including music already in the playlist history
+        :return: music in page order
+        """
+        current_music = itertools.chain.from_iterable(self._iter_scraped([]))
+        return list(OrderedSet(Music._from_clean(artist, title) for artist, title in Music.clean_pairs(current_music)))
 
-        return new_music
+    def get_page_fingerprint(self) -> Optional[str]:
+        """
+        Get fingerprint of the music on the playlist page, to check if it has changed.
+        Only the music is used, as the rest of the page changes with every request.
+        Date-prefixed playlists also change each day, as there is a new playlist to sync.
+        Shows have no fingerprint, as new episodes are on other pages
+        :return: hash of the music in page order, None for shows
+        """
+        if self.type == "show":
+            return None
+        self._scraped = self.scraper.scrape_bbc_sounds(self.url, [])
+        fingerprint = json.dumps([self._get_playlist_date(), self._scraped], ensure_ascii=False)
+        return hashlib.sha256(fingerprint.encode()).hexdigest()
 
     def write_playlist_history(self, new_music: Set[Music]) -> None:
-        playlist_history_path = self._get_playlist_history_path()
-        previous_music = self._get_playlist_history(playlist_history_path)
-        # merge new songs/albums with previous songs
-        for music in new_music:
-            previous_music[music.artist].append(music.title)
-        # for shows, track newly added shows
-        self.scraper.add_parsed_shows(previous_music)
-        # write history of songs to file if not a date-prefixed playlist
+        history = self.get_playlist_history()
+        with get_metrics().time("history_save", playlist=self.playlist_suffix):
+            # merge new songs/albums with previous songs
+            history.add_music(new_music)
+            # for shows, track newly added shows
+            self.scraper.add_parsed_shows(history)
         if not self.date_prefix:
-            with open(playlist_history_path, "w") as handle:
-                toml.dump(previous_music, handle)
-                logger.info("Successfully updated playlist history")
-
-    def _get_playlist_history_path(self) -> str:
-        return self.history_dir / f"{self.playlist_suffix}.toml"
+            logger.info("Successfully updated playlist history")
 
-    def _get_playlist_history(self, playlist_history_path: str) -> dict:
-        if not playlist_history_path.exists() or self.date_prefix:
-            previous_music = defaultdict(list)
-        else:
-            previous_music = defaultdict(list, toml.load(playlist_history_path))
-        return previous_music
+    def get_playlist_history(self) -> PlaylistHistory:
+        """
+        Get history for the playlist, date-prefixed playlists have a new history for each day's playlist
+        :return: playlist history
+        """
+        if self._history is None:
+            with get_metrics().time("history_load", playlist=self.playlist_suffix):
+                if self.date_prefix:
+                    self._history = PlaylistHistory(":memory:", self.playlist_suffix)
+                    self._history_date = self._get_playlist_date()
+                else:
+                    self.history_dir.mkdir(parents=True, exist_ok=True)
+                    self._history = PlaylistHistory(self.history_dir / "history.sqlite", self.playlist_suffix)
+                    self._history.migrate_toml(self.history_dir / f"{self.playlist_suffix}.toml")
+        return self._history
+
+    def _iter_scraped(self, parsed_show_urls: List[str]) -> Iterator[List[Tuple[str, str]]]:
+        """
+        Scrape the page, using the music scraped for the page fingerprint if it hasn't been synced yet
+        :param parsed_show_urls: previously parsed show urls
+        :return: artists and titles in batches as they are scraped
+        """
+        scraped, self._scraped = self._scraped, None
+        if scraped is not None:
+            return iter([scraped])
+        return self.scraper.iter_bbc_sounds(self.url, parsed_show_urls)
+
+    def _get_playlist_date(self) -> Optional[str]:
+        """Date of the date-prefixed spotify playlist being synced to, None if the playlist isn't date-prefixed"""
+        return time.strftime("%Y-%m-%d") if self.date_prefix else None
+
+
+_JSON_LD = re.compile(r"<script[^>]*application/ld\+json[^>]*>(.*?)</script>", re.DOTALL | re.IGNORECASE)
+_PRELOADED_STATE = re.compile(r"window\.__PRELOADED_STATE__\s*=\s*(\{.*?\})\s*;?\s*</script>", re.DOTALL)
+
+
+def _read_structured_data(page: str) -> List[Union[dict, list]]:
+    """
+    Get JSON-LD and preloaded state embedded in the page, without parsing the html
+    :param page: html of the page
+    :return: decoded JSON of each block, blocks which aren't valid JSON are skipped
+    """
+    data = []
+    for match in itertools.chain(_JSON_LD.finditer(page), _PRELOADED_STATE.finditer(page)):
+        try:
+            data.append(json.loads(match.group(1)))
+        except ValueError:
+            logger.debug("Skipping embedded data which isn't valid JSON")
+    return data
+
+
+_MUSIC_TYPES = ("MusicRecording", "MusicAlbum")
+
+
+def _find_structured_music(data: Union[dict, list], schema_type: str) -> List[Tuple[str, str]]:
+    """
+    Find music in embedded data, either schema.org items (e.g. MusicRecording with byArtist) or
+    BBC Sounds music segments (titles with the artist as primary and the track as secondary)
+    :param data: decoded JSON-LD or preloaded state
+    :param schema_type: schema.org type of the music, MusicRecording or MusicAlbum
+    :return: (artist, name) in the order they are listed
+    """
+    music = []
+    stack = [data]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, list):
+            stack.extend(reversed(item))
+            continue
+        if not isinstance(item, dict):
+            continue
+        if item.get("@type") in _MUSIC_TYPES:
+            if item.get("@type") == schema_type and item.get("name"):
+                artists = item.get("byArtist") or []
+                artists = artists if isinstance(artists, list) else [artists]
+                names = [x.get("name", "") if isinstance(x, dict) else str(x) for x in artists]
+                if any(names):
+                    music.append((" & ".join(x for x in names if x), item["name"]))
+            # music inside other music, such as the album of a recording, isn't listed on the page
+            continue
+        titles = item.get("titles")
+        # stations, programmes and promotions also have titles, only music segments are tracks
+        if "music" in (item.get("segment_type"), item.get("segmentType")) and isinstance(titles, dict):
+            if schema_type == "MusicRecording" and titles.get("primary") and titles.get("secondary"):
+                music.append((titles["primary"], titles["secondary"]))
+            continue
+        stack.extend(reversed(list(item.values())))
+    return music
+
+
+def _check_structured_music(page: str, schema_type: str, section: List[Tag],
+                            parsed_music: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """
+    Use music from the page's embedded data if it lines up with the section of the page it is listed in.
+    Embedded data has artists and names separately, rather than split from text which may contain the separator
+    :param page: html of the page
+    :param schema_type: schema.org type of the music, MusicRecording or MusicAlbum
+    :param section: paragraphs of the page which list the music
+    :param parsed_music: music parsed from the paragraphs
+    :return: music from embedded data if it lines up, otherwise the music parsed from the paragraphs
+    """
+    text = _normalise(" ".join(_get_text(x, " ") for x in section))
+    for data in _read_structured_data(page):
+        music = _find_structured_music(data, schema_type)
+        if music and len(music) >= len(parsed_music) \
+                and all(_normalise(artist) in text and _normalise(name) in text for artist, name in music):
+            return music
+    return parsed_music
+
+
+def _normalise(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+def _get_text(tag: Tag, line_break: str = "") -> str:
+    """
+    Text of a tag, with line breaks replaced instead of changing the tree
+    :param tag: tag to get text from
+    :param line_break: text for each br tag
+    :return: text of the tag
+    """
+    # comments and other special strings aren't text, as with get_text
+    return "".join(
+        str(x) if type(x) is NavigableString else line_break
+        for x in tag.descendants
+        if type(x) is NavigableString or x.name == "br"
+    )
+
+
+def _has_class(attrs: dict, class_name: str) -> bool:
+    """
+    Check tag attributes for a class while the tag is being parsed, bs4 may not have split the class attribute yet
+    """
+    classes = attrs.get("class") or []
+    if isinstance(classes, str):
+        classes = classes.split()
+    return class_name in classes
+
+
+def _is_show_tag(name: str, attrs: dict) -> bool:
+    """Tags needed from a show episode page"""
+    if name == "link":
+        return "canonical" in str(attrs.get("rel"))
+    if name == "a":
+        return attrs.get("data-bbc-title") == "next:title" or _has_class(attrs, "br-nav__link")
+    return _has_class(attrs, "segment__content") or _has_class(attrs, "playout__message")
+
+
+def _is_episode_guide_tag(name: str, attrs: dict) -> bool:
+    """Tags needed from an episode guide page"""
+    return _has_class(attrs, "programme--episode") or _has_class(attrs, "pagination__next")
 
 
 class ScraperBase:
+    parsers = tuple(choice.value for choice in ParserChoices)
+    # only the parts of the page which are needed, parse everything if None
+    parse_only = SoupStrainer(["h1", "h2", "h3", "p"])
+    # playlist pages have A list, B list, C list then album of the day headers
+    album_header_index = 4
+
+    def __init__(self, parser: Union[str, ParserChoices] = "html.parser"):
+        self.parser = self.get_parser(parser)
+
     @staticmethod
-    def read_html(url: str) -> BeautifulSoup:
+    def get_parser(parser: Union[str, ParserChoices]) -> str:
+        """
+        Get html parser backend for beautiful soup, falling back to the built in parser if not installed
+        :param parser: name of parser, one of html.parser, lxml or html5lib
+        :raises ValueError: if the parser isn't one of the choices
+        :return: parser name
         """
-        Opens url or file path.
+        parser = ParserChoices(parser).value
+        if builder_registry.lookup(parser) is None:
+            logger.warning(f"Html parser '{parser}' is not installed, using html.parser instead")
+            return "html.parser"
+        return parser
+
+    @staticmethod
+    def read_page(url: str) -> str:
+        """
+        Opens url or file path, urls are requested through the shared cached session.
         :param url: url/file path to open
+        :return: html of the page
+        """
+        host = urlparse(url).hostname or "file"
+        with get_metrics().time("bbc_fetch", url, host=host):
+            if url.startswith("http") or url.startswith("www."):
+                page = get_session().get(url)
+            else:
+                file = PROJECT_ROOT / url
+                with open(file) as handle:
+                    page = handle.read()
+        get_metrics().increment("bbc_fetch_bytes", len(page.encode()), host=host)
+        return page
+
+    def parse_html(self, page: str, parse_only: Optional[SoupStrainer] = None) -> BeautifulSoup:
+        """
+        Parse html, only keeping the tags needed by the scraper
+        :param page: html of the page
+        :param parse_only: strainer to use instead of the scraper's default
         :return: beautiful soup object of the html
         """
-        if url.startswith("http") or url.startswith("www."):
-            page = requests.get(url)
-            soup = BeautifulSoup(page.text, "html.parser")
-        else:
-            file = Path(__file__).parent.parent.parent / url
-            with open(file) as handle:
-                page = handle.read()
-            soup = BeautifulSoup(page, "html.parser")
-        return soup
+        with get_metrics().time("bbc_parse", scraper=type(self).__name__, parser=self.parser):
+            return BeautifulSoup(page, self.parser, parse_only=parse_only or self.parse_only)
+
+    def read_html(self, url: str) -> BeautifulSoup:
+        """
+        Opens url or file path and parses it
+        :param url: url/file path to open
+        :return: beautiful soup object of the html
+        """
+        return self.parse_html(self.read_page(url))
+
+    def get_list_sections(self, soup: BeautifulSoup) -> Tuple[List[Tag], List[Tag]]:
+        """
+        Split the paragraphs of a playlist page at the album of the day header, in one pass over the page.
+        The A, B and C lists come before it, and the albums after it
+        :param soup: html of the playlist page
+        :return: paragraphs before and after the album of the day header
+        """
+        before, after = [], []
+        headers = 0
+        for tag in soup.find_all(lambda x: x.name == "p" or "beta" in (x.get("class") or [])):
+            if "beta" in (tag.get("class") or []):
+                headers += 1
+            elif headers < self.album_header_index:
+                before.append(tag)
+            else:
+                after.append(tag)
+        return before, after
+
+    def resume_crawl(self, history: PlaylistHistory) -> None:
+        """
+        Checkpoint crawl progress to the playlist history, and continue from an earlier crawl which didn't finish.
+        Single page playlists have nothing to checkpoint
+        :param history: playlist history
+        """
+        pass
+
+    def iter_bbc_sounds(self, url: Union[str, Path], parsed_show_urls: List[str]) -> Iterator[List[Tuple[str, str]]]:
+        """
+        Get music from bbc sounds url in batches as it is scraped, playlists are a single batch
+        :param url: playlist url
+        :param parsed_show_urls: previously parsed show urls
+        :return: batches of (artist, title)
+        """
+        yield self.scrape_bbc_sounds(url, parsed_show_urls)
 
 
 class AlbumScraper(ScraperBase):
     def scrape_bbc_sounds(self, url: Union[str, Path], parsed_show_urls: List[str]) -> List[Tuple[str, str]]:
         """
-        Get all artist and album names from bbc sounds url
+        Get all artist and album names from bbc sounds url, from embedded structured data if it matches the page
         :param url Playlist url
         :param parsed_show_urls not used
         :return: List of ablums in (artist, album_name)
         """
-        soup = self.read_html(url)
-        # go to after C list and then get all of the tracks before
-        header = soup.find(class_="beta")
-        for _ in ["B list", "C list", "Album of the day"]:
-            header = header.find_next(class_="beta")
-
+        page = self.read_page(url)
+        # albums are after the album of the day header
+        _, paragraphs = self.get_list_sections(self.parse_html(page))
         album_strings = []
-        album_tag = "p"
         # can be separated by dashes or hyphens
         for separator in [":"]:
             album_strings.extend([
-                (i.text.strip().split(separator))
-                for i in header.find_all_next(album_tag)
-                if separator in i.text
+                (text.strip().split(separator))
+                for text in (i.get_text() for i in paragraphs)
+                if separator in text
             ])
 
         by = " by "
@@ -140,85 +400,258 @@ class AlbumScraper(ScraperBase):
             album_name = album_artist_selected.split(by)[0].strip()
             artist = album_artist_selected.split(", selected by")[0].lstrip(f"{album_name}{by}").strip()
             albums.append((artist, album_name))
-        return albums
+        return _check_structured_music(page, "MusicAlbum", paragraphs, albums)
 
-    def add_parsed_shows(self, shows: Dict[str, List[str]]):
+    def add_parsed_shows(self, history: PlaylistHistory):
         pass
 
 
+class Episode(NamedTuple):
+    url: str
+    next_url: Optional[str]
+    tracks: List[Tuple[str, str]]
+
+
 class ShowScraper(ScraperBase):
+    parse_only = SoupStrainer(_is_show_tag)
+    guide_parse_only = SoupStrainer(_is_episode_guide_tag)
 
-    def __init__(self):
+    def __init__(self, parser: str = "html.parser", max_workers: int = 8, parse_processes: int = 0):
+        super().__init__(parser)
         self.parsed_urls = OrderedSet()
+        self.max_workers = max_workers
+        self.parse_processes = parse_processes
+        self._parse_pool: Optional[Executor] = None
         self.not_broadcasted_message = "This programme will be available shortly after broadcast"
+        self._checkpoint: Optional[PlaylistHistory] = None
+        self._crawled: Dict[str, Episode] = {}
 
-    def add_parsed_shows(self, shows: Dict[str, List[str]]):
+    def add_parsed_shows(self, history: PlaylistHistory):
 
-        shows["_parsed_shows"] = self.parsed_urls
+        history.add_parsed_shows(self.parsed_urls)
+
+    def resume_crawl(self, history: PlaylistHistory) -> None:
+        """
+        Checkpoint each episode to the playlist history as it is scraped, until its music is added to the history.
+        Episodes checkpointed by an earlier crawl which didn't finish are used without fetching them again
+        :param history: playlist history
+        """
+        self._checkpoint = history
+        self._crawled = {url: Episode(url, next_url, tracks)
+                         for url, next_url, tracks in history.get_crawled_episodes()}
+        if self._crawled:
+            logger.info(f"Resuming crawl, {len(self._crawled)} episodes were scraped by the last run")
 
     def scrape_bbc_sounds(self, url: Union[str, Path], parsed_show_urls: List[str]) -> List[Tuple[str, str]]:
         """
-        Get all artists and song names for a show, skipping parsed shows
+        Get all artists and song names for a show, skipping parsed shows.
         :param url: first show url
         :param parsed_show_urls: previously parsed show urls
-        :return: artists and songs from show
+        :return: artists and songs from show, in broadcast order
+        """
+        return list(itertools.chain.from_iterable(self.iter_bbc_sounds(url, parsed_show_urls)))
+
+    def iter_bbc_sounds(self, url: Union[str, Path], parsed_show_urls: List[str]) -> Iterator[List[Tuple[str, str]]]:
+        """
+        Get artists and song names for each episode of a show as it is scraped, skipping parsed shows.
+        Episodes are discovered from the programme's episode guide and scraped concurrently,
+        falling back to following each episode's link to the next episode.
+        :param url: first show url
+        :param parsed_show_urls: previously parsed show urls
+        :return: artists and songs from each episode, in broadcast order
         """
         self.parsed_urls.update(parsed_show_urls)
-        songs = self._scrape_show(url, None)
+        soup = self.read_html(url)
 
-        return songs
+        episode_urls = self._get_listed_episode_urls(url, soup)
+        with self._parsing_processes():
+            if episode_urls:
+                episodes = self._scrape_episodes(episode_urls)
+            else:
+                episodes = self._follow_next_episodes(soup)
 
-    def _scrape_show(self, url: Union[str, Path], songs: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
-        if songs is None:
-            songs = []
+            for episode in episodes:
+                yield episode.tracks
 
-        soup = self.read_html(url)
+    @contextmanager
+    def _parsing_processes(self) -> Iterator[None]:
+        """
+        Parse episode pages in a process pool while scraping, if the scraper has parse processes.
+        Pages are still fetched by threads, only parsing is sent to the pool
+        """
+        if not self.parse_processes:
+            yield
+            return
+        # spawned rather than forked, as the fetching threads may be holding locks
+        with ProcessPoolExecutor(self.parse_processes, mp_context=get_context("spawn")) as pool:
+            self._parse_pool = pool
+            try:
+                yield
+            finally:
+                self._parse_pool = None
+
+    def _scrape_episode(self, url: str) -> Optional[Episode]:
+        """
+        Fetch and parse an episode page, parsing in the process pool if there is one
+        :param url: episode url
+        :return: episode, or None if the episode hasn't been broadcast yet
+        """
+        page = self.read_page(url)
+        if self._parse_pool is None:
+            return self._parse_episode(self.parse_html(page))
+        with get_metrics().time("bbc_parse", scraper=type(self).__name__, parser=self.parser):
+            episode = self._parse_pool.submit(_parse_episode_page, page.encode(), self.parser).result()
+        return episode and Episode(*episode)
+
+    def _parse_episode(self, soup: BeautifulSoup) -> Optional[Episode]:
+        """
+        Parse an episode page
+        :param soup: episode html
+        :return: episode, or None if the episode hasn't been broadcast yet
+        """
         if self.not_broadcasted_message in soup.text:
-            return songs
+            return None
 
         show_url = soup.find("link", attrs={"rel": "canonical"})["href"]
-        if show_url in self.parsed_urls:
-            logger.info(f"Previously scraped show {show_url}, skipping")
-        else:
-            self.parsed_urls.add(show_url)
-            tracks = soup.find_all(class_="segment__content")
-            for track in tracks:
-                artist = ", ".join(x.text for x in track.find_all("span", class_="artist"))
-                song_name = track.find_all("span", class_="")[0].text
-                songs.append((artist, song_name))
+        tracks = []
+        for track in soup.find_all(class_="segment__content"):
+            artist = ", ".join(x.text for x in track.find_all("span", class_="artist"))
+            song_name = track.find_all("span", class_="")[0].text
+            tracks.append((artist, song_name))
 
         link_to_next = soup.find("a", attrs={"data-bbc-container": "episode", "data-bbc-title": "next:title"})
-        next_url = link_to_next["href"]
-        return self._scrape_show(next_url, songs)
+        next_url = link_to_next["href"] if link_to_next else None
+        return Episode(show_url, next_url, tracks)
+
+    def _follow_next_episodes(self, soup: BeautifulSoup) -> Iterator[Episode]:
+        """
+        Walk from episode to episode using the link to the next episode, until an unbroadcast episode is found
+        :param soup: html of the first episode
+        :return: episodes which haven't previously been parsed, as they are scraped
+        """
+        episode = self._parse_episode(soup)
+        while episode is not None:
+            if episode.url in self.parsed_urls:
+                logger.info(f"Previously scraped show {episode.url}, skipping")
+            else:
+                self._add_parsed_episode(episode)
+                yield episode
+            if not episode.next_url:
+                break
+            # checkpointed episodes without a next episode are fetched again, one may have been broadcast since
+            crawled = self._crawled.get(episode.next_url)
+            if crawled and crawled.next_url:
+                episode = crawled
+            else:
+                episode = self._scrape_episode(episode.next_url)
+
+    def _get_listed_episode_urls(self, url: str, soup: BeautifulSoup) -> List[str]:
+        """
+        Get urls for the first episode and every later episode from the programme's paginated episode guide.
+        :param url: url of the first episode
+        :param soup: html of the first episode
+        :return: episode urls in broadcast order, empty if the episode guide couldn't be used
+        """
+        if not url.startswith("http"):
+            return []
+        episodes_link = soup.find("a", class_="br-nav__link", href=re.compile(r"/episodes$"))
+        show_url = soup.find("link", attrs={"rel": "canonical"})
+        if not episodes_link or not show_url:
+            return []
+        first_pid = show_url["href"].rstrip("/").split("/")[-1]
+
+        # the guide lists newest episodes first, so read pages until the first episode is found
+        episode_pids = OrderedSet()
+        guide_url = urljoin(show_url["href"], f"{episodes_link['href']}/guide")
+        while guide_url:
+            guide = self.parse_html(self.read_page(guide_url), self.guide_parse_only)
+            for programme in guide.find_all(class_="programme--episode"):
+                if programme.get("data-pid"):
+                    episode_pids.add(programme["data-pid"])
+            if first_pid in episode_pids:
+                break
+            next_page = guide.select_one(".pagination__next a[href]")
+            guide_url = urljoin(guide_url, next_page["href"]) if next_page else None
+
+        if first_pid not in episode_pids:
+            logger.warning(f"Could not find {first_pid} in episode guide, following links between episodes instead")
+            return []
+        episode_pids = list(episode_pids)[:episode_pids.index(first_pid) + 1]
+        return [urljoin(show_url["href"], pid) for pid in reversed(episode_pids)]
+
+    def _scrape_episodes(self, episode_urls: List[str]) -> Iterator[Episode]:
+        """
+        Concurrently scrape episodes which haven't previously been parsed
+        :param episode_urls: episode urls in broadcast order
+        :return: broadcast episodes in broadcast order, each one as soon as it and earlier episodes are scraped
+        """
+        new_urls = []
+        for episode_url in episode_urls:
+            if episode_url in self.parsed_urls:
+                logger.info(f"Previously scraped show {episode_url}, skipping")
+            else:
+                new_urls.append(episode_url)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for episode in executor.map(lambda x: self._crawled.get(x) or self._scrape_episode(x), new_urls):
+                if episode is None:
+                    continue
+                if episode.url in self.parsed_urls:
+                    logger.info(f"Previously scraped show {episode.url}, skipping")
+                else:
+                    self._add_parsed_episode(episode)
+                    yield episode
+
+    def _add_parsed_episode(self, episode: Episode) -> None:
+        """
+        Mark episode as parsed, and checkpoint it if it was scraped by this crawl
+        :param episode: scraped episode
+        """
+        self.parsed_urls.add(episode.url)
+        if self._checkpoint is not None and self._crawled.get(episode.url) != episode:
+            self._checkpoint.add_crawled_episode(episode.url, episode.next_url, episode.tracks)
+
+
+# show scraper of each parse process, by parser
+_process_scrapers: Dict[str, ShowScraper] = {}
+
+
+def _parse_episode_page(page: bytes, parser: str) -> Optional[Tuple[str, Optional[str], List[Tuple[str, str]]]]:
+    """
+    Parse an episode page in a parse process. Only the compact episode is sent back, not the parsed html
+    :param page: utf-8 html of the episode page
+    :param parser: html parser backend
+    :return: canonical url, next episode url and tracks, or None if the episode hasn't been broadcast yet
+    """
+    scraper = _process_scrapers.get(parser)
+    if scraper is None:
+        scraper = _process_scrapers[parser] = ShowScraper(parser)
+    soup = BeautifulSoup(page, scraper.parser, parse_only=scraper.parse_only, from_encoding="utf-8")
+    episode = scraper._parse_episode(soup)
+    return episode and tuple(episode)
 
 
 class PlaylistScraper(ScraperBase):
     def scrape_bbc_sounds(self, url: Union[str, Path], parsed_show_urls: List[str]) -> List[Tuple[str, str]]:
         """
-        Get all artist and song names from bbc sounds url
+        Get all artist and song names from bbc sounds url, from embedded structured data if it matches the page
         :param url Playlist url
         :param parsed_show_urls not used
         :return: List of songs in (artist, song_name)
         """
-        soup = self.read_html(url)
-        soup.preserve_whitespace_tags = 'br'
-        # go to after C list and then get all of the tracks before
-        header = soup.find(class_="beta")
-        for _ in ["B list", "C list", "Album of the day"]:
-            header = header.find_next(class_="beta")
+        page = self.read_page(url)
+        # tracks are before the album of the day header
+        paragraphs, _ = self.get_list_sections(self.parse_html(page))
+        # keep br as new lines as sometimes they don't always use p in playlist
+        texts = [_get_text(i, "\n") for i in paragraphs]
 
         track_strings = []
-        song_tag = "p"
-        # keep br tags as sometimes they don't always use p in playlist
-        for br in soup.find_all("br"):
-            br.replace_with("\n")
-
         # can be separated by dashes or hyphens
         for separator in [" – ", " - "]:
             track_strings.extend([
-                (i.text.split(separator))
-                for i in header.find_all_previous(song_tag)
-                if separator in i.text
+                (text.split(separator))
+                for text in reversed(texts)
+                if separator in text
             ])
 
         songs = []
@@ -233,7 +666,7 @@ class PlaylistScraper(ScraperBase):
                     songs.append((artist.strip(), song_name.strip()))
         # parsed backwards so correct it back to the right order
         songs.reverse()
-        return songs
+        return _check_structured_music(page, "MusicRecording", paragraphs, songs)
 
-    def add_parsed_shows(self, shows: Dict[str, List[str]]):
+    def add_parsed_shows(self, history: PlaylistHistory):
         pass
@@ -1,9 +1,18 @@
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator, List, Optional, Set
+
 import typer
-from loguru import logger
-from spotipy import Spotify
 
-from bbc_meet_spotify.playlist_parsing import PlaylistChoices
-from bbc_meet_spotify import BBCSounds, Spotify, __version__
+from bbc_meet_spotify.paths import CACHE_DIR, PLAYLISTS_PATH
+from bbc_meet_spotify.playlist_parsing import ParserChoices, PlaylistChoices
+from bbc_meet_spotify import __version__
+
+# spotipy, requests and beautiful soup are imported when a playlist is synced, so that --help and --version are fast
+if TYPE_CHECKING:
+    from bbc_meet_spotify.bbc_sounds import BBCSounds
+    from bbc_meet_spotify.music import Music
+    from bbc_meet_spotify.spotify import Spotify
 
 
 def version_callback(value: bool):
@@ -12,9 +21,8 @@ def version_callback(value: bool):
         raise typer.Exit()
 
 
-@logger.catch
 def console(
-        playlist_key: PlaylistChoices,
+        playlist_key: PlaylistChoices = typer.Argument(None, help="Playlist to sync, not needed with --all-playlists"),
         date_prefix: bool = typer.Option(False,
                                          help="Add a date prefix to be added to your spotify playlist?",
                                          show_default=True),
@@ -23,15 +31,203 @@ def console(
                                              show_default=True),
         custom_playlist_name: str = typer.Option(None, "--custom-playlist-name", "-n",
                                                  help="Set a custom name for playlist"),
+        all_playlists: bool = typer.Option(False, "--all-playlists",
+                                           help="Sync every playlist in bbc_playlists.toml",
+                                           show_default=True),
+        watch: bool = typer.Option(False, "--watch",
+                                   help="Keep running, syncing playlists whenever their BBC page changes",
+                                   show_default=True),
+        watch_minutes: float = typer.Option(60, help="Default minutes between checks of each playlist with --watch",
+                                            show_default=True),
+        stream: bool = typer.Option(False, "--stream",
+                                    help="Find and add songs to spotify while later show episodes are being scraped",
+                                    show_default=True),
+        mirror: bool = typer.Option(False, "--mirror",
+                                    help="Make spotify playlists match the BBC playlists, removing music which is no "
+                                         "longer on them",
+                                    show_default=True),
+        metrics_report: Path = typer.Option(None, help="Write timings and counts for the run to this JSON file"),
+        metrics_textfile: Path = typer.Option(None,
+                                              help="Write timings and counts for the run in Prometheus text format, "
+                                                   "for the node exporter textfile collector"),
+        html_parser: ParserChoices = typer.Option(ParserChoices.html_parser,
+                                                  help="Html parser for BBC pages, lxml is fastest if installed",
+                                                  show_default=True),
+        parse_processes: int = typer.Option(0, help="Parse show episode pages in this many processes, to use more "
+                                                    "cores when backfilling a show. 0 parses them in this process",
+                                            show_default=True),
         version: bool = typer.Option(
             None, "--version", callback=version_callback, is_eager=True
         ),
 ):
-    logger.info(f"Getting playlist for bbc playlist key {playlist_key.value}")
-    bbc_sounds = BBCSounds(playlist_key.value, date_prefix, custom_playlist_name)
+    from loguru import logger
+
+    from bbc_meet_spotify.bbc_sounds import BBCSounds
+    from bbc_meet_spotify.spotify import Spotify
+
+    # checked before catching errors, so that typer reports them as usage errors
+    if stream and mirror:
+        raise typer.BadParameter("--stream can't be used with --mirror")
+    if all_playlists and custom_playlist_name is not None:
+        raise typer.BadParameter("--custom-playlist-name can't be used with --all-playlists")
+    if not all_playlists and playlist_key is None:
+        raise typer.BadParameter("Choose a playlist, or use --all-playlists")
+
+    with logger.catch():
+        try:
+            if all_playlists:
+                if watch:
+                    playlist_keys = list(BBCSounds.get_playlist_info(None, PLAYLISTS_PATH))
+                    watch_playlists(playlist_keys, date_prefix, public_playlist, html_parser, None, watch_minutes,
+                                    metrics_report, metrics_textfile, stream, mirror, parse_processes)
+                else:
+                    sync_all_playlists(date_prefix, public_playlist, html_parser, stream=stream, mirror=mirror,
+                                       parse_processes=parse_processes)
+                return
+            if watch:
+                watch_playlists([playlist_key.value], date_prefix, public_playlist, html_parser, custom_playlist_name,
+                                watch_minutes, metrics_report, metrics_textfile, stream, mirror, parse_processes)
+                return
+
+            logger.info(f"Getting playlist for bbc playlist key {playlist_key.value}")
+            bbc_sounds = BBCSounds(playlist_key.value, date_prefix, custom_playlist_name, parser=html_parser,
+                                   parse_processes=parse_processes)
+            spotify = Spotify(cache_dir=CACHE_DIR, max_workers=8)
+            sync_playlist(bbc_sounds, spotify, date_prefix, public_playlist, stream, mirror)
+        finally:
+            write_metrics(metrics_report, metrics_textfile)
+
+
+def watch_playlists(playlist_keys: List[str], date_prefix: bool, public_playlist: bool, html_parser: ParserChoices,
+                    custom_playlist_name: Optional[str], watch_minutes: float, metrics_report: Optional[Path] = None,
+                    metrics_textfile: Optional[Path] = None, stream: bool = False, mirror: bool = False,
+                    parse_processes: int = 0) -> None:
+    """
+    Keep running and sync playlists whenever their BBC page changes, sharing one spotify client and the caches
+    :param playlist_keys: keys of the playlists to watch
+    :param date_prefix: If true, add date prefix to playlists
+    :param public_playlist: If true, make playlists public
+    :param html_parser: html parser for BBC pages
+    :param custom_playlist_name: custom name for the playlist, only used when watching one playlist
+    :param watch_minutes: default minutes between checks of each playlist
+    :param metrics_report: JSON file to update with metrics after each sync
+    :param metrics_textfile: Prometheus text file to update with metrics after each sync
+    :param stream: If true, add songs to spotify while later show episodes are being scraped
+    :param mirror: If true, make spotify playlists match the BBC playlists
+    :param parse_processes: processes to parse show episode pages in, 0 to parse them in this process
+    """
+    from loguru import logger
+
+    from bbc_meet_spotify.bbc_sounds import BBCSounds
+    from bbc_meet_spotify.spotify import Spotify
+    from bbc_meet_spotify.watch import PlaylistWatcher
+
+    all_bbc_sounds = [BBCSounds(key, date_prefix, custom_playlist_name, parser=html_parser,
+                                parse_processes=parse_processes) for key in playlist_keys]
+    spotify = Spotify(cache_dir=CACHE_DIR, max_workers=8)
+
+    def sync(bbc_sounds: BBCSounds) -> None:
+        try:
+            sync_playlist(bbc_sounds, spotify, date_prefix, public_playlist, stream, mirror)
+        finally:
+            write_metrics(metrics_report, metrics_textfile)
+
+    watcher = PlaylistWatcher(all_bbc_sounds, sync, watch_minutes)
+    logger.info(f"Watching bbc playlist keys {', '.join(playlist_keys)}, press Ctrl+C to stop")
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        logger.info("Stopped watching playlists")
+
+
+def sync_all_playlists(date_prefix: bool, public_playlist: bool, html_parser: ParserChoices,
+                       toml_path: Path = PLAYLISTS_PATH, stream: bool = False, mirror: bool = False,
+                       parse_processes: int = 0) -> None:
+    """
+    Scrape every playlist in the playlist file concurrently, then add new music using one spotify client.
+    A playlist which fails is logged and skipped, so that the other playlists are still synced
+    :param date_prefix: If true, add date prefix to playlists
+    :param public_playlist: If true, make playlists public
+    :param html_parser: html parser for BBC pages
+    :param toml_path: path for toml for playlists
+    :param stream: If true, stream each playlist in turn instead, adding songs while show episodes are being scraped
+    :param mirror: If true, mirror each playlist in turn instead, making the spotify playlists match the BBC playlists
+    :param parse_processes: processes to parse show episode pages in, 0 to parse them in this process
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from loguru import logger
+
+    from bbc_meet_spotify.bbc_sounds import BBCSounds
+    from bbc_meet_spotify.spotify import Spotify
+
+    playlist_keys = list(BBCSounds.get_playlist_info(None, toml_path))
+    logger.info(f"Getting playlists for bbc playlist keys {', '.join(playlist_keys)}")
+    all_bbc_sounds = [BBCSounds(key, date_prefix, toml_path=toml_path, parser=html_parser,
+                                parse_processes=parse_processes) for key in playlist_keys]
+    if stream or mirror:
+        spotify = Spotify(cache_dir=CACHE_DIR, max_workers=8)
+        for bbc_sounds in all_bbc_sounds:
+            with skip_failed_playlist(bbc_sounds):
+                logger.info(f"Updating spotify playlist '{bbc_sounds.playlist_suffix}'")
+                sync_playlist(bbc_sounds, spotify, date_prefix, public_playlist, stream, mirror)
+        return
+    with ThreadPoolExecutor(max_workers=len(all_bbc_sounds) or 1) as executor:
+        all_music = [executor.submit(bbc_sounds.get_music) for bbc_sounds in all_bbc_sounds]
+
+    spotify = Spotify(cache_dir=CACHE_DIR, max_workers=8)
+    for bbc_sounds, music in zip(all_bbc_sounds, all_music):
+        with skip_failed_playlist(bbc_sounds):
+            music = music.result()
+            logger.info(f"Updating spotify playlist '{bbc_sounds.playlist_suffix}'")
+            add_music(bbc_sounds, spotify, music, date_prefix, public_playlist)
+
+
+@contextmanager
+def skip_failed_playlist(bbc_sounds: "BBCSounds") -> Iterator[None]:
+    """
+    Log an error syncing a playlist instead of raising it, so that other playlists are still synced
+    :param bbc_sounds: playlist being synced
+    """
+    from loguru import logger
+
+    try:
+        yield
+    except Exception:
+        logger.exception(f"Failed to sync '{bbc_sounds.playlist_suffix}', skipping it")
+
+
+def sync_playlist(bbc_sounds: "BBCSounds", spotify: "Spotify", date_prefix: bool, public_playlist: bool,
+                  stream: bool = False, mirror: bool = False) -> None:
+    """
+    Update spotify playlist from a bbc sounds playlist
+    :param bbc_sounds: bbc sounds playlist
+    :param spotify: spotify client
+    :param date_prefix: If true, add date prefix to playlist
+    :param public_playlist: If true, make playlist public
+    :param stream: If true, add songs to spotify while later show episodes are being scraped
+    :param mirror: If true, make the spotify playlist match the bbc sounds playlist
+    """
+    if mirror:
+        mirror_music(bbc_sounds, spotify, date_prefix, public_playlist)
+    elif stream:
+        stream_music(bbc_sounds, spotify, date_prefix, public_playlist)
+    else:
+        add_music(bbc_sounds, spotify, bbc_sounds.get_music(), date_prefix, public_playlist)
+
+
+def add_music(bbc_sounds: "BBCSounds", spotify: "Spotify", music: Set["Music"], date_prefix: bool,
+              public_playlist: bool) -> None:
+    """
+    Add new music to spotify playlist and record it in the playlist history
+    :param bbc_sounds: bbc sounds playlist the music came from
+    :param spotify: spotify client
+    :param music: new music from the bbc sounds playlist
+    :param date_prefix: If true, add date prefix to playlist
+    :param public_playlist: If true, make playlist public
+    """
+    from loguru import logger
 
-    music = bbc_sounds.get_music()
-    spotify = Spotify()
     if music:
         if bbc_sounds.type == "album":
             spotify.add_albums(bbc_sounds.playlist_suffix, music, date_prefix, public_playlist)
@@ -43,6 +239,65 @@ def console(
         logger.info("No new music to add to the playlist")
 
 
+def stream_music(bbc_sounds: "BBCSounds", spotify: "Spotify", date_prefix: bool, public_playlist: bool) -> None:
+    """
+    Add new songs to spotify playlist as they are scraped, then record them in the playlist history.
+    Albums are added together, as they are expanded into their tracks in one go
+    :param bbc_sounds: bbc sounds playlist to get music from
+    :param spotify: spotify client
+    :param date_prefix: If true, add date prefix to playlist
+    :param public_playlist: If true, make playlist public
+    """
+    from loguru import logger
+
+    if bbc_sounds.type == "album":
+        add_music(bbc_sounds, spotify, bbc_sounds.get_music(), date_prefix, public_playlist)
+        return
+    music = spotify.stream_songs(bbc_sounds.playlist_suffix, bbc_sounds.iter_music(), date_prefix, public_playlist)
+    if music:
+        bbc_sounds.write_playlist_history(music)
+    else:
+        logger.info("No new music to add to the playlist")
+
+
+def mirror_music(bbc_sounds: "BBCSounds", spotify: "Spotify", date_prefix: bool, public_playlist: bool) -> None:
+    """
+    Make spotify playlist match the music currently on the bbc sounds page, in the same order.
+    Shows only list their latest episode, so new songs are added to show playlists instead
+    :param bbc_sounds: bbc sounds playlist to get music from
+    :param spotify: spotify client
+    :param date_prefix: If true, add date prefix to playlist
+    :param public_playlist: If true, make playlist public
+    """
+    from loguru import logger
+
+    if bbc_sounds.type == "show":
+        logger.warning("Show playlists can't be mirrored, adding new songs instead")
+        add_music(bbc_sounds, spotify, bbc_sounds.get_music(), date_prefix, public_playlist)
+        return
+    music = bbc_sounds.get_current_music()
+    if bbc_sounds.type == "album":
+        spotify.mirror_albums(bbc_sounds.playlist_suffix, music, date_prefix, public_playlist)
+    else:
+        spotify.mirror_songs(bbc_sounds.playlist_suffix, music, date_prefix, public_playlist)
+    if music:
+        bbc_sounds.write_playlist_history(music)
+
+
+def write_metrics(metrics_report: Optional[Path], metrics_textfile: Optional[Path]) -> None:
+    """
+    Write metrics for the run so far
+    :param metrics_report: JSON file for the metrics, not written if None
+    :param metrics_textfile: Prometheus text file for the metrics, not written if None
+    """
+    from bbc_meet_spotify.metrics import get_metrics
+
+    if metrics_report is not None:
+        get_metrics().write_report(metrics_report)
+    if metrics_textfile is not None:
+        get_metrics().write_prometheus(metrics_textfile)
+
+
 def main():
     typer.run(console)
 
@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from loguru import logger
+from requests.adapters import HTTPAdapter
+
+from .metrics import get_metrics
+from .paths import CACHE_DIR
+from .rate_limit import CircuitBreaker, CircuitOpenError, TokenBucket
+
+
+class CachedSession:
+    # responses worth retrying, the server may be overloaded or restarting
+    retry_statuses = (429, 500, 502, 503, 504)
+    # errors worth retrying, the connection may have dropped or the server may be slow
+    retry_errors = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+    def __init__(self, cache_dir: Path = CACHE_DIR / "bbc_sounds", max_cache_bytes: int = 100 * 1024 * 1024,
+                 pool_size: int = 16, requests_per_second: float = 10, timeout: Tuple[float, float] = (3.05, 10),
+                 max_retries: int = 3, backoff_seconds: float = 0.5, failure_threshold: int = 5,
+                 reset_seconds: float = 30):
+        """
+        Pooled http session which caches responses on disk and revalidates them with conditional GETs.
+        Requests are rate limited and retried per host, and fail fast once a host has failed repeatedly
+        :param cache_dir: directory to store cached responses in
+        :param max_cache_bytes: once the cache is larger than this, least recently used responses are removed
+        :param pool_size: number of keep-alive connections to hold open per host
+        :param requests_per_second: rate limit for each host, shared by all threads using the session
+        :param timeout: seconds to wait to connect and for each read
+        :param max_retries: retries for timeouts, connection errors and overloaded server responses
+        :param backoff_seconds: retries wait a random time up to this, doubled for each retry
+        :param failure_threshold: consecutive failed requests to a host before failing fast
+        :param reset_seconds: time to fail fast for before trying the host again
+        """
+        self.cache_dir = cache_dir
+        self.max_cache_bytes = max_cache_bytes
+        self.requests_per_second = requests_per_second
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, Tuple[TokenBucket, CircuitBreaker]] = {}
+
+    def get(self, url: str) -> str:
+        """
+        Get page text, from the disk cache if it is still fresh or the server says it hasn't changed.
+        If the server can't be reached or is still overloaded after retrying, the cached page is used even if it is
+        out of date
+        :param url: url to get
+        :raises CircuitOpenError: if the host has failed repeatedly and the page isn't cached
+        :raises requests.RequestException: if the page can't be fetched after retrying and isn't cached
+        :return: page text
+        """
+        cached = self._read_cache(url)
+        headers = {}
+        if cached:
+            if cached["expires"] > time.time():
+                logger.debug(f"Using cached page for {url}")
+                return cached["text"]
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        try:
+            response = self._request(url, headers)
+        except (CircuitOpenError, requests.RequestException) as error:
+            if not cached:
+                raise
+            logger.warning(f"Using out of date cached page for {url}, {error}")
+            return cached["text"]
+
+        if response.status_code in self.retry_statuses:
+            if not cached:
+                response.raise_for_status()
+            logger.warning(f"Using out of date cached page for {url}, responded with {response.status_code}")
+            return cached["text"]
+
+        if response.status_code == 304 and cached:
+            logger.debug(f"Page not modified since last request {url}")
+            cached["expires"] = self._get_expiry(response)
+            self._write_cache(url, cached)
+            return cached["text"]
+
+        if response.ok:
+            self._write_cache(url, {
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "expires": self._get_expiry(response),
+                "text": response.text,
+            })
+        return response.text
+
+    def _request(self, url: str, headers: dict) -> requests.Response:
+        """
+        Get url once the host's rate limiter allows, retrying with exponential backoff and jitter
+        :param url: url to get
+        :param headers: request headers
+        :raises CircuitOpenError: if the host has failed repeatedly
+        :raises requests.RequestException: if the last retry times out or can't connect, or the request can't be retried
+        :return: response, which is still an error if the last retry fails
+        """
+        host = urlparse(url).hostname
+        rate_limiter, circuit_breaker = self._get_host(host)
+        for attempt in range(self.max_retries + 1):
+            try:
+                circuit_breaker.before_request()
+            except CircuitOpenError:
+                get_metrics().increment("bbc_circuit_open", host=host)
+                raise
+            with get_metrics().time("bbc_throttle", host=host):
+                rate_limiter.acquire()
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except requests.RequestException as error:
+                # every failure is recorded, so that a trial request after the circuit opened always finishes
+                circuit_breaker.record_failure()
+                if attempt == self.max_retries or not isinstance(error, self.retry_errors):
+                    raise
+                logger.warning(f"Request for {url} failed, retrying: {error}")
+            else:
+                if response.status_code not in self.retry_statuses:
+                    circuit_breaker.record_success()
+                    return response
+                circuit_breaker.record_failure()
+                if attempt == self.max_retries:
+                    return response
+                logger.warning(f"Request for {url} responded with {response.status_code}, retrying")
+                retry_after = response.headers.get("Retry-After", "")
+                if retry_after.isdigit():
+                    rate_limiter.pause(int(retry_after))
+            get_metrics().increment("bbc_fetch_retries", host=host)
+            time.sleep(random.uniform(0, self.backoff_seconds * 2 ** attempt))
+
+    def _get_host(self, host: str) -> Tuple[TokenBucket, CircuitBreaker]:
+        """Rate limiter and circuit breaker for a host, shared by all threads"""
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = (TokenBucket(self.requests_per_second),
+                                     CircuitBreaker(self.failure_threshold, self.reset_seconds))
+            return self._hosts[host]
+
+    def clear(self) -> None:
+        """Remove all cached responses"""
+        with self._lock:
+            for path in self._cache_files():
+                path.unlink()
+
+    @staticmethod
+    def _get_expiry(response: requests.Response) -> float:
+        cache_control = response.headers.get("Cache-Control", "")
+        if "no-cache" in cache_control or "no-store" in cache_control:
+            return 0
+        max_age = re.search(r"max-age=(\d+)", cache_control)
+        if not max_age:
+            return 0
+        return time.time() + int(max_age.group(1))
+
+    def _cache_path(self, url: str) -> Path:
+        return self.cache_dir / f"{hashlib.sha256(url.encode()).hexdigest()}.json"
+
+    def _cache_files(self):
+        if not self.cache_dir.exists():
+            return []
+        return list(self.cache_dir.glob("*.json"))
+
+    def _read_cache(self, url: str) -> Optional[dict]:
+        path = self._cache_path(url)
+        try:
+            with open(path) as handle:
+                cached = json.load(handle)
+            # mark as recently used for eviction
+            path.touch()
+        except (OSError, ValueError):
+            return None
+        return cached
+
+    def _write_cache(self, url: str, cached: dict) -> None:
+        with self._lock:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path = self._cache_path(url)
+            temp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+            with open(temp_path, "w") as handle:
+                json.dump(cached, handle)
+            os.replace(temp_path, path)
+            self._evict()
+
+    def _evict(self) -> None:
+        files = [(path, path.stat()) for path in self._cache_files()]
+        cache_size = sum(stat.st_size for _, stat in files)
+        if cache_size <= self.max_cache_bytes:
+            return
+        files.sort(key=lambda x: x[1].st_mtime_ns)
+        for path, stat in files:
+            if cache_size <= self.max_cache_bytes:
+                break
+            path.unlink()
+            cache_size -= stat.st_size
+            logger.debug(f"Removed least recently used page from cache {path.name}")
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> CachedSession:
+    """Get the session shared by all scrapers"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = CachedSession()
+    return _session
@@ -0,0 +1,107 @@
+from typing import List, NamedTuple, Optional, Tuple
+
+from bbc_meet_spotify.music import Music, _SANITIZE
+
+
+class Match(NamedTuple):
+    candidate: dict
+    confidence: float
+
+
+def rank_candidates(music: Music, candidates: List[dict], min_confidence: float = 0.65) -> List[Match]:
+    """
+    Score spotify search results against music, so that one search can be used for raw and sanitized names
+    :param music: song or album being searched for
+    :param candidates: spotify tracks or albums from a search
+    :param min_confidence: candidates scoring below this are dropped
+    :return: matches, best first. Ties go to the shortest name, then spotify's order
+    """
+    title_forms = _forms(music.title)
+    artist_forms = _forms(music.artist)
+    # clean all names in one batch
+    names = Music.clean_strings(
+        [candidate["name"] for candidate in candidates]
+        + [artist["name"] for candidate in candidates for artist in candidate.get("artists", [])]
+    )
+    candidate_artists = names[len(candidates):]
+
+    ranked = []
+    for index, candidate in enumerate(candidates):
+        artist_count = len(candidate.get("artists", []))
+        artists, candidate_artists = candidate_artists[:artist_count], candidate_artists[artist_count:]
+        confidence = 0.6 * _title_score(title_forms, names[index]) + 0.4 * _artist_score(artist_forms, artists)
+        if confidence >= min_confidence:
+            ranked.append((-confidence, len(candidate["name"]), index, Match(candidate, round(confidence, 3))))
+    return [match for *_, match in sorted(ranked, key=lambda x: x[:3])]
+
+
+def match_artist(artist: str, candidates: List[dict]) -> Optional[dict]:
+    """
+    Find the spotify artist with the same name, in raw or sanitized form
+    :param artist: cleaned artist name
+    :param candidates: spotify artists from a search
+    :return: first artist with the same name, None if there isn't one
+    """
+    artist_forms = _forms(artist)
+    names = Music.clean_strings([candidate["name"] for candidate in candidates])
+    for candidate, name in zip(candidates, names):
+        if set(_forms(name)) & set(artist_forms):
+            return candidate
+    return None
+
+
+def _forms(string: str) -> Tuple[str, ...]:
+    """Cleaned string, and without apostrophes or full stops if they are in it"""
+    string = string.strip()
+    sanitized = " ".join(string.translate(_SANITIZE).split())
+    return (string,) if sanitized == string else (string, sanitized)
+
+
+def _contains(haystack: str, needle: str) -> bool:
+    return bool(needle) and f" {needle} " in f" {haystack} "
+
+
+def _overlap(first: str, second: str) -> float:
+    first_words, second_words = set(first.split()), set(second.split())
+    if not first_words or not second_words:
+        return 0.0
+    return len(first_words & second_words) / len(first_words | second_words)
+
+
+def _title_score(title_forms: Tuple[str, ...], candidate_title: str) -> float:
+    """
+    1 for the same title, less for versions (remastered, radio edit) or titles which only share some words.
+    Featured artists are already removed by cleaning
+    """
+    candidate_forms = _forms(candidate_title)
+    pairs = [(title, candidate) for title in title_forms for candidate in candidate_forms]
+    if any(title == candidate for title, candidate in pairs):
+        return 1.0
+    if any(candidate.startswith(f"{title} ") for title, candidate in pairs):
+        return 0.9
+    if any(_contains(candidate, title) for title, candidate in pairs):
+        return 0.75
+    return 0.7 * max(_overlap(title, candidate) for title, candidate in pairs)
+
+
+def _artist_score(artist_forms: Tuple[str, ...], candidate_artists: List[str]) -> float:
+    """
+    1 if the artists are the same, less if BBC lists some of the artists (e.g. "A & B" when spotify has A and B)
+    or the artists only share some words
+    """
+    if not candidate_artists:
+        return 0.0
+    scores = []
+    for candidate_artists_form in {tuple(artists) for artists in
+                                   (candidate_artists, [x.translate(_SANITIZE).strip() for x in candidate_artists])}:
+        joined = " ".join(candidate_artists_form)
+        for artist in artist_forms:
+            if artist == joined or artist in candidate_artists_form:
+                return 1.0
+            if all(_contains(artist, candidate) for candidate in candidate_artists_form):
+                scores.append(0.9)
+            elif _contains(artist, candidate_artists_form[0]) or _contains(candidate_artists_form[0], artist):
+                scores.append(0.85)
+            else:
+                scores.append(_overlap(artist, joined))
+    return max(scores)
@@ -0,0 +1,159 @@
+import heapq
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+PROMETHEUS_PREFIX = "bbc_meet_spotify"
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class Metrics:
+    def __init__(self, max_slowest: int = 10):
+        """
+        Timings and counts for each stage of a run, shared by all threads
+        :param max_slowest: number of slowest items to keep for each stage, e.g. the slowest BBC pages
+        """
+        self.max_slowest = max_slowest
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started = time.time()
+            self._timings: Dict[Key, List[float]] = {}
+            self._counters: Dict[Key, float] = {}
+            self._slowest: Dict[str, List[Tuple[float, str]]] = {}
+
+    @contextmanager
+    def time(self, stage: str, item: str = None, **labels: str) -> Iterator[None]:
+        """
+        Time a stage, even if it raises
+        :param stage: name of the stage
+        :param item: item being processed, e.g. url, kept if it is one of the slowest for the stage
+        :param labels: labels to split the stage's timings by
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, item, **labels)
+
+    def observe(self, stage: str, seconds: float, item: str = None, **labels: str) -> None:
+        """
+        Record time taken by a stage
+        :param stage: name of the stage
+        :param seconds: time taken
+        :param item: item being processed, kept if it is one of the slowest for the stage
+        :param labels: labels to split the stage's timings by
+        """
+        key = (stage, tuple(sorted(labels.items())))
+        with self._lock:
+            timing = self._timings.setdefault(key, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+            if item is not None:
+                slowest = self._slowest.setdefault(stage, [])
+                if len(slowest) < self.max_slowest:
+                    heapq.heappush(slowest, (seconds, item))
+                elif seconds > slowest[0][0]:
+                    heapq.heapreplace(slowest, (seconds, item))
+
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+        """
+        Add to a counter
+        :param name: name of the counter
+        :param value: amount to add
+        :param labels: labels to split the counter by
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def get_report(self) -> dict:
+        """
+        Get metrics for the run so far
+        :return: dictionary of stage timings, counters and the slowest items for each stage
+        """
+        with self._lock:
+            return {
+                "started": self.started,
+                "duration_seconds": time.time() - self.started,
+                "stages": [
+                    {"stage": stage, "labels": dict(labels), "count": count, "total_seconds": total,
+                     "max_seconds": maximum}
+                    for (stage, labels), (count, total, maximum) in sorted(self._timings.items())
+                ],
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self._counters.items())
+                ],
+                "slowest": {
+                    stage: [{"item": item, "seconds": seconds} for seconds, item in sorted(slowest, reverse=True)]
+                    for stage, slowest in sorted(self._slowest.items())
+                },
+            }
+
+    def write_report(self, path: Path) -> None:
+        """
+        Write metrics as a JSON run report
+        :param path: path for the report
+        """
+        self._write_atomic(path, json.dumps(self.get_report(), indent=2))
+
+    def write_prometheus(self, path: Path) -> None:
+        """
+        Write metrics in Prometheus text format, for the node exporter's textfile collector
+        :param path: path for the metrics, should end in .prom
+        """
+        report = self.get_report()
+        lines = []
+        stage_metrics = [
+            ("stage_calls_total", "counter", "Number of times each stage ran", "count"),
+            ("stage_seconds_total", "counter", "Total time spent in each stage", "total_seconds"),
+            ("stage_max_seconds", "gauge", "Longest single run of each stage", "max_seconds"),
+        ]
+        for name, metric_type, description, field in stage_metrics:
+            lines += [f"# HELP {PROMETHEUS_PREFIX}_{name} {description}",
+                      f"# TYPE {PROMETHEUS_PREFIX}_{name} {metric_type}"]
+            lines += [f"{PROMETHEUS_PREFIX}_{name}{self._format_labels(stage=x['stage'], **x['labels'])} {x[field]}"
+                      for x in report["stages"]]
+
+        for name in sorted({x["name"] for x in report["counters"]}):
+            lines += [f"# TYPE {PROMETHEUS_PREFIX}_{name}_total counter"]
+            lines += [f"{PROMETHEUS_PREFIX}_{name}_total{self._format_labels(**x['labels'])} {x['value']}"
+                      for x in report["counters"] if x["name"] == name]
+
+        lines += [f"# TYPE {PROMETHEUS_PREFIX}_last_run_timestamp_seconds gauge",
+                  f"{PROMETHEUS_PREFIX}_last_run_timestamp_seconds {time.time()}"]
+        self._write_atomic(path, "\n".join(lines) + "\n")
+
+    @staticmethod
+    def _format_labels(**labels: str) -> str:
+        if not labels:
+            return ""
+        escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+                   for value in labels.values())
+        return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+    @staticmethod
+    def _write_atomic(path: Path, text: str) -> None:
+        # write then rename, so that readers never see a partly written file
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f".{path.name}.tmp")
+        temp_path.write_text(text)
+        os.replace(temp_path, path)
+
+
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """Get the metrics shared by the whole run"""
+    return _metrics
@@ -0,0 +1,114 @@
+from bisect import bisect_left
+from typing import List, NamedTuple, Optional, Tuple
+
+from ordered_set import OrderedSet
+
+
+class MirrorPlan(NamedTuple):
+    # (position, item) to remove from the playlist, last position first so earlier positions don't change
+    removals: List[Tuple[int, Optional[str]]]
+    # (range_start, insert_before, range_length) of runs of items to move once removals are done, in order
+    moves: List[Tuple[int, int, int]]
+    # (position, items) to insert once moves are done, in order
+    additions: List[Tuple[int, List[str]]]
+
+
+def plan_mirror(current: List[Optional[str]], target: List[str]) -> MirrorPlan:
+    """
+    Find the fewest changes to turn a playlist into the target list.
+    Items not in the target (and repeats) are removed, the longest run of items which are already in target order
+    stays where it is and the rest are moved in runs, then missing items are inserted in runs
+    :param current: spotify ids or uris of the playlist's items, in playlist order, None for unavailable items
+    :param target: spotify ids the playlist should have, in order
+    :return: changes to make
+    """
+    target = list(OrderedSet(target))
+    wanted = set(target)
+    kept = []
+    kept_set = set()
+    removals = []
+    for position, item in enumerate(current):
+        if item in wanted and item not in kept_set:
+            kept.append(item)
+            kept_set.add(item)
+        else:
+            removals.append((position, item))
+    removals.reverse()
+
+    target_index = {item: index for index, item in enumerate(target)}
+    in_order = {kept[index] for index in _longest_increasing([target_index[x] for x in kept])}
+    desired = [item for item in target if item in kept_set]
+    moves = []
+    before_move = kept
+    for index, item in enumerate(desired):
+        if item in in_order:
+            continue
+        # move the item to just after the item which comes before it in the target
+        range_start = kept.index(item)
+        insert_before = kept.index(desired[index - 1]) + 1 if index else 0
+        moved = reorder(kept, range_start, insert_before, 1)
+        if moves:
+            # the item can join the last move if taking it along gives the same playlist
+            last_start, last_insert_before, last_length = moves[-1]
+            if (not last_start < last_insert_before <= last_start + last_length + 1
+                    and reorder(before_move, last_start, last_insert_before, last_length + 1) == moved):
+                moves[-1] = (last_start, last_insert_before, last_length + 1)
+                kept = moved
+                continue
+        moves.append((range_start, insert_before, 1))
+        before_move = kept
+        kept = moved
+
+    additions = []
+    for position, item in enumerate(target):
+        if item in kept_set:
+            continue
+        if additions and additions[-1][0] + len(additions[-1][1]) == position:
+            additions[-1][1].append(item)
+        else:
+            additions.append((position, [item]))
+    return MirrorPlan(removals, moves, additions)
+
+
+def reorder(items: List[str], range_start: int, insert_before: int, range_length: int) -> List[str]:
+    """
+    Move a run of items the way spotify's playlist reorder does
+    :param items: playlist items
+    :param range_start: position of the first item to move
+    :param insert_before: position to move the items to, counted before the move
+    :param range_length: number of items to move
+    :return: reordered copy of the items
+    """
+    moved = items[range_start:range_start + range_length]
+    rest = items[:range_start] + items[range_start + range_length:]
+    if insert_before > range_start:
+        insert_before -= range_length
+    return rest[:insert_before] + moved + rest[insert_before:]
+
+
+def _longest_increasing(values: List[int]) -> List[int]:
+    """
+    Find the longest increasing subsequence
+    :param values: distinct values
+    :return: indexes of the subsequence's values
+    """
+    # tails[length - 1] is the index of the smallest value ending an increasing run of that length
+    tails = []
+    tail_values = []
+    previous = [-1] * len(values)
+    for index, value in enumerate(values):
+        length = bisect_left(tail_values, value)
+        if length:
+            previous[index] = tails[length - 1]
+        if length == len(tails):
+            tails.append(index)
+            tail_values.append(value)
+        else:
+            tails[length] = index
+            tail_values[length] = value
+    indexes = []
+    index = tails[-1] if tails else -1
+    while index != -1:
+        indexes.append(index)
+        index = previous[index]
+    return indexes[::-1]
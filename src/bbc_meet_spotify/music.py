@@ -1,17 +1,109 @@
 import re
+import sys
+import threading
 import unicodedata
+from collections import OrderedDict
+from typing import Iterable, List, Tuple
+
+from bbc_meet_spotify.metrics import get_metrics
+
+# null characters separate strings when a batch is cleaned in one pass
+_SEPARATOR = "\x00"
+_NOT_ALLOWED = re.compile(f"[^A-Za-z0-9.'’{_SEPARATOR}]+")
+_FEATURING = re.compile(r" (?:feat|ft)\.")
+_SANITIZE = str.maketrans("", "", "'.")
+
+
+class _CleanedStrings:
+    def __init__(self, max_size: int = 16384):
+        """Least recently used cache of cleaned strings"""
+        self.max_size = max_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, string: str) -> str:
+        with self._lock:
+            value = self._cache.get(string)
+            if value is not None:
+                self._cache.move_to_end(string)
+                return value
+        return self.get_many([string])[0]
+
+    def get_many(self, strings: List[str]) -> List[str]:
+        with self._lock:
+            cleaned = {string: self._cache.get(string) for string in strings}
+            for string, value in cleaned.items():
+                if value is not None:
+                    self._cache.move_to_end(string)
+
+        missing = [string for string, value in cleaned.items() if value is None]
+        if missing:
+            with get_metrics().time("clean_string"):
+                cleaned.update(zip(missing, self._clean(missing)))
+            get_metrics().increment("cleaned_strings", len(missing))
+            with self._lock:
+                for string in missing:
+                    self._cache[string] = cleaned[string]
+                while len(self._cache) > self.max_size:
+                    self._cache.popitem(last=False)
+
+        return [cleaned[string] for string in strings]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    @staticmethod
+    def _clean(strings: List[str]) -> List[str]:
+        joined = _SEPARATOR.join(string.replace(_SEPARATOR, " ") for string in strings)
+        # ascii strings have no accents to remove, so skip normalisation
+        if not joined.isascii():
+            joined = "".join(
+                [char for char in unicodedata.normalize("NFD", joined) if unicodedata.category(char) != "Mn"]
+            )
+        joined = _NOT_ALLOWED.sub(" ", joined).lower()
+        # intern so that music with the same artist or title share one string
+        return [sys.intern(_FEATURING.split(string, 1)[0]) for string in joined.split(_SEPARATOR)]
+
+
+_cleaned_strings = _CleanedStrings()
 
 
 class Music:
+    """Immutable artist and title of a song or album, cleaned for comparison"""
+    __slots__ = ("artist", "title", "_hash")
+
     def __init__(self, artist, title):
-        self.title = self.clean_string(title)
-        self.artist = self.clean_string(artist)
+        self._set(self.clean_string(artist), self.clean_string(title))
+
+    @classmethod
+    def _from_clean(cls, artist: str, title: str) -> "Music":
+        """Create music from strings which are already clean"""
+        music = cls.__new__(cls)
+        music._set(artist, title)
+        return music
+
+    def _set(self, artist: str, title: str) -> None:
+        object.__setattr__(self, "artist", artist)
+        object.__setattr__(self, "title", title)
+        object.__setattr__(self, "_hash", hash((artist, title)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        return self._from_clean, (self.artist, self.title)
 
     def __hash__(self):
-        return hash(self.to_string())
+        return self._hash
 
     def __eq__(self, other):
-        return self.artist == other.artist and self.title == other.title
+        if not isinstance(other, Music):
+            return NotImplemented
+        return self._hash == other._hash and self.artist == other.artist and self.title == other.title
 
     def __repr__(self):
         return f"<{self.to_string()}>"
@@ -24,25 +116,34 @@ class Music:
         :param string: input string to be cleaned
         :return: cleaned string
         """
-        new_string = "".join(
-            [char for char in unicodedata.normalize("NFD", string) if unicodedata.category(char) != "Mn"]
-        )
-        new_string = re.sub("[^A-Za-z0-9.'’]+", " ", new_string)
-        return new_string.lower().split(" feat.")[0].split(" ft.")[0]
+        return _cleaned_strings.get(string)
+
+    @staticmethod
+    def clean_strings(strings: Iterable[str]) -> List[str]:
+        """
+        Cleans many strings in a single pass, see clean_string
+        :param strings: input strings to be cleaned
+        :return: cleaned strings, in the same order
+        """
+        return _cleaned_strings.get_many(list(strings))
+
+    @staticmethod
+    def clean_pairs(pairs: Iterable[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """
+        Cleans (artist, title) pairs in a single pass, see clean_string
+        :param pairs: artist and title pairs
+        :return: cleaned artist and title pairs, in the same order
+        """
+        cleaned = Music.clean_strings(string for pair in pairs for string in pair)
+        return list(zip(cleaned[::2], cleaned[1::2]))
 
     def sanitize(self):
         """
         Strips apostrophes, full-stops and leading/trailing whitespace from string
         :return: sanitised string
         """
-        return Music(self.artist
-                     .replace("'", "")
-                     .replace(".", "")
-                     .strip(),
-                     self.title
-                     .replace("'", "")
-                     .replace(".", "")
-                     .strip())
+        return self._from_clean(sys.intern(self.artist.translate(_SANITIZE).strip()),
+                                sys.intern(self.title.translate(_SANITIZE).strip()))
 
     def to_string(self):
         """Get string value for album or song"""
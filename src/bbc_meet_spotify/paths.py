@@ -0,0 +1,8 @@
+from pathlib import Path
+
+# files are kept in the project root, so that the same ones are used whichever directory the tool is run from
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+PLAYLISTS_PATH = PROJECT_ROOT / "bbc_playlists.toml"
+CONFIG_PATH = PROJECT_ROOT / "config.toml"
+HISTORY_DIR = PROJECT_ROOT / "playlist_history"
+CACHE_DIR = PROJECT_ROOT / ".cache"
@@ -0,0 +1,157 @@
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple, Union
+
+import toml
+from loguru import logger
+
+from bbc_meet_spotify.music import Music
+
+
+class PlaylistHistory:
+    def __init__(self, db_path: Union[Path, str], playlist_name: str):
+        """
+        Music and shows previously added to a playlist, stored in sqlite
+        :param db_path: path to sqlite database, or ":memory:" for history which isn't kept
+        :param playlist_name: name of the playlist, history is kept separately for each playlist
+        """
+        self.playlist_name = playlist_name
+        self.connection = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self.connection:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS music (
+                    playlist TEXT NOT NULL,
+                    artist TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    PRIMARY KEY (playlist, artist, title)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS parsed_shows (
+                    id INTEGER PRIMARY KEY,
+                    playlist TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    UNIQUE (playlist, url)
+                );
+                CREATE TABLE IF NOT EXISTS crawled_episodes (
+                    playlist TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    next_url TEXT,
+                    tracks TEXT NOT NULL,
+                    PRIMARY KEY (playlist, url)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS migrations (
+                    playlist TEXT PRIMARY KEY,
+                    source TEXT NOT NULL
+                );
+            """)
+
+    def contains(self, artist: str, title: str) -> bool:
+        """
+        Has the music been added to the playlist before
+        :param artist: cleaned artist name
+        :param title: cleaned song or album title
+        :return: True if music has been added before
+        """
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT 1 FROM music WHERE playlist = ? AND artist = ? AND title = ?",
+                (self.playlist_name, artist, title)
+            ).fetchone()
+        return row is not None
+
+    def add_music(self, music: Iterable[Music]) -> None:
+        """
+        Add music to the playlist history
+        :param music: songs or albums added to the playlist
+        """
+        with self._lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO music (playlist, artist, title) VALUES (?, ?, ?)",
+                ((self.playlist_name, x.artist, x.title) for x in music)
+            )
+
+    def get_parsed_shows(self) -> List[str]:
+        """
+        Get urls of shows which have already been parsed
+        :return: show urls in the order they were parsed
+        """
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT url FROM parsed_shows WHERE playlist = ? ORDER BY id", (self.playlist_name,)
+            ).fetchall()
+        return [url for url, in rows]
+
+    def add_parsed_shows(self, urls: Iterable[str]) -> None:
+        """
+        Add urls of parsed shows to the playlist history, they no longer need their crawl checkpoint
+        :param urls: show urls
+        """
+        urls = list(urls)
+        with self._lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO parsed_shows (playlist, url) VALUES (?, ?)",
+                ((self.playlist_name, url) for url in urls)
+            )
+            self.connection.executemany(
+                "DELETE FROM crawled_episodes WHERE playlist = ? AND url = ?",
+                ((self.playlist_name, url) for url in urls)
+            )
+
+    def get_crawled_episodes(self) -> List[Tuple[str, Optional[str], List[Tuple[str, str]]]]:
+        """
+        Get episodes scraped by a crawl which didn't finish, so they don't need scraping again
+        :return: url, next episode url and (artist, title) of tracks for each episode
+        """
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT url, next_url, tracks FROM crawled_episodes WHERE playlist = ?", (self.playlist_name,)
+            ).fetchall()
+        return [(url, next_url, [tuple(track) for track in json.loads(tracks)]) for url, next_url, tracks in rows]
+
+    def add_crawled_episode(self, url: str, next_url: Optional[str], tracks: List[Tuple[str, str]]) -> None:
+        """
+        Checkpoint a scraped episode until its music is added to the playlist history
+        :param url: episode url
+        :param next_url: url of the next episode, if there was one
+        :param tracks: (artist, title) of the episode's tracks
+        """
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO crawled_episodes (playlist, url, next_url, tracks) VALUES (?, ?, ?, ?)",
+                (self.playlist_name, url, next_url, json.dumps(tracks))
+            )
+
+    def migrate_toml(self, toml_path: Path) -> None:
+        """
+        Import history from the toml file used by previous versions, only done once per playlist
+        :param toml_path: path to the playlist's toml history
+        """
+        if not toml_path.exists():
+            return
+        with self._lock:
+            migrated = self.connection.execute(
+                "SELECT 1 FROM migrations WHERE playlist = ?", (self.playlist_name,)
+            ).fetchone()
+        if migrated:
+            return
+
+        history = toml.load(toml_path)
+        parsed_shows = history.pop("_parsed_shows", [])
+        with self._lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO music (playlist, artist, title) VALUES (?, ?, ?)",
+                ((self.playlist_name, artist, title) for artist, titles in history.items() for title in titles)
+            )
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO parsed_shows (playlist, url) VALUES (?, ?)",
+                ((self.playlist_name, url) for url in parsed_shows)
+            )
+            self.connection.execute(
+                "INSERT INTO migrations (playlist, source) VALUES (?, ?)", (self.playlist_name, str(toml_path))
+            )
+        logger.info(f"Migrated playlist history from {toml_path}")
+
+    def close(self) -> None:
+        self.connection.close()
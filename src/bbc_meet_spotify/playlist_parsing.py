@@ -1,9 +1,29 @@
+import copy
 from enum import Enum
+from functools import lru_cache
 from pathlib import Path
 from typing import Tuple
 
 import toml
 
+from bbc_meet_spotify.paths import PLAYLISTS_PATH
+
+
+def load_playlists(toml_path: Path = PLAYLISTS_PATH) -> dict:
+    """
+    Load the playlist file, it is only parsed again if it has changed
+    :param toml_path: path for toml for playlists
+    :return: playlist information for each playlist key
+    """
+    modified = Path(toml_path).stat().st_mtime_ns
+    # copied so that callers can't change the cached playlists
+    return copy.deepcopy(_load_toml(str(toml_path), modified))
+
+
+@lru_cache(maxsize=8)
+def _load_toml(toml_path: str, modified: int) -> dict:
+    return toml.load(toml_path)
+
 
 def parse_playlist_file(playlist_key: str, custom_playlist_name: str = None) -> Tuple[str, str]:
     """
@@ -12,14 +32,17 @@ def parse_playlist_file(playlist_key: str, custom_playlist_name: str = None) ->
     :param custom_playlist_name:
     :return:
     """
-    playlist = toml.load(Path("./bbc_playlists.toml"))[playlist_key]
+    playlist = load_playlists()[playlist_key]
     playlist_suffix = custom_playlist_name or playlist["verbose_name"]
     return playlist["url"], playlist_suffix
 
 
-class PlaylistChoices(str, Enum):
-    six_music = "six_music"
-    six_music_albums = "six_music_albums"
-    radio1 = "radio1"
-    dance_party_2021 = "dance_party_2021"
-    dance_anthems = "dance_anthems"
+# playlist keys in the playlist file
+PlaylistChoices = Enum("PlaylistChoices", {key: key for key in (load_playlists() if PLAYLISTS_PATH.exists() else {})},
+                       type=str)
+
+
+class ParserChoices(str, Enum):
+    html_parser = "html.parser"
+    lxml = "lxml"
+    html5lib = "html5lib"
@@ -0,0 +1,218 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from loguru import logger
+
+from bbc_meet_spotify.music import Music
+
+
+class SearchCache:
+    # key columns of each table, least recently used rows are removed once a table is full
+    tables = {"search_results": "kind, artist, title", "album_tracks": "album_id", "artist_catalogs": "artist"}
+
+    def __init__(self, db_path: Union[Path, str], ttl_days: float = 30, max_entries: int = 50000,
+                 catalog_ttl_days: float = 7, max_catalogs: int = 2000):
+        """
+        Spotify ids found for music, so that music doesn't need to be searched for again
+        :param db_path: path to sqlite database, or ":memory:" to only cache for this run
+        :param ttl_days: days before a cached id is searched for again
+        :param max_entries: once there are more ids or albums than this, the least recently used are removed
+        :param catalog_ttl_days: days before an artist's tracks are fetched again, shorter to pick up new releases
+        :param max_catalogs: once there are more artist catalogs than this, the least recently used are removed.
+                             Lower than max_entries, as each catalog has hundreds of tracks
+        """
+        if str(db_path) != ":memory:":
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl_days * 24 * 60 * 60
+        self.catalog_ttl = catalog_ttl_days * 24 * 60 * 60
+        self.max_entries = max_entries
+        self.max_rows = {"search_results": max_entries, "album_tracks": max_entries, "artist_catalogs": max_catalogs}
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self.connection:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS search_results (
+                    kind TEXT NOT NULL,
+                    artist TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    spotify_id TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (kind, artist, title)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS search_results_last_used ON search_results (last_used);
+                CREATE TABLE IF NOT EXISTS album_tracks (
+                    album_id TEXT PRIMARY KEY,
+                    track_ids TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    last_used REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS artist_catalogs (
+                    artist TEXT PRIMARY KEY,
+                    tracks TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    last_used REAL NOT NULL
+                );
+            """)
+            for table in ("album_tracks", "artist_catalogs"):
+                columns = [row[1] for row in self.connection.execute(f"PRAGMA table_info({table})")]
+                if "last_used" not in columns:
+                    # cached before these tables had a size limit
+                    self.connection.execute(f"ALTER TABLE {table} ADD COLUMN last_used REAL NOT NULL DEFAULT 0")
+                self.connection.execute(f"CREATE INDEX IF NOT EXISTS {table}_last_used ON {table} (last_used)")
+            self._sizes = {table: self._count(table) for table in self.tables}
+            for table in self.tables:
+                self._evict(table)
+
+    def get(self, music: Music, kind: str = "track") -> Optional[str]:
+        """
+        Get cached spotify id
+        :param music: song or album
+        :param kind: track or album
+        :return: spotify id, or None if not cached or the cached id has expired
+        """
+        now = time.time()
+        with self._lock, self.connection:
+            cursor = self.connection.execute(
+                "UPDATE search_results SET last_used = ? WHERE kind = ? AND artist = ? AND title = ? AND created > ?",
+                (now, kind, music.artist, music.title, now - self.ttl)
+            )
+            row = None
+            if cursor.rowcount:
+                row = self.connection.execute(
+                    "SELECT spotify_id FROM search_results WHERE kind = ? AND artist = ? AND title = ?",
+                    (kind, music.artist, music.title)
+                ).fetchone()
+            if row:
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def set(self, music: Music, spotify_id: str, kind: str = "track") -> None:
+        """
+        Cache spotify id for music
+        :param music: song or album
+        :param spotify_id: id found on spotify
+        :param kind: track or album
+        """
+        now = time.time()
+        with self._lock, self.connection:
+            cursor = self.connection.execute(
+                "UPDATE search_results SET spotify_id = ?, created = ?, last_used = ? "
+                "WHERE kind = ? AND artist = ? AND title = ?",
+                (spotify_id, now, now, kind, music.artist, music.title)
+            )
+            if not cursor.rowcount:
+                self.connection.execute(
+                    "INSERT INTO search_results (kind, artist, title, spotify_id, created, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (kind, music.artist, music.title, spotify_id, now, now)
+                )
+                self._sizes["search_results"] += 1
+                self._evict("search_results")
+
+    def count_songs_by_artist(self, artists: List[str]) -> Dict[str, int]:
+        """
+        Count the songs found for artists, including expired ones
+        :param artists: cleaned artist names
+        :return: number of songs cached for each artist which has any
+        """
+        if not artists:
+            return {}
+        with self._lock:
+            rows = self.connection.execute(
+                f"SELECT artist, COUNT(*) FROM search_results "
+                f"WHERE kind = 'track' AND artist IN ({', '.join('?' * len(artists))}) GROUP BY artist",
+                artists
+            ).fetchall()
+        return dict(rows)
+
+    def get_album_track_ids(self, album_ids: List[str]) -> Dict[str, List[str]]:
+        """
+        Get cached track ids for albums
+        :param album_ids: spotify album ids
+        :return: track ids for each album which was cached and hasn't expired
+        """
+        now = time.time()
+        with self._lock, self.connection:
+            rows = self.connection.execute(
+                f"SELECT album_id, track_ids FROM album_tracks "
+                f"WHERE album_id IN ({', '.join('?' * len(album_ids))}) AND created > ?",
+                (*album_ids, now - self.ttl)
+            ).fetchall()
+            self.connection.executemany("UPDATE album_tracks SET last_used = ? WHERE album_id = ?",
+                                        ((now, album_id) for album_id, _ in rows))
+        return {album_id: json.loads(track_ids) for album_id, track_ids in rows}
+
+    def set_album_track_ids(self, album_track_ids: Dict[str, List[str]]) -> None:
+        """
+        Cache track ids for albums
+        :param album_track_ids: track ids for each album id
+        """
+        now = time.time()
+        with self._lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO album_tracks (album_id, track_ids, created, last_used) VALUES (?, ?, ?, ?)",
+                ((album_id, json.dumps(track_ids), now, now) for album_id, track_ids in album_track_ids.items())
+            )
+            self._sizes["album_tracks"] = self._count("album_tracks")
+            self._evict("album_tracks")
+
+    def get_artist_catalogs(self, artists: List[str]) -> Dict[str, List[dict]]:
+        """
+        Get cached tracks by artists
+        :param artists: cleaned artist names
+        :return: tracks for each artist which was cached and hasn't expired, empty if the artist wasn't on spotify
+        """
+        now = time.time()
+        with self._lock, self.connection:
+            rows = self.connection.execute(
+                f"SELECT artist, tracks FROM artist_catalogs "
+                f"WHERE artist IN ({', '.join('?' * len(artists))}) AND created > ?",
+                (*artists, now - self.catalog_ttl)
+            ).fetchall()
+            self.connection.executemany("UPDATE artist_catalogs SET last_used = ? WHERE artist = ?",
+                                        ((now, artist) for artist, _ in rows))
+        return {artist: json.loads(tracks) for artist, tracks in rows}
+
+    def set_artist_catalog(self, artist: str, tracks: List[dict]) -> None:
+        """
+        Cache tracks by an artist
+        :param artist: cleaned artist name
+        :param tracks: spotify tracks by the artist
+        """
+        now = time.time()
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO artist_catalogs (artist, tracks, created, last_used) VALUES (?, ?, ?, ?)",
+                (artist, json.dumps(tracks), now, now)
+            )
+            self._sizes["artist_catalogs"] = self._count("artist_catalogs")
+            self._evict("artist_catalogs")
+
+    def log_stats(self) -> None:
+        logger.info(f"Spotify search cache: {self.hits} hits, {self.misses} misses")
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def _count(self, table: str) -> int:
+        return self.connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def _evict(self, table: str) -> None:
+        excess = self._sizes[table] - self.max_rows[table]
+        if excess <= 0:
+            return
+        keys = self.tables[table]
+        self.connection.execute(
+            f"DELETE FROM {table} WHERE ({keys}) IN (SELECT {keys} FROM {table} ORDER BY last_used LIMIT ?)",
+            (excess,)
+        )
+        self._sizes[table] -= excess
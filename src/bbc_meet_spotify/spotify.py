@@ -1,15 +1,34 @@
-from typing import List, Set
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
 
 from loguru import logger
 
+from bbc_meet_spotify.matching import rank_candidates
 from bbc_meet_spotify.music import Music
 from bbc_meet_spotify.music_not_found import MusicNotFoundError
+from bbc_meet_spotify.search_cache import SearchCache
 from bbc_meet_spotify.spotipy_client import SpotipyClient
 
 
 class Spotify:
-    def __init__(self):
-        self.spotipy_client = SpotipyClient()
+    # songs spotify accepts in one request to add to a playlist
+    playlist_write_size = 100
+
+    def __init__(self, cache_dir: Path = None, max_workers: int = 1, min_songs_for_catalog: int = 5):
+        """
+        :param cache_dir: directory for caches which are kept between runs, only cached for this run if not set
+        :param max_workers: number of songs to search for at the same time
+        :param min_songs_for_catalog: get all tracks by an artist, instead of searching for each song, when they have
+                                      at least this many songs to find or already found, in any playlist or run.
+                                      A catalog takes four requests, so it saves requests for artists who keep
+                                      coming up
+        """
+        self.spotipy_client = SpotipyClient(cache_dir=cache_dir)
+        self.search_cache = SearchCache(cache_dir / "spotify_search.sqlite" if cache_dir else ":memory:")
+        self.max_workers = max_workers
+        self.min_songs_for_catalog = min_songs_for_catalog
         self.music_not_found = []
 
     def add_albums(self, playlist_name: str, albums: Set[Music], add_date_prefix=True, public_playlist=True) -> None:
@@ -20,16 +39,14 @@ class Spotify:
         :param add_date_prefix: If true, add date prefix to playlist
         :param public_playlist: If true, make playlist public
         """
+        self.music_not_found = []
         playlist_id = self.spotipy_client.get_playlist(playlist_name, add_date_prefix, public_playlist)["id"]
-        album_ids = []
-        for album in albums:
-            try:
-                album_ids.extend(self.spotipy_client.get_album(album)["id"])
-            except MusicNotFoundError:
-                self.music_not_found.append(album.to_string())
-                break
-            logger.info(f"Adding album to playlist")
-            self.spotipy_client.add_music_to_playlist(playlist_id, album_ids)
+        album_ids = self._get_album_ids(albums)
+        track_ids = self._get_album_track_ids(album_ids)
+        self.search_cache.log_stats()
+        if track_ids:
+            logger.info(f"Adding albums to playlist")
+            self.spotipy_client.add_music_to_playlist(playlist_id, track_ids)
 
         self._log_music_not_found()
 
@@ -41,40 +58,218 @@ class Spotify:
         :param add_date_prefix: If true, add date prefix to playlist
         :param public_playlist: If true, make playlist public
         """
+        self.music_not_found = []
         playlist_id = self.spotipy_client.get_playlist(playlist_name, add_date_prefix, public_playlist)["id"]
         song_ids = self._get_song_ids(songs)
+        self.search_cache.log_stats()
         if song_ids:
             logger.info(f"Adding songs to playlist")
             self.spotipy_client.add_music_to_playlist(playlist_id, song_ids)
 
         self._log_music_not_found()
 
-    def _get_song_id(self, song: Music) -> str:
+    def mirror_songs(self, playlist_name: str, songs: List[Music], add_date_prefix=True, public_playlist=True) -> None:
+        """
+        Make Spotify playlist match the songs, removing songs which aren't in them and keeping their order
+        :param playlist_name: name of the playlist to be created or mirrored to
+        :param songs: every song which should be in the playlist, in order
+        :param add_date_prefix: If true, add date prefix to playlist
+        :param public_playlist: If true, make playlist public
+        """
+        self.music_not_found = []
+        playlist_id = self.spotipy_client.get_playlist(playlist_name, add_date_prefix, public_playlist)["id"]
+        song_ids = self._get_song_ids(songs)
+        self.search_cache.log_stats()
+        self._mirror(playlist_id, song_ids)
+
+        self._log_music_not_found()
+
+    def mirror_albums(self, playlist_name: str, albums: List[Music], add_date_prefix=True,
+                      public_playlist=True) -> None:
+        """
+        Make Spotify playlist match the albums' tracks, removing other tracks and keeping album order
+        :param playlist_name: name of the playlist to be created or mirrored to
+        :param albums: every album which should be in the playlist, in order
+        :param add_date_prefix: If true, add date prefix to playlist
+        :param public_playlist: If true, make playlist public
+        """
+        self.music_not_found = []
+        playlist_id = self.spotipy_client.get_playlist(playlist_name, add_date_prefix, public_playlist)["id"]
+        track_ids = self._get_album_track_ids(self._get_album_ids(albums))
+        self.search_cache.log_stats()
+        self._mirror(playlist_id, track_ids)
+
+        self._log_music_not_found()
+
+    def _mirror(self, playlist_id: str, music_ids: List[str]) -> None:
+        """
+        Mirror music to playlist, unless none of it was found
+        :param playlist_id: id of playlist
+        :param music_ids: ids of songs for the playlist
+        """
+        if not music_ids:
+            # most likely spotify or the BBC page failed, rather than the playlist being empty
+            logger.warning("No music found, leaving the playlist as it is")
+            return
+        logger.info(f"Mirroring playlist")
+        self.spotipy_client.mirror_playlist(playlist_id, music_ids)
+
+    def stream_songs(self, playlist_name: str, song_batches: Iterable[List[Music]], add_date_prefix=True,
+                     public_playlist=True) -> List[Music]:
+        """
+        Adds songs to Spotify playlist while they are still being scraped.
+        Each batch is looked up in the background as soon as it arrives, and found songs are added to the playlist
+        whenever there are enough of them for a full request
+        :param playlist_name: name of the playlist to created or appended to
+        :param song_batches: batches of songs, e.g. from each episode of a show
+        :param add_date_prefix: If true, add date prefix to playlist
+        :param public_playlist: If true, make playlist public
+        :return: all songs from the batches
+        """
+        self.music_not_found = []
+        playlist_id = self.spotipy_client.get_playlist(playlist_name, add_date_prefix, public_playlist)["id"]
+        songs = []
+        song_ids = []
+        # one batch is looked up at a time so that songs stay in order, each lookup is concurrent itself
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            lookups = deque()
+            for batch in song_batches:
+                songs.extend(batch)
+                lookups.append(executor.submit(self._get_song_ids, batch))
+                while lookups and lookups[0].done():
+                    song_ids.extend(lookups.popleft().result())
+                    song_ids = self._flush_song_ids(playlist_id, song_ids)
+            for lookup in lookups:
+                song_ids.extend(lookup.result())
+                song_ids = self._flush_song_ids(playlist_id, song_ids)
+        self._flush_song_ids(playlist_id, song_ids, flush_all=True)
+        self.search_cache.log_stats()
+
+        self._log_music_not_found()
+        return songs
+
+    def _flush_song_ids(self, playlist_id: str, song_ids: List[str], flush_all: bool = False) -> List[str]:
         """
-        Get Spotify song id
-        First queries Spotify with unsanitised track details
-        Second queries spotify with sanitised track details
-        If not found, appends to not found list
-        :param song: song to lookup
-        :return: song_id
+        Add songs to playlist in full requests
+        :param playlist_id: id of playlist
+        :param song_ids: ids of songs waiting to be added
+        :param flush_all: add all songs, rather than leaving songs that would make a partial request
+        :return: ids of songs which are still waiting to be added
         """
+        flush_count = len(song_ids) if flush_all else len(song_ids) - len(song_ids) % self.playlist_write_size
+        if flush_count:
+            logger.info(f"Adding {flush_count} songs to playlist")
+            self.spotipy_client.add_music_to_playlist(playlist_id, song_ids[:flush_count])
+        return song_ids[flush_count:]
+
+    def _search_song_id(self, song: Music) -> Optional[str]:
         try:
-            return self.spotipy_client.get_song(song)["id"]
+            song_id = self.spotipy_client.get_song(song)["id"]
         except MusicNotFoundError:
-            try:
-                song = song.sanitize()
-                return self.spotipy_client.get_song(song)
-            except MusicNotFoundError:
-                self.music_not_found.append(f"{song.to_string()}")
+            return None
+        self.search_cache.set(song, song_id)
+        return song_id
 
     def _get_song_ids(self, songs: List[Music]) -> List[str]:
         """
-        Get list of Spotify song ids
+        Get list of Spotify song ids.
+        Cached songs are used first, then songs by artists with several songs are matched against all of the artist's
+        tracks, and the rest are searched for concurrently
         :param songs: list of songs to search
-        :return: list of song ids
+        :return: list of song ids, in the same order as the songs
+        """
+        songs = list(songs)
+        song_ids = {song: self.search_cache.get(song) for song in songs}
+        song_ids.update(self._get_song_ids_from_catalogs([song for song, song_id in song_ids.items() if not song_id]))
+        not_matched = [song for song, song_id in song_ids.items() if not song_id]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            song_ids.update(zip(not_matched, executor.map(self._search_song_id, not_matched)))
+        for song in songs:
+            if not song_ids[song]:
+                self.music_not_found.append(song.to_string())
+        return [song_ids[song] for song in songs if song_ids[song]]
+
+    def _get_song_ids_from_catalogs(self, songs: List[Music]) -> Dict[Music, str]:
+        """
+        Match songs against the tracks of their artist, for artists with a cached catalog or several songs, counting
+        songs by them which are already in the search cache
+        :param songs: songs which weren't in the search cache
+        :return: spotify ids of songs which matched a track, confidently
+        """
+        if not songs:
+            return {}
+        songs_by_artist = defaultdict(list)
+        for song in songs:
+            songs_by_artist[song.artist].append(song)
+        catalogs = self.search_cache.get_artist_catalogs(list(songs_by_artist))
+        found_counts = self.search_cache.count_songs_by_artist([x for x in songs_by_artist if x not in catalogs])
+        missing = [artist for artist, artist_songs in songs_by_artist.items()
+                   if artist not in catalogs
+                   and len(artist_songs) + found_counts.get(artist, 0) >= self.min_songs_for_catalog]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            catalogs.update(zip(missing, executor.map(self._get_artist_catalog, missing)))
+
+        song_ids = {}
+        for artist, catalog in catalogs.items():
+            for song in songs_by_artist[artist]:
+                # tracks with the title in their name would do for a search by title, but not against every track
+                matches = rank_candidates(song, catalog, min_confidence=0.9)
+                if matches:
+                    song_ids[song] = matches[0].candidate["id"]
+                    self.search_cache.set(song, song_ids[song])
+        logger.debug(f"Matched {len(song_ids)} songs from {len(catalogs)} artist catalogs")
+        return song_ids
+
+    def _get_artist_catalog(self, artist: str) -> List[dict]:
+        catalog = self.spotipy_client.get_artist_catalog(artist)
+        self.search_cache.set_artist_catalog(artist, catalog)
+        return catalog
+
+    def _get_album_id(self, album: Music) -> Optional[str]:
+        """
+        Get Spotify album id, checking the search cache before querying Spotify
+        :param album: album to lookup
+        :return: album_id, or None if not found
+        """
+        album_id = self.search_cache.get(album, "album")
+        if album_id:
+            return album_id
+        try:
+            album_id = self.spotipy_client.get_album(album)["id"]
+        except MusicNotFoundError:
+            return None
+        self.search_cache.set(album, album_id, "album")
+        return album_id
+
+    def _get_album_ids(self, albums: List[Music]) -> List[str]:
+        """
+        Get list of Spotify album ids, searching for albums concurrently
+        :param albums: list of albums to search
+        :return: list of album ids, in the same order as the albums
+        """
+        albums = list(albums)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            album_ids = list(executor.map(self._get_album_id, albums))
+        for album, album_id in zip(albums, album_ids):
+            if not album_id:
+                self.music_not_found.append(album.to_string())
+        return list(filter(None, album_ids))
+
+    def _get_album_track_ids(self, album_ids: List[str]) -> List[str]:
+        """
+        Get track ids for all albums, using cached track ids where possible
+        :param album_ids: list of album ids
+        :return: track ids of all albums, in album order
         """
-        song_ids = [self._get_song_id(song) for song in songs]
-        return list(filter(None, song_ids))
+        if not album_ids:
+            return []
+        album_track_ids = self.search_cache.get_album_track_ids(album_ids)
+        missing_album_ids = [album_id for album_id in album_ids if album_id not in album_track_ids]
+        if missing_album_ids:
+            found_track_ids = self.spotipy_client.get_album_track_ids(missing_album_ids)
+            self.search_cache.set_album_track_ids(found_track_ids)
+            album_track_ids.update(found_track_ids)
+        return [track_id for album_id in album_ids for track_id in album_track_ids.get(album_id, [])]
 
     def _log_music_not_found(self) -> None:
         message_base = "All done!"
@@ -1,25 +1,92 @@
+import json
+import threading
 import time
+from collections import defaultdict
 from pathlib import Path
-from typing import List
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
 import spotipy
 import toml
 from loguru import logger
-from spotipy import SpotifyOAuth
+from ordered_set import OrderedSet
+from spotipy import SpotifyException, SpotifyOAuth
 
+from bbc_meet_spotify.matching import Match, match_artist, rank_candidates
+from bbc_meet_spotify.metrics import get_metrics
+from bbc_meet_spotify.mirror import MirrorPlan, plan_mirror
 from bbc_meet_spotify.music import Music
 from bbc_meet_spotify.music_not_found import MusicNotFoundError
+from bbc_meet_spotify.paths import CONFIG_PATH
+from bbc_meet_spotify.rate_limit import TokenBucket
 
 
 class SpotipyClient:
-    def __init__(self, config_path=Path("./config.toml")):
+    max_rate_limit_retries = 5
+    playlist_page_size = 50
+    playlist_index_ttl = 24 * 60 * 60
+    # maximum items spotify returns or accepts in one playlist request
+    playlist_item_page_size = 100
+    album_batch_size = 20
+    album_track_page_size = 50
+    # maximum results spotify returns for one search
+    search_page_size = 50
+    # newest albums and singles in an artist catalog, so that they are fetched in one request of each kind
+    artist_catalog_albums = 20
+    # BBC playlists are for the UK
+    market = "GB"
+
+    def __init__(self, config_path: Path = CONFIG_PATH, requests_per_second: float = 10, cache_dir: Path = None):
+        """
+        :param config_path: path to config with spotify client id and secret, or api_url for a local stand-in
+        :param requests_per_second: rate limit for requests to spotify, shared by all threads using the client
+        :param cache_dir: directory to cache the user's playlists in, only cached for this run if not set
+        """
         config = toml.load(config_path)
-        auth_manager = SpotifyOAuth(client_id=config["client_id"],
-                                    client_secret=config["client_secret"],
-                                    redirect_uri="http://localhost:8888",
-                                    scope="playlist-modify-private playlist-modify-public")
-        self.spotipy = spotipy.Spotify(auth_manager=auth_manager)
-        self.username = self.spotipy.current_user()["display_name"]
+        if "api_url" in config:
+            # stand-in for the spotify api, such as tests/fake_spotify.py, which doesn't need a login
+            self.spotipy = spotipy.Spotify(auth="local", status_forcelist=(500, 502, 503, 504))
+            self.spotipy.prefix = config["api_url"]
+        else:
+            auth_manager = SpotifyOAuth(client_id=config["client_id"],
+                                        client_secret=config["client_secret"],
+                                        redirect_uri="http://localhost:8888",
+                                        scope="playlist-modify-private playlist-modify-public")
+            self.spotipy = spotipy.Spotify(auth_manager=auth_manager, status_forcelist=(500, 502, 503, 504))
+        # rate limiting (429) responses are handled by the client's token bucket rather than spotipy,
+        # without this urllib3 waits out Retry-After itself so the rest of the threads keep hitting the limit
+        for adapter in self.spotipy._session.adapters.values():
+            adapter.max_retries.respect_retry_after_header = False
+        self.rate_limiter = TokenBucket(requests_per_second)
+        self.username = self._call(self.spotipy.current_user)["display_name"]
+        self.cache_dir = cache_dir
+        self.playlist_index_path = cache_dir / "spotify_playlists.json" if cache_dir else None
+        self._playlist_music_ids = {}
+        self._playlist_index = None
+        self._playlist_index_from_disk = False
+        self._playlist_index_lock = threading.Lock()
+
+    def _call(self, method: Callable, *args, **kwargs):
+        """
+        Call spotipy method once the rate limiter allows,
+        if spotify responds with 429, all requests wait for the Retry-After time before retrying
+        :param method: spotipy method
+        :return: method result
+        """
+        method_name = getattr(method, "__name__", "unknown")
+        for attempt in range(self.max_rate_limit_retries + 1):
+            with get_metrics().time("spotify_throttle"):
+                self.rate_limiter.acquire()
+            try:
+                with get_metrics().time("spotify_request", method=method_name):
+                    return method(*args, **kwargs)
+            except SpotifyException as error:
+                get_metrics().increment("spotify_errors", method=method_name, status=str(error.http_status))
+                if error.http_status != 429 or attempt == self.max_rate_limit_retries:
+                    raise
+                retry_after = float((error.headers or {}).get("Retry-After", 1))
+                get_metrics().increment("spotify_rate_limit_wait_seconds", retry_after)
+                logger.warning(f"Spotify rate limit reached, retrying after {retry_after} seconds")
+                self.rate_limiter.pause(retry_after)
 
     def get_playlist(self, playlist_name: str, add_date_prefix: bool = True, public_playlist: bool = True) -> str:
         """
@@ -31,20 +98,69 @@ class SpotipyClient:
         """
         if add_date_prefix:
             playlist_name = f"{time.strftime('%Y-%m-%d')}_{playlist_name}"
-        current_playlists = self.spotipy.user_playlists(self.username)
 
-        playlist = {}
-        for current_playlist in current_playlists["items"]:
-            if playlist_name == current_playlist["name"]:
-                playlist = current_playlist
-                logger.info(f"Playlist '{playlist_name}' already exists, reusing playlist")
+        with self._playlist_index_lock:
+            playlist = self._get_playlist_index().get(playlist_name)
+            if playlist is None and self._playlist_index_from_disk:
+                # may have been created since the index was cached
+                playlist = self._get_playlist_index(refresh=True).get(playlist_name)
 
-        if not playlist:
-            logger.info(f"Creating playlist '{playlist_name}' for user '{self.username}'")
-            playlist = self.spotipy.user_playlist_create(self.username, playlist_name, public=public_playlist)
+            if playlist:
+                logger.info(f"Playlist '{playlist_name}' already exists, reusing playlist")
+            else:
+                logger.info(f"Creating playlist '{playlist_name}' for user '{self.username}'")
+                playlist = self._call(self.spotipy.user_playlist_create, self.username, playlist_name,
+                                      public=public_playlist)
+                self._playlist_index[playlist_name] = playlist
+                self._save_playlist_index()
 
         return playlist
 
+    def _get_playlist_index(self, refresh: bool = False) -> Dict[str, dict]:
+        """
+        Get all of the user's playlists by name, from the cache if possible
+        :param refresh: if true, always get playlists from spotify
+        :return: playlists by name
+        """
+        if self._playlist_index is not None and not refresh:
+            return self._playlist_index
+
+        self._playlist_index_from_disk = False
+        if not refresh:
+            self._playlist_index = self._load_playlist_index()
+            if self._playlist_index is not None:
+                self._playlist_index_from_disk = True
+                return self._playlist_index
+
+        self._playlist_index = {}
+        offset = 0
+        while True:
+            playlists = self._call(self.spotipy.user_playlists, self.username,
+                                   limit=self.playlist_page_size, offset=offset)
+            for playlist in playlists["items"]:
+                self._playlist_index[playlist["name"]] = playlist
+            offset += len(playlists["items"])
+            if not playlists["items"] or offset >= playlists["total"]:
+                break
+        self._save_playlist_index()
+        return self._playlist_index
+
+    def _load_playlist_index(self) -> Optional[Dict[str, dict]]:
+        if not self.playlist_index_path or not self.playlist_index_path.exists():
+            return None
+        with open(self.playlist_index_path) as handle:
+            cached = json.load(handle)
+        if cached["username"] != self.username or cached["updated"] < time.time() - self.playlist_index_ttl:
+            return None
+        return cached["playlists"]
+
+    def _save_playlist_index(self) -> None:
+        if not self.playlist_index_path:
+            return
+        self.playlist_index_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.playlist_index_path, "w") as handle:
+            json.dump({"username": self.username, "updated": time.time(), "playlists": self._playlist_index}, handle)
+
     def add_music_to_playlist(self, playlist_id: str, music_ids: List[str]) -> None:
         """
         Music which is not currently in the playlist will be added.
@@ -52,40 +168,222 @@ class SpotipyClient:
         :param music_ids: list of song or album ids
         :return:
         """
-        playlist_info = self.spotipy.playlist(playlist_id)
-        existing_music = [x["track"]["id"] for x in playlist_info["tracks"]["items"]]
-        new_song_ids = [music_id for music_id in music_ids if music_id not in existing_music]
+        snapshot_id, existing_music = self.get_playlist_music_ids(playlist_id)
+        new_song_ids = list(OrderedSet(music_id for music_id in music_ids if music_id not in existing_music))
         if new_song_ids:
-            self.spotipy.playlist_add_items(playlist_id, new_song_ids)
+            for start in range(0, len(new_song_ids), self.playlist_item_page_size):
+                chunk = new_song_ids[start:start + self.playlist_item_page_size]
+                snapshot_id = self._call(self.spotipy.playlist_add_items, playlist_id, chunk)["snapshot_id"]
+            existing_music.update(new_song_ids)
+            self._save_playlist_music_ids(playlist_id, snapshot_id, existing_music)
         else:
             logger.info("No new music to add to the playlist")
 
-    def get_song(self, song: Music) -> str:
+    def get_playlist_music_ids(self, playlist_id: str) -> Tuple[str, Set[str]]:
+        """
+        Get ids of all music in a playlist, only reading the whole playlist if it has changed since it was cached
+        :param playlist_id: id for playlist
+        :return: snapshot id of the playlist and ids of the music in it
+        """
+        snapshot_id = self._call(self.spotipy.playlist, playlist_id, fields="snapshot_id")["snapshot_id"]
+        cached = self._load_playlist_music_ids(playlist_id)
+        if cached and cached["snapshot_id"] == snapshot_id:
+            return snapshot_id, set(cached["music_ids"])
+
+        music_ids = set()
+        offset = 0
+        while True:
+            page = self._call(self.spotipy.playlist_items, playlist_id, fields="items(track(id))",
+                              limit=self.playlist_item_page_size, offset=offset)
+            music_ids.update(item["track"]["id"] for item in page["items"] if item["track"])
+            offset += len(page["items"])
+            if len(page["items"]) < self.playlist_item_page_size:
+                break
+        self._save_playlist_music_ids(playlist_id, snapshot_id, music_ids)
+        return snapshot_id, music_ids
+
+    def get_playlist_items(self, playlist_id: str) -> Tuple[str, List[Optional[str]]]:
+        """
+        Get all items in a playlist in order
+        :param playlist_id: id for playlist
+        :return: snapshot id of the playlist and ids of the music in it, uris for local files or None for items which
+        are no longer available
+        """
+        snapshot_id = self._call(self.spotipy.playlist, playlist_id, fields="snapshot_id")["snapshot_id"]
+        items = []
+        while True:
+            page = self._call(self.spotipy.playlist_items, playlist_id, fields="items(track(id,uri))",
+                              limit=self.playlist_item_page_size, offset=len(items))
+            items.extend(item["track"]["id"] or item["track"]["uri"] if item["track"] else None
+                         for item in page["items"])
+            if len(page["items"]) < self.playlist_item_page_size:
+                break
+        return snapshot_id, items
+
+    def mirror_playlist(self, playlist_id: str, music_ids: List[str]) -> MirrorPlan:
+        """
+        Make the playlist contain exactly the music, in the same order, with as few changes as possible
+        :param playlist_id: id for playlist
+        :param music_ids: song ids the playlist should have, in order
+        :return: changes made to the playlist
+        """
+        snapshot_id, current = self.get_playlist_items(playlist_id)
+        plan = plan_mirror(current, music_ids)
+        page_size = self.playlist_item_page_size
+        if any(item is None for _, item in plan.removals):
+            # unavailable items have no uri to remove them by, so they only go when every item is replaced
+            logger.warning("Playlist has unavailable songs, replacing all of its songs")
+            target = list(OrderedSet(music_ids))
+            snapshot_id = self._call(self.spotipy.playlist_replace_items, playlist_id,
+                                     target[:page_size])["snapshot_id"]
+            for start in range(page_size, len(target), page_size):
+                snapshot_id = self._call(self.spotipy.playlist_add_items, playlist_id, target[start:start + page_size],
+                                         position=start)["snapshot_id"]
+            plan = MirrorPlan(list(enumerate(current))[::-1], [], [(0, target)] if target else [])
+        else:
+            for start in range(0, len(plan.removals), page_size):
+                positions = defaultdict(list)
+                for position, item in plan.removals[start:start + page_size]:
+                    positions[item].append(position)
+                items = [{"uri": item, "positions": item_positions} for item, item_positions in positions.items()]
+                snapshot_id = self._call(self.spotipy.playlist_remove_specific_occurrences_of_items, playlist_id,
+                                         items)["snapshot_id"]
+            for range_start, insert_before, range_length in plan.moves:
+                snapshot_id = self._call(self.spotipy.playlist_reorder_items, playlist_id, range_start, insert_before,
+                                         range_length=range_length)["snapshot_id"]
+            for position, items in plan.additions:
+                for start in range(0, len(items), page_size):
+                    snapshot_id = self._call(self.spotipy.playlist_add_items, playlist_id,
+                                             items[start:start + page_size], position=position + start)["snapshot_id"]
+
+        moved = sum(range_length for _, _, range_length in plan.moves)
+        added = sum(len(items) for _, items in plan.additions)
+        logger.info(f"Mirrored playlist, removed {len(plan.removals)}, moved {moved} and added {added} songs")
+        self._save_playlist_music_ids(playlist_id, snapshot_id, set(music_ids))
+        return plan
+
+    def _playlist_music_ids_path(self, playlist_id: str) -> Optional[Path]:
+        if not self.cache_dir:
+            return None
+        return self.cache_dir / "spotify_playlists" / f"{playlist_id}.json"
+
+    def _load_playlist_music_ids(self, playlist_id: str) -> Optional[dict]:
+        path = self._playlist_music_ids_path(playlist_id)
+        if path is None:
+            return self._playlist_music_ids.get(playlist_id)
+        if not path.exists():
+            return None
+        with open(path) as handle:
+            return json.load(handle)
+
+    def _save_playlist_music_ids(self, playlist_id: str, snapshot_id: str, music_ids: Set[str]) -> None:
+        cached = {"snapshot_id": snapshot_id, "music_ids": sorted(music_ids)}
+        path = self._playlist_music_ids_path(playlist_id)
+        if path is None:
+            self._playlist_music_ids[playlist_id] = cached
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as handle:
+            json.dump(cached, handle)
+
+    def get_song(self, song: Music) -> dict:
         """
         Query spotify for song
         :param song: Music Object
-        :raises MusicNotFoundError: if no tracks are found
+        :raises MusicNotFoundError: if no tracks match
         :return: spotify song
         """
-        results = self.spotipy.search(q=f"artist:{song.artist} track:{song.title}")
+        return self.match_song(song).candidate
+
+    def match_song(self, song: Music) -> Match:
+        """
+        Query spotify for song once, ranking a page of results against the raw and sanitized song
+        :param song: Music Object
+        :raises MusicNotFoundError: if no tracks match
+        :return: best matching spotify song, with confidence from 0 to 1
+        """
+        results = self._call(self.spotipy.search, q=f"artist:{song.artist} track:{song.title}",
+                             limit=self.search_page_size)
         if not results:
             raise MusicNotFoundError()
-        filtered = [result for result in results["tracks"]["items"] if song.title in result["name"].lower()]
-        filtered.sort(key=lambda x: len(x["name"]))
-        if not filtered:
+        matches = rank_candidates(song, results["tracks"]["items"])
+        if not matches:
             raise MusicNotFoundError()
-        return filtered[0]
+        best = matches[0]
+        logger.debug(f"Matched {song.to_string()} to '{best.candidate['name']}' with confidence {best.confidence}")
+        return best
 
-    def get_album(self, album: Music) -> List[str]:
+    def get_album(self, album: Music) -> dict:
         """
         Query spotify for album
         :param album: Music Object
-        :raises MusicNotFoundError: if no tracks are found
+        :raises MusicNotFoundError: if no albums are found
         :return: spotify album
         """
-        results = self.spotipy.search(q=f"artist:{album.artist} album:{album.title}")
+        results = self._call(self.spotipy.search, q=f"artist:{album.artist} album:{album.title}", type="album")
 
         if not results:
             raise MusicNotFoundError()
+        albums = results["albums"]["items"]
+        # compare cleaned names, as the album title has had its punctuation and accents cleaned away
+        names = Music.clean_strings(result["name"] for result in albums)
+        filtered = [result for result, name in zip(albums, names) if album.title.strip() in name]
+        filtered.sort(key=lambda x: len(x["name"]))
+        if not filtered:
+            raise MusicNotFoundError()
+        return filtered[0]
+
+    def get_album_track_ids(self, album_ids: List[str]) -> Dict[str, List[str]]:
+        """
+        Get all track ids for albums, fetching albums in batches
+        :param album_ids: spotify album ids
+        :return: track ids for each album
+        """
+        albums = self.get_albums(album_ids)
+        return {album["id"]: [track["id"] for track in album["tracks"]["items"]] for album in albums}
+
+    def get_albums(self, album_ids: List[str]) -> List[dict]:
+        """
+        Get albums with all of their tracks, fetching albums in batches
+        :param album_ids: spotify album ids
+        :return: spotify albums which were found
+        """
+        found = []
+        for start in range(0, len(album_ids), self.album_batch_size):
+            albums = self._call(self.spotipy.albums, album_ids[start:start + self.album_batch_size])["albums"]
+            for album in filter(None, albums):
+                tracks = album["tracks"]["items"]
+                # albums only include the first page of tracks
+                while len(tracks) < album["tracks"]["total"]:
+                    page = self._call(self.spotipy.album_tracks, album["id"], limit=self.album_track_page_size,
+                                      offset=len(tracks))
+                    if not page["items"]:
+                        break
+                    tracks.extend(page["items"])
+                found.append(album)
+        return found
+
+    def get_artist_catalog(self, artist: str) -> List[dict]:
+        """
+        Get tracks by an artist, so that their songs can be matched without searching for each one.
+        Takes four requests, unless an album has more tracks than spotify returns with the album
+        :param artist: cleaned artist name
+        :return: the artist's top tracks followed by the tracks on their newest albums and singles,
+                 empty if the artist isn't on spotify
+        """
+        results = self._call(self.spotipy.search, q=f"artist:{artist}", type="artist", limit=self.search_page_size)
+        spotify_artist = match_artist(artist, results["artists"]["items"]) if results else None
+        if spotify_artist is None:
+            return []
 
-        return [result for result in results["tracks"]["items"]]
+        tracks = self._call(self.spotipy.artist_top_tracks, spotify_artist["id"], country=self.market)["tracks"]
+        albums = self._call(self.spotipy.artist_albums, spotify_artist["id"], album_type="album,single",
+                            country=self.market, limit=self.artist_catalog_albums)["items"]
+        for album in self.get_albums([album["id"] for album in albums]):
+            tracks.extend(album["tracks"]["items"])
+        # top tracks are also on albums, and only what is needed for matching is kept as catalogs are cached
+        unique_tracks = {}
+        for track in tracks:
+            unique_tracks.setdefault(track["id"], track)
+        return [{"id": track["id"], "name": track["name"], "artists": [{"name": x["name"]} for x in track["artists"]]}
+                for track in unique_tracks.values()]
@@ -0,0 +1,68 @@
+import heapq
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from loguru import logger
+
+from bbc_meet_spotify.bbc_sounds import BBCSounds
+
+
+class PlaylistWatcher:
+    def __init__(self, all_bbc_sounds: List[BBCSounds], sync: Callable[[BBCSounds], None],
+                 interval_minutes: float = 60, jitter: float = 0.1):
+        """
+        Polls bbc sounds playlists on their own schedules, syncing them when their page has changed.
+        A playlist's poll interval can be set with poll_minutes in bbc_playlists.toml
+        :param all_bbc_sounds: playlists to watch
+        :param sync: called with a playlist when its page has changed
+        :param interval_minutes: default time between polls of a playlist
+        :param jitter: fraction of the interval to randomly vary each poll by, so that polls don't line up
+        """
+        self.all_bbc_sounds = all_bbc_sounds
+        self.sync = sync
+        self.interval_minutes = interval_minutes
+        self.jitter = jitter
+        self.fingerprints: Dict[str, Optional[str]] = {}
+        self._stop = threading.Event()
+
+    def run(self, max_polls: int = None) -> None:
+        """
+        Poll playlists until stopped
+        :param max_polls: stop after this many polls, runs forever if not set
+        """
+        schedule = [(time.monotonic(), index) for index in range(len(self.all_bbc_sounds))]
+        heapq.heapify(schedule)
+        polls = 0
+        while schedule and not self._stop.is_set() and (max_polls is None or polls < max_polls):
+            poll_time, index = heapq.heappop(schedule)
+            if self._stop.wait(max(0.0, poll_time - time.monotonic())):
+                break
+            bbc_sounds = self.all_bbc_sounds[index]
+            self.poll(bbc_sounds)
+            polls += 1
+            heapq.heappush(schedule, (time.monotonic() + self._get_interval(bbc_sounds), index))
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def poll(self, bbc_sounds: BBCSounds) -> None:
+        """
+        Sync playlist if its page has changed since it was last synced, errors are logged so that watching continues
+        :param bbc_sounds: playlist to poll
+        """
+        try:
+            fingerprint = bbc_sounds.get_page_fingerprint()
+            if fingerprint is not None and fingerprint == self.fingerprints.get(bbc_sounds.playlist_suffix):
+                logger.debug(f"No changes to '{bbc_sounds.playlist_suffix}' since last poll")
+                return
+            logger.info(f"Syncing '{bbc_sounds.playlist_suffix}'")
+            self.sync(bbc_sounds)
+            self.fingerprints[bbc_sounds.playlist_suffix] = fingerprint
+        except Exception:
+            logger.exception(f"Failed to sync '{bbc_sounds.playlist_suffix}', will try again next poll")
+
+    def _get_interval(self, bbc_sounds: BBCSounds) -> float:
+        interval = bbc_sounds.playlist.get("poll_minutes", self.interval_minutes) * 60
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
@@ -0,0 +1,325 @@
+"""
+Local stand-in for the spotify web api endpoints used by SpotipyClient, for load and latency testing offline.
+
+Point SpotipyClient at it by adding the server's url to config.toml, e.g. api_url = "http://127.0.0.1:8000/v1/"
+Run it with: python -m tests.fake_spotify --port 8000 --latency 0.05 --rate-limit-every 50
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+# ids in paths, so that requests are counted by endpoint
+_ID = re.compile(r"/(?:track|album|playlist|artist)[0-9]+")
+
+
+class FakeSpotifyCatalog:
+    tracks_per_album = 10
+    albums_per_artist = 2
+
+    def __init__(self, size: int = 10000, username: str = "fake-user", playlists: int = 0):
+        """
+        Synthetic catalog, track i is "title i" by "artist j" on "album k".
+        Each artist has two albums of ten tracks
+        :param size: number of tracks
+        :param username: user that owns the playlists
+        :param playlists: number of playlists the user already has, each with one track
+        """
+        self.username = username
+        self.tracks = [self._make_track(index) for index in range(size)]
+        self.albums = {}
+        for track in self.tracks:
+            album = self.albums.setdefault(track["album"]["id"], dict(track["album"], tracks=[]))
+            album["tracks"].append(track)
+        self._tracks_by_name = defaultdict(list)
+        for track in self.tracks:
+            self._tracks_by_name[(track["artists"][0]["name"], track["name"])].append(track)
+        self._albums_by_name = defaultdict(list)
+        self.artists = {}
+        for album in self.albums.values():
+            self._albums_by_name[(album["artists"][0]["name"], album["name"])].append(album)
+            artist = self.artists.setdefault(album["artists"][0]["id"], dict(album["artists"][0], albums=[]))
+            artist["albums"].append(album)
+        self.playlists: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        for index in range(playlists):
+            self.create_playlist(f"playlist {index}", True)["tracks"].append(self.tracks[index % size]["id"])
+
+    def _make_track(self, index: int) -> dict:
+        album_index = index // self.tracks_per_album
+        artist = {"id": f"artist{album_index // self.albums_per_artist}",
+                  "name": f"artist {album_index // self.albums_per_artist}"}
+        album = {"id": f"album{album_index}", "name": f"album {album_index}", "artists": [artist]}
+        return {"id": f"track{index}", "name": f"title {index}", "artists": [artist], "album": album}
+
+    def search(self, query: str, search_type: str) -> List[dict]:
+        fields = dict(re.findall(r"(\w+):(.*?)(?= \w+:|$)", query))
+        if search_type == "album":
+            return self._albums_by_name.get((fields.get("artist"), fields.get("album")), [])
+        if search_type == "artist":
+            return [_artist(x) for x in self.artists.values() if x["name"] == fields.get("artist")]
+        return self._tracks_by_name.get((fields.get("artist"), fields.get("track")), [])
+
+    def create_playlist(self, name: str, public: bool) -> dict:
+        with self._lock:
+            playlist_id = f"playlist{len(self.playlists)}"
+            self.playlists[playlist_id] = {"id": playlist_id, "name": name, "public": public, "snapshot_id": "0",
+                                           "tracks": []}
+            return self.playlists[playlist_id]
+
+    def add_to_playlist(self, playlist_id: str, uris: List[str], position: int = None) -> str:
+        with self._lock:
+            playlist = self.playlists[playlist_id]
+            position = len(playlist["tracks"]) if position is None else position
+            playlist["tracks"][position:position] = [uri.split(":")[-1] for uri in uris]
+            return self._new_snapshot(playlist)
+
+    def replace_playlist(self, playlist_id: str, uris: List[str]) -> str:
+        with self._lock:
+            playlist = self.playlists[playlist_id]
+            playlist["tracks"] = [uri.split(":")[-1] for uri in uris]
+            return self._new_snapshot(playlist)
+
+    def remove_from_playlist(self, playlist_id: str, tracks: List[dict]) -> Optional[str]:
+        with self._lock:
+            playlist = self.playlists[playlist_id]
+            positions = [(position, track["uri"].split(":")[-1])
+                         for track in tracks for position in track["positions"]]
+            if any(position >= len(playlist["tracks"]) or playlist["tracks"][position] != track_id
+                   for position, track_id in positions):
+                return None
+            for position, _ in sorted(positions, reverse=True):
+                del playlist["tracks"][position]
+            return self._new_snapshot(playlist)
+
+    def reorder_playlist(self, playlist_id: str, range_start: int, insert_before: int, range_length: int) -> str:
+        with self._lock:
+            tracks = self.playlists[playlist_id]["tracks"]
+            moved = tracks[range_start:range_start + range_length]
+            del tracks[range_start:range_start + range_length]
+            if insert_before > range_start:
+                insert_before -= range_length
+            tracks[insert_before:insert_before] = moved
+            return self._new_snapshot(self.playlists[playlist_id])
+
+    @staticmethod
+    def _new_snapshot(playlist: dict) -> str:
+        playlist["snapshot_id"] = str(int(playlist["snapshot_id"]) + 1)
+        return playlist["snapshot_id"]
+
+
+class FakeSpotifyServer:
+    def __init__(self, catalog: FakeSpotifyCatalog = None, latency: float = 0.0, rate_limit_every: int = 0,
+                 retry_after: int = 1, requests_per_second: float = None, host: str = "127.0.0.1", port: int = 0):
+        """
+        Http server emulating the spotify web api
+        :param catalog: tracks, albums and playlists to serve, a 10000 track catalog if not set
+        :param latency: seconds to wait before each response
+        :param rate_limit_every: respond to every nth request with 429, never if 0
+        :param retry_after: seconds given in the Retry-After header of 429 responses
+        :param requests_per_second: respond with 429 to requests over this rate, unlimited if not set
+        :param host: host to listen on
+        :param port: port to listen on, any free port if 0
+        """
+        self.catalog = catalog or FakeSpotifyCatalog()
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.requests_per_second = requests_per_second
+        self.request_counts = Counter()
+        self.rate_limited = 0
+        self._request_times: List[float] = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/"
+
+    def start(self) -> "FakeSpotifyServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeSpotifyServer":
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def _is_rate_limited(self) -> bool:
+        with self._lock:
+            self.request_counts["total"] += 1
+            now = time.monotonic()
+            self._request_times = [x for x in self._request_times if x > now - 1]
+            self._request_times.append(now)
+            limited = ((self.rate_limit_every and self.request_counts["total"] % self.rate_limit_every == 0)
+                       or (self.requests_per_second and len(self._request_times) > self.requests_per_second))
+            if limited:
+                self.rate_limited += 1
+            return bool(limited)
+
+    def _route(self, method: str, path: str, query: Dict[str, str], body) -> Tuple[int, dict]:
+        catalog = self.catalog
+        limit = int(query.get("limit", 20))
+        offset = int(query.get("offset", 0))
+        parts = path.strip("/").split("/")[1:]
+
+        if method == "GET" and parts == ["me"]:
+            return 200, {"id": catalog.username, "display_name": catalog.username}
+        if method == "GET" and parts == ["search"]:
+            if limit > 50:
+                return 400, _error(400, "Invalid limit")
+            search_type = query.get("type", "track")
+            items = catalog.search(query.get("q", ""), search_type)
+            return 200, {f"{search_type}s": _page(items, limit, offset)}
+        if parts[:1] == ["users"] and parts[2:] == ["playlists"]:
+            if method == "POST":
+                return 201, _playlist(catalog.create_playlist(body["name"], body.get("public", True)))
+            if limit > 50:
+                return 400, _error(400, "Invalid limit")
+            return 200, _page([_playlist(x) for x in list(catalog.playlists.values())], limit, offset)
+        if parts[:1] == ["playlists"] and len(parts) > 1 and parts[1] in catalog.playlists:
+            playlist = catalog.playlists[parts[1]]
+            if parts[2:] == [] and method == "GET":
+                return 200, _playlist(playlist)
+            if parts[2:] == ["tracks"] and method == "GET":
+                if limit > 100:
+                    return 400, _error(400, "Invalid limit")
+                # None tracks stand for songs which are no longer available
+                return 200, _page([{"track": {"id": x, "uri": f"spotify:track:{x}"} if x else None}
+                                   for x in playlist["tracks"]], limit, offset)
+            if parts[2:] == ["tracks"] and method == "POST":
+                uris = body["uris"] if isinstance(body, dict) else body
+                if len(uris) > 100:
+                    return 400, _error(400, "Too many tracks requested")
+                position = int(query["position"]) if "position" in query else None
+                return 201, {"snapshot_id": catalog.add_to_playlist(playlist["id"], uris, position)}
+            if parts[2:] == ["tracks"] and method == "DELETE":
+                if len(body["tracks"]) > 100:
+                    return 400, _error(400, "Too many tracks requested")
+                snapshot_id = catalog.remove_from_playlist(playlist["id"], body["tracks"])
+                if snapshot_id is None:
+                    return 400, _error(400, "Could not remove tracks, please check parameters")
+                return 200, {"snapshot_id": snapshot_id}
+            if parts[2:] == ["tracks"] and method == "PUT" and "uris" in body:
+                if len(body["uris"]) > 100:
+                    return 400, _error(400, "Too many tracks requested")
+                return 200, {"snapshot_id": catalog.replace_playlist(playlist["id"], body["uris"])}
+            if parts[2:] == ["tracks"] and method == "PUT":
+                return 200, {"snapshot_id": catalog.reorder_playlist(playlist["id"], body["range_start"],
+                                                                     body["insert_before"], body["range_length"])}
+        if method == "GET" and parts == ["albums"]:
+            ids = query.get("ids", "").split(",")
+            if len(ids) > 20:
+                return 400, _error(400, "Too many ids requested")
+            albums = [catalog.albums.get(x) for x in ids]
+            return 200, {"albums": [_album(x) if x else None for x in albums]}
+        if method == "GET" and parts[:1] == ["albums"] and parts[2:] == ["tracks"] and parts[1] in catalog.albums:
+            return 200, _page(catalog.albums[parts[1]]["tracks"], limit, offset)
+        if method == "GET" and parts[:1] == ["artists"] and len(parts) == 3 and parts[1] in catalog.artists:
+            artist = catalog.artists[parts[1]]
+            if parts[2] == "top-tracks":
+                return 200, {"tracks": [track for album in artist["albums"] for track in album["tracks"]][:10]}
+            if parts[2] == "albums":
+                if limit > 50:
+                    return 400, _error(400, "Invalid limit")
+                return 200, _page([_album(x) for x in artist["albums"]], limit, offset)
+        return 404, _error(404, "Not found")
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body are written separately, don't wait for acks between them on kept alive connections
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                self._respond("GET")
+
+            def do_POST(self):
+                self._respond("POST")
+
+            def do_PUT(self):
+                self._respond("PUT")
+
+            def do_DELETE(self):
+                self._respond("DELETE")
+
+            def _respond(self, method: str):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                url = urlparse(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                time.sleep(server.latency)
+                headers = {}
+                if server._is_rate_limited():
+                    status, content = 429, _error(429, "API rate limit exceeded")
+                    headers["Retry-After"] = str(server.retry_after)
+                else:
+                    with server._lock:
+                        server.request_counts[f"{method} {_ID.sub('/id', url.path)}"] += 1
+                    status, content = server._route(method, url.path, query, body)
+                data = json.dumps(content).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def _page(items: list, limit: int, offset: int) -> dict:
+    return {"items": items[offset:offset + limit], "limit": limit, "offset": offset, "total": len(items),
+            "next": None if offset + limit >= len(items) else f"offset={offset + limit}"}
+
+
+def _playlist(playlist: dict) -> dict:
+    return dict(playlist, tracks={"total": len(playlist["tracks"])})
+
+
+def _album(album: dict) -> dict:
+    return dict(album, tracks=_page(album["tracks"], 50, 0))
+
+
+def _artist(artist: dict) -> dict:
+    return {"id": artist["id"], "name": artist["name"]}
+
+
+def _error(status: int, message: str) -> dict:
+    return {"error": {"status": status, "message": message}}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--catalog-size", type=int, default=100000, help="number of tracks")
+    parser.add_argument("--playlists", type=int, default=0, help="number of playlists the user already has")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before each response")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="respond to every nth request with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="seconds in the Retry-After header")
+    parser.add_argument("--requests-per-second", type=float, default=None, help="respond with 429 over this rate")
+    args = parser.parse_args()
+    fake = FakeSpotifyServer(FakeSpotifyCatalog(args.catalog_size, playlists=args.playlists), args.latency,
+                             args.rate_limit_every, args.retry_after, args.requests_per_second, port=args.port)
+    print(f"Fake spotify api listening on {fake.url}")
+    fake._server.serve_forever()
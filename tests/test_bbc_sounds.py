@@ -1,6 +1,10 @@
 from pathlib import Path
+from unittest.mock import patch
 
 from bbc_meet_spotify import BBCSounds
+from bbc_meet_spotify.bbc_sounds import AlbumScraper, PlaylistScraper, ScraperBase, ShowScraper
+from bbc_meet_spotify.playlist_history import PlaylistHistory
+from bbc_meet_spotify.watch import PlaylistWatcher
 
 
 class TestPlaylistParsing:
@@ -82,3 +86,198 @@ class TestPlaylistParsing:
         bbc_sounds = BBCSounds("dance_party_2021_multi", True, "testing me", self.playlist_config)
         output_songs = bbc_sounds.get_music()
         assert len(output_songs) == 133
+
+
+class TestShowScraper:
+    pages = {
+        "https://www.bbc.co.uk/programmes/m000qx9p": "tests/resources/dance-party-2021_1.html",
+        "https://www.bbc.co.uk/programmes/m000r53r": "tests/resources/dance-party-2021_2.html",
+        "https://www.bbc.co.uk/programmes/m000rcd4": "tests/resources/dance-party-2021_no-songs.html",
+        "https://www.bbc.co.uk/programmes/b006wqdc/episodes/guide": "tests/resources/dance-party-2021_episodes_1.html",
+        "https://www.bbc.co.uk/programmes/b006wqdc/episodes/guide?page=2":
+            "tests/resources/dance-party-2021_episodes_2.html",
+    }
+
+    def read_page(self, url: str) -> str:
+        return ScraperBase.read_page(self.pages[url])
+
+    def test_episode_guide_scraped_in_broadcast_order(self):
+        with patch.object(ShowScraper, "read_page", side_effect=self.read_page):
+            songs = ShowScraper().scrape_bbc_sounds("https://www.bbc.co.uk/programmes/m000qx9p", [])
+
+        assert len(songs) == 137
+        assert songs[0] == ("Eric Prydz", "NOPUS")
+        assert songs[-1] == ("Marquis Hawkes", "The Basement Is Burning")
+
+    def test_episode_guide_skips_parsed_shows_without_fetching(self):
+        with patch.object(ShowScraper, "read_page", side_effect=self.read_page) as mock_read_page:
+            scraper = ShowScraper()
+            songs = scraper.scrape_bbc_sounds("https://www.bbc.co.uk/programmes/m000qx9p",
+                                              ["https://www.bbc.co.uk/programmes/m000r53r"])
+
+        assert len(songs) == 70
+        assert "https://www.bbc.co.uk/programmes/m000r53r" not in [x.args[0] for x in mock_read_page.call_args_list[1:]]
+        assert list(scraper.parsed_urls) == ["https://www.bbc.co.uk/programmes/m000r53r",
+                                             "https://www.bbc.co.uk/programmes/m000qx9p"]
+
+    def test_episodes_yielded_as_they_are_scraped(self):
+        with patch.object(ShowScraper, "read_page", side_effect=self.read_page):
+            episodes = list(ShowScraper().iter_bbc_sounds("https://www.bbc.co.uk/programmes/m000qx9p", []))
+
+        assert [len(x) for x in episodes] == [70, 67]
+        assert episodes[0][0] == ("Eric Prydz", "NOPUS")
+
+    def test_episodes_parsed_in_processes(self):
+        url = "https://www.bbc.co.uk/programmes/m000qx9p"
+        with patch.object(ShowScraper, "read_page", side_effect=self.read_page):
+            songs = ShowScraper().scrape_bbc_sounds(url, [])
+            scraper = ShowScraper(parse_processes=2)
+            process_songs = scraper.scrape_bbc_sounds(url, [])
+
+        assert process_songs == songs
+        assert list(scraper.parsed_urls) == ["https://www.bbc.co.uk/programmes/m000qx9p",
+                                             "https://www.bbc.co.uk/programmes/m000r53r"]
+        assert scraper._parse_pool is None
+
+    def test_interrupted_crawl_resumed_without_fetching_scraped_episodes(self, tmp_path):
+        url = "https://www.bbc.co.uk/programmes/m000qx9p"
+        history = PlaylistHistory(tmp_path / "history.sqlite", "show")
+        with patch.object(ShowScraper, "read_page", side_effect=self.read_page):
+            scraper = ShowScraper()
+            scraper.resume_crawl(history)
+            episodes = scraper.iter_bbc_sounds(url, [])
+            first_episode = next(episodes)
+            # stopped by an error before the second episode
+            episodes.close()
+
+        [(scraped_url, _, tracks)] = history.get_crawled_episodes()
+        assert tracks == first_episode
+        with patch.object(ShowScraper, "read_page", side_effect=self.read_page) as mock_read_page:
+            scraper = ShowScraper()
+            scraper.resume_crawl(history)
+            episodes = list(scraper.iter_bbc_sounds(url, []))
+
+        assert episodes[0] == first_episode
+        assert [len(x) for x in episodes] == [70, 67]
+        assert scraped_url not in [x.args[0] for x in mock_read_page.call_args_list[1:]]
+        scraper.add_parsed_shows(history)
+        assert history.get_crawled_episodes() == []
+
+
+class TestScraperBase:
+    def test_partial_parsing_matches_full_parse(self):
+        for parser in ScraperBase.parsers:
+            scraper = ShowScraper(parser)
+            partial_songs = scraper.scrape_bbc_sounds("tests/resources/dance-party-2021_1.html", [])
+            scraper = ShowScraper(parser)
+            scraper.parse_only = None
+            full_songs = scraper.scrape_bbc_sounds("tests/resources/dance-party-2021_1.html", [])
+            assert partial_songs == full_songs
+
+    def test_unknown_parser_raises(self):
+        try:
+            ScraperBase("not-a-parser")
+            assert False
+        except ValueError:
+            pass
+
+
+class TestStructuredData:
+    json_ld = """<html><head><script type="application/ld+json">
+        {"@context": "https://schema.org", "@type": "MusicPlaylist", "track": [
+            {"@type": "MusicRecording", "name": "Hunter - Live", "byArtist": {"@type": "MusicGroup",
+             "name": "Becca Mancari"}, "inAlbum": {"@type": "MusicAlbum", "name": "Hunter", "byArtist": "A"}},
+            {"@type": "MusicRecording", "name": "Atlas", "byArtist": [{"name": "Bicep"}]}
+        ]}
+        </script></head><body><p>Becca Mancari - Hunter - Live<br/>Bicep - Atlas</p></body></html>"""
+    preloaded_state = """<html><body><script>window.__PRELOADED_STATE__ = {"promos": [
+        {"titles": {"primary": "Radio 1 Dance", "secondary": "Non-stop dance music"}}], "tracklist": {"tracks": [
+        {"segment_type": "music", "titles": {"primary": "Eric Prydz", "secondary": "NOPUS"}},
+        {"segmentType": "music", "titles": {"primary": "Maduk", "secondary": "Come Back To Me"}}
+        ]}};</script><p>Eric Prydz - NOPUS</p><p>Maduk - Come Back To Me</p></body></html>"""
+
+    def test_json_ld_tracks_used_instead_of_page(self):
+        with patch.object(ScraperBase, "read_page", return_value=self.json_ld):
+            songs = PlaylistScraper().scrape_bbc_sounds("https://www.bbc.co.uk/playlist", [])
+
+        assert songs == [("Becca Mancari", "Hunter - Live"), ("Bicep", "Atlas")]
+
+    def test_preloaded_state_music_segments_used_instead_of_page(self):
+        with patch.object(ScraperBase, "read_page", return_value=self.preloaded_state):
+            songs = PlaylistScraper().scrape_bbc_sounds("https://www.bbc.co.uk/playlist", [])
+
+        assert songs == [("Eric Prydz", "NOPUS"), ("Maduk", "Come Back To Me")]
+
+    def test_structured_music_not_on_page_ignored(self):
+        page = self.json_ld.replace("Becca Mancari - Hunter - Live<br/>", "")
+        with patch.object(ScraperBase, "read_page", return_value=page):
+            songs = PlaylistScraper().scrape_bbc_sounds("https://www.bbc.co.uk/playlist", [])
+
+        assert songs == [("Bicep", "Atlas")]
+
+    def test_json_ld_albums(self):
+        page = """<script type="application/ld+json">[{"@type": "WebPage", "name": "6 Music"},
+            {"@type": "MusicRecording", "name": "Ain't Nice", "byArtist": "Viagra Boys",
+             "inAlbum": {"@type": "MusicAlbum", "name": "Welfare Jazz", "byArtist": {"name": "Viagra Boys"}}},
+            {"@type": "MusicAlbum", "name": "Welfare Jazz: Deluxe", "byArtist": {"name": "Viagra Boys"}}]</script>
+            <h2 class="beta">A</h2><h2 class="beta">B</h2><h2 class="beta">C</h2><h2 class="beta">Albums</h2>
+            <p>Album of the day: Welfare Jazz: Deluxe by Viagra Boys</p>"""
+        with patch.object(ScraperBase, "read_page", return_value=page):
+            albums = AlbumScraper().scrape_bbc_sounds("https://www.bbc.co.uk/playlist", [])
+
+        assert albums == [("Viagra Boys", "Welfare Jazz: Deluxe")]
+
+    def test_page_without_music_in_structured_data_is_parsed(self):
+        page = ScraperBase.read_page("tests/resources/bbc_sounds_6music.html").replace(
+            "</head>", '<script type="application/ld+json">{"@type": "Article", "name": "6 Music"}</script></head>'
+        )
+        with patch.object(ScraperBase, "read_page", return_value=page):
+            songs = PlaylistScraper().scrape_bbc_sounds("https://www.bbc.co.uk/playlist", [])
+
+        assert len(songs) == 35
+        assert songs[-1] == ("Tim Burgess", "Laurie")
+
+
+class TestBBCSoundsHistory:
+    def test_written_history_skipped_next_time(self, tmp_path):
+        playlist_config = Path(__file__).parent / "resources" / "test_playlists.toml"
+        bbc_sounds = BBCSounds("six_music", False, "testing me", playlist_config, tmp_path)
+        bbc_sounds.write_playlist_history(bbc_sounds.get_music())
+
+        bbc_sounds = BBCSounds("six_music", False, "testing me", playlist_config, tmp_path)
+        assert bbc_sounds.get_music() == []
+
+    def test_watched_date_prefixed_playlist_has_new_history_each_day(self):
+        playlist_config = Path(__file__).parent / "resources" / "test_playlists.toml"
+        bbc_sounds = BBCSounds("six_music", True, "testing me", playlist_config)
+        synced = []
+        today = ["2021-01-01"]
+
+        def sync(playlist: BBCSounds):
+            music = playlist.get_music()
+            synced.append(music)
+            playlist.write_playlist_history(music)
+            # the page doesn't change before the next poll, which is on the next day
+            today[0] = "2021-01-02"
+
+        with patch("bbc_meet_spotify.bbc_sounds.time") as mock_time:
+            mock_time.strftime.side_effect = lambda _: today[0]
+            PlaylistWatcher([bbc_sounds], sync, interval_minutes=0).run(max_polls=2)
+
+        assert len(synced) == 2
+        assert synced[0] and synced[1] == synced[0]
+
+    def test_fingerprint_only_changes_with_music_and_page_reused(self, tmp_path):
+        playlist_config = Path(__file__).parent / "resources" / "test_playlists.toml"
+        page = ScraperBase.read_page("tests/resources/bbc_sounds_6music.html")
+        pages = [f"{page}<script nonce='{index}'></script>" for index in range(2)]
+        pages.append(page.replace("Bicep", "Bicep & Friends"))
+        bbc_sounds = BBCSounds("six_music", False, "testing me", playlist_config, tmp_path)
+        with patch.object(ScraperBase, "read_page", side_effect=pages) as mock_read_page:
+            fingerprints = [bbc_sounds.get_page_fingerprint()]
+            music = bbc_sounds.get_music()
+            fingerprints.extend(bbc_sounds.get_page_fingerprint() for _ in range(2))
+
+        assert mock_read_page.call_count == 3
+        assert music == BBCSounds("six_music", False, "testing me", playlist_config, tmp_path).get_music()
+        assert fingerprints[0] == fingerprints[1] != fingerprints[2]
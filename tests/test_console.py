@@ -1,9 +1,50 @@
-from bbc_meet_spotify.console import console
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import typer
+from typer.testing import CliRunner, Result
+
+from bbc_meet_spotify.console import console, sync_all_playlists
 from bbc_meet_spotify.music import Music
 from bbc_meet_spotify.playlist_parsing import PlaylistChoices
 from unittest.mock import patch, MagicMock, ANY
 
 
+def invoke(*args: str) -> Result:
+    """Run the command line, as typer options are only read from the command line"""
+    app = typer.Typer()
+    app.command()(console)
+    return CliRunner().invoke(app, list(args))
+
+
+def test_startup_does_not_import_sync_dependencies():
+    code = "import sys, bbc_meet_spotify.console; print(sorted(set(sys.modules) & {'spotipy', 'bs4', 'requests'}))"
+    result = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True)
+    assert result.stdout.strip() == "[]"
+
+
+def test_playlist_choices_found_from_other_directories(tmp_path):
+    code = "from bbc_meet_spotify.playlist_parsing import PlaylistChoices; print(PlaylistChoices('six_music').value)"
+    env = {**os.environ, "PYTHONPATH": str(Path(__file__).resolve().parent.parent / "src")}
+    result = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True, cwd=tmp_path,
+                            env=env)
+    assert result.stdout.strip() == "six_music"
+
+
+def test_history_and_caches_found_from_other_directories(tmp_path):
+    code = ("import inspect; from bbc_meet_spotify.bbc_sounds import BBCSounds; "
+            "from bbc_meet_spotify.http_session import CachedSession; "
+            "print(inspect.signature(BBCSounds).parameters['history_dir'].default); print(CachedSession().cache_dir)")
+    env = {**os.environ, "PYTHONPATH": str(Path(__file__).resolve().parent.parent / "src")}
+    result = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True, cwd=tmp_path,
+                            env=env)
+    root = Path(__file__).resolve().parent.parent
+    assert result.stdout.split() == [str(root / "playlist_history"), str(root / ".cache" / "bbc_sounds")]
+
+
 def test_invalid_playlist_type():
     try:
         console(PlaylistChoices("invalid"))
@@ -11,8 +52,8 @@ def test_invalid_playlist_type():
         pass
 
 
-@patch("bbc_meet_spotify.console.BBCSounds")
-@patch("bbc_meet_spotify.console.Spotify")
+@patch("bbc_meet_spotify.bbc_sounds.BBCSounds")
+@patch("bbc_meet_spotify.spotify.Spotify")
 def test_add_songs(mock_spotify: MagicMock, mock_bbc_sounds: MagicMock):
     mock_bbc_sounds_instance = mock_bbc_sounds.return_value
     mock_spotify_instance = mock_spotify.return_value
@@ -20,15 +61,15 @@ def test_add_songs(mock_spotify: MagicMock, mock_bbc_sounds: MagicMock):
     mock_bbc_sounds_instance.get_music.return_value = music
     playlist_name = "suffix"
     mock_bbc_sounds_instance.playlist_suffix = playlist_name
-    console(PlaylistChoices("six_music"))
+    invoke("six_music")
     mock_bbc_sounds_instance.get_music.assert_called_once()
     mock_spotify_instance.add_albums.assert_not_called()
     mock_spotify_instance.add_songs.assert_called_with(playlist_name, music, ANY, ANY)
     mock_bbc_sounds_instance.write_playlist_history.assert_called_with(music)
 
 
-@patch("bbc_meet_spotify.console.BBCSounds")
-@patch("bbc_meet_spotify.console.Spotify")
+@patch("bbc_meet_spotify.bbc_sounds.BBCSounds")
+@patch("bbc_meet_spotify.spotify.Spotify")
 def test_add_albums(mock_spotify: MagicMock, mock_bbc_sounds: MagicMock):
     mock_bbc_sounds_instance = mock_bbc_sounds.return_value
     mock_spotify_instance = mock_spotify.return_value
@@ -37,15 +78,15 @@ def test_add_albums(mock_spotify: MagicMock, mock_bbc_sounds: MagicMock):
     mock_bbc_sounds_instance.type = "album"
     playlist_name = "suffix"
     mock_bbc_sounds_instance.playlist_suffix = playlist_name
-    console(PlaylistChoices("six_music"))
+    invoke("six_music")
     mock_bbc_sounds_instance.get_music.assert_called_once()
     mock_spotify_instance.add_albums.assert_called_with(playlist_name, music, ANY, ANY)
     mock_spotify_instance.add_songs.assert_not_called()
     mock_bbc_sounds_instance.write_playlist_history.assert_called_with(music)
 
 
-@patch("bbc_meet_spotify.console.BBCSounds")
-@patch("bbc_meet_spotify.console.Spotify")
+@patch("bbc_meet_spotify.bbc_sounds.BBCSounds")
+@patch("bbc_meet_spotify.spotify.Spotify")
 def test_exits_when_no_new_music(mock_spotify: MagicMock, mock_bbc_sounds: MagicMock):
     mock_bbc_sounds_instance = mock_bbc_sounds.return_value
     mock_spotify_instance = mock_spotify.return_value
@@ -53,8 +94,93 @@ def test_exits_when_no_new_music(mock_spotify: MagicMock, mock_bbc_sounds: Magic
     mock_bbc_sounds_instance.get_music.return_value = music
     playlist_name = "suffix"
     mock_bbc_sounds_instance.playlist_suffix = playlist_name
-    console(PlaylistChoices("six_music"))
+    invoke("six_music")
     mock_bbc_sounds_instance.get_music.assert_called_once()
     mock_spotify_instance.add_albums.assert_not_called()
     mock_spotify_instance.add_songs.assert_not_called()
     mock_bbc_sounds_instance.write_playlist_history.assert_not_called()
+
+
+@patch("bbc_meet_spotify.bbc_sounds.BBCSounds")
+@patch("bbc_meet_spotify.spotify.Spotify")
+def test_sync_all_playlists(mock_spotify: MagicMock, mock_bbc_sounds: MagicMock):
+    playlist_config = Path(__file__).parent / "resources" / "test_playlists.toml"
+    mock_bbc_sounds.get_playlist_info.return_value = {"six_music": {}, "six_music_albums": {}}
+    songs_instance, albums_instance = MagicMock(type="playlist"), MagicMock(type="album")
+    mock_bbc_sounds.side_effect = [songs_instance, albums_instance]
+    mock_spotify_instance = mock_spotify.return_value
+    songs, albums = {Music("artist", "song")}, {Music("artist", "album")}
+    songs_instance.get_music.return_value = songs
+    albums_instance.get_music.return_value = albums
+    sync_all_playlists(False, True, "html.parser", playlist_config)
+    assert mock_spotify.call_count == 1
+    mock_spotify_instance.add_songs.assert_called_once_with(songs_instance.playlist_suffix, songs, False, True)
+    mock_spotify_instance.add_albums.assert_called_once_with(albums_instance.playlist_suffix, albums, False, True)
+    songs_instance.write_playlist_history.assert_called_once_with(songs)
+    albums_instance.write_playlist_history.assert_called_once_with(albums)
+
+
+@patch("bbc_meet_spotify.bbc_sounds.BBCSounds")
+@patch("bbc_meet_spotify.spotify.Spotify")
+def test_sync_all_playlists_skips_failed_playlist(mock_spotify: MagicMock, mock_bbc_sounds: MagicMock):
+    playlist_config = Path(__file__).parent / "resources" / "test_playlists.toml"
+    mock_bbc_sounds.get_playlist_info.return_value = {"six_music": {}, "six_music_albums": {}}
+    failed_instance, albums_instance = MagicMock(type="playlist"), MagicMock(type="album")
+    mock_bbc_sounds.side_effect = [failed_instance, albums_instance]
+    failed_instance.get_music.side_effect = ValueError("page changed")
+    albums = {Music("artist", "album")}
+    albums_instance.get_music.return_value = albums
+    sync_all_playlists(False, True, "html.parser", playlist_config)
+    mock_spotify.return_value.add_albums.assert_called_once_with(albums_instance.playlist_suffix, albums, False, True)
+    failed_instance.write_playlist_history.assert_not_called()
+    albums_instance.write_playlist_history.assert_called_once_with(albums)
+
+
+@patch("bbc_meet_spotify.bbc_sounds.BBCSounds")
+def test_conflicting_options_are_usage_errors(mock_bbc_sounds: MagicMock):
+    for args in (["--all-playlists", "-n", "foo"], ["six_music", "--stream", "--mirror"], [], ["not_a_playlist"]):
+        assert invoke(*args).exit_code == 2, args
+    mock_bbc_sounds.assert_not_called()
+
+
+@patch("bbc_meet_spotify.bbc_sounds.BBCSounds")
+@patch("bbc_meet_spotify.spotify.Spotify")
+def test_metrics_written(mock_spotify: MagicMock, mock_bbc_sounds: MagicMock, tmp_path):
+    mock_bbc_sounds.return_value.get_music.return_value = []
+    invoke("six_music", "--metrics-report", str(tmp_path / "report.json"),
+           "--metrics-textfile", str(tmp_path / "metrics.prom"))
+    assert "stages" in json.loads((tmp_path / "report.json").read_text())
+    assert "bbc_meet_spotify_last_run_timestamp_seconds" in (tmp_path / "metrics.prom").read_text()
+
+
+@patch("bbc_meet_spotify.bbc_sounds.BBCSounds")
+@patch("bbc_meet_spotify.spotify.Spotify")
+def test_stream_songs(mock_spotify: MagicMock, mock_bbc_sounds: MagicMock):
+    mock_bbc_sounds_instance = mock_bbc_sounds.return_value
+    mock_bbc_sounds_instance.type = "playlist"
+    mock_spotify_instance = mock_spotify.return_value
+    music = [Music("artist", "title")]
+    mock_spotify_instance.stream_songs.return_value = music
+    invoke("six_music", "--stream")
+    mock_bbc_sounds_instance.get_music.assert_not_called()
+    mock_spotify_instance.stream_songs.assert_called_once_with(mock_bbc_sounds_instance.playlist_suffix,
+                                                               mock_bbc_sounds_instance.iter_music.return_value,
+                                                               ANY, ANY)
+    mock_bbc_sounds_instance.write_playlist_history.assert_called_with(music)
+
+
+@patch("bbc_meet_spotify.bbc_sounds.BBCSounds")
+@patch("bbc_meet_spotify.spotify.Spotify")
+def test_mirror_songs(mock_spotify: MagicMock, mock_bbc_sounds: MagicMock):
+    mock_bbc_sounds_instance = mock_bbc_sounds.return_value
+    mock_bbc_sounds_instance.type = "playlist"
+    mock_spotify_instance = mock_spotify.return_value
+    music = [Music("artist", "title")]
+    mock_bbc_sounds_instance.get_current_music.return_value = music
+    invoke("six_music", "--mirror")
+    mock_bbc_sounds_instance.get_music.assert_not_called()
+    mock_spotify_instance.add_songs.assert_not_called()
+    mock_spotify_instance.mirror_songs.assert_called_once_with(mock_bbc_sounds_instance.playlist_suffix, music,
+                                                               ANY, ANY)
+    mock_bbc_sounds_instance.write_playlist_history.assert_called_with(music)
+
@@ -0,0 +1,142 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+
+from bbc_meet_spotify.http_session import CachedSession
+from bbc_meet_spotify.rate_limit import CircuitOpenError
+
+
+def _response(status_code: int = 200, text: str = "", headers: dict = None) -> MagicMock:
+    response = MagicMock()
+    response.status_code = status_code
+    response.ok = status_code < 400
+    response.text = text
+    response.headers = headers or {}
+    return response
+
+
+class TestCachedSession:
+    @patch("bbc_meet_spotify.http_session.requests.Session")
+    def test_conditional_headers_sent_for_cached_page(self, mock_session: MagicMock, tmp_path):
+        mock_get = mock_session.return_value.get
+        mock_get.side_effect = [
+            _response(text="page", headers={"ETag": '"abc"', "Last-Modified": "Sat, 01 Jan 2022 00:00:00 GMT"}),
+            _response(status_code=304),
+        ]
+        session = CachedSession(tmp_path)
+
+        assert session.get("https://www.bbc.co.uk/page") == "page"
+        assert session.get("https://www.bbc.co.uk/page") == "page"
+        mock_get.assert_called_with("https://www.bbc.co.uk/page", headers={
+            "If-None-Match": '"abc"', "If-Modified-Since": "Sat, 01 Jan 2022 00:00:00 GMT"
+        }, timeout=session.timeout)
+
+    @patch("bbc_meet_spotify.http_session.requests.Session")
+    def test_fresh_page_read_from_disk(self, mock_session: MagicMock, tmp_path):
+        mock_get = mock_session.return_value.get
+        mock_get.return_value = _response(text="page", headers={"Cache-Control": "max-age=60"})
+
+        CachedSession(tmp_path).get("https://www.bbc.co.uk/page")
+        page = CachedSession(tmp_path).get("https://www.bbc.co.uk/page")
+
+        assert page == "page"
+        assert mock_get.call_count == 1
+
+    @patch("bbc_meet_spotify.http_session.requests.Session")
+    def test_modified_page_replaces_cache(self, mock_session: MagicMock, tmp_path):
+        mock_get = mock_session.return_value.get
+        mock_get.side_effect = [_response(text="old", headers={"ETag": "1"}),
+                                _response(text="new", headers={"ETag": "2"}),
+                                _response(status_code=304)]
+        session = CachedSession(tmp_path)
+
+        session.get("https://www.bbc.co.uk/page")
+        assert session.get("https://www.bbc.co.uk/page") == "new"
+        assert session.get("https://www.bbc.co.uk/page") == "new"
+
+    @patch("bbc_meet_spotify.http_session.requests.Session")
+    def test_least_recently_used_pages_evicted(self, mock_session: MagicMock, tmp_path):
+        mock_session.return_value.get.return_value = _response(text="x" * 1000, headers={"ETag": "1"})
+        session = CachedSession(tmp_path, max_cache_bytes=2500)
+
+        for page in range(3):
+            session.get(f"https://www.bbc.co.uk/{page}")
+
+        assert len(list(tmp_path.glob("*.json"))) == 2
+        assert session._read_cache("https://www.bbc.co.uk/0") is None
+        assert session._read_cache("https://www.bbc.co.uk/2") is not None
+
+    @patch("bbc_meet_spotify.http_session.requests.Session")
+    def test_overloaded_server_retried(self, mock_session: MagicMock, tmp_path):
+        mock_get = mock_session.return_value.get
+        mock_get.side_effect = [requests.Timeout(), _response(status_code=503), _response(text="page")]
+        session = CachedSession(tmp_path, backoff_seconds=0)
+
+        assert session.get("https://www.bbc.co.uk/page") == "page"
+        assert mock_get.call_count == 3
+
+    @patch("bbc_meet_spotify.http_session.requests.Session")
+    def test_error_raised_after_last_retry(self, mock_session: MagicMock, tmp_path):
+        mock_get = mock_session.return_value.get
+        mock_get.side_effect = requests.ConnectionError()
+        session = CachedSession(tmp_path, max_retries=2, backoff_seconds=0)
+
+        with pytest.raises(requests.ConnectionError):
+            session.get("https://www.bbc.co.uk/page")
+        assert mock_get.call_count == 3
+
+    @patch("bbc_meet_spotify.http_session.requests.Session")
+    def test_fails_fast_once_host_has_failed_repeatedly(self, mock_session: MagicMock, tmp_path):
+        mock_get = mock_session.return_value.get
+        mock_get.side_effect = requests.Timeout()
+        session = CachedSession(tmp_path, max_retries=0, failure_threshold=2)
+
+        for _ in range(2):
+            with pytest.raises(requests.Timeout):
+                session.get("https://www.bbc.co.uk/page")
+        with pytest.raises(CircuitOpenError):
+            session.get("https://www.bbc.co.uk/other-page")
+        assert mock_get.call_count == 2
+
+    @patch("bbc_meet_spotify.http_session.requests.Session")
+    def test_host_tried_again_after_failed_trial_request(self, mock_session: MagicMock, tmp_path):
+        mock_get = mock_session.return_value.get
+        mock_get.side_effect = [requests.Timeout(), requests.exceptions.ChunkedEncodingError(),
+                                requests.TooManyRedirects(), _response(text="page")]
+        session = CachedSession(tmp_path, max_retries=0, failure_threshold=1, reset_seconds=0)
+
+        for error in (requests.Timeout, requests.exceptions.ChunkedEncodingError, requests.TooManyRedirects):
+            with pytest.raises(error):
+                session.get("https://www.bbc.co.uk/page")
+        assert session.get("https://www.bbc.co.uk/page") == "page"
+        assert mock_get.call_count == 4
+
+    @patch("bbc_meet_spotify.http_session.requests.Session")
+    def test_out_of_date_cache_used_when_host_fails(self, mock_session: MagicMock, tmp_path):
+        mock_get = mock_session.return_value.get
+        mock_get.side_effect = [_response(text="page", headers={"ETag": "1"}), requests.Timeout()]
+        session = CachedSession(tmp_path, max_retries=0)
+
+        session.get("https://www.bbc.co.uk/page")
+        assert session.get("https://www.bbc.co.uk/page") == "page"
+
+    @patch("bbc_meet_spotify.http_session.requests.Session")
+    def test_out_of_date_cache_used_when_host_overloaded(self, mock_session: MagicMock, tmp_path):
+        mock_get = mock_session.return_value.get
+        mock_get.side_effect = [_response(text="page", headers={"ETag": "1"}), _response(503, "error page")]
+        session = CachedSession(tmp_path, max_retries=0)
+
+        session.get("https://www.bbc.co.uk/page")
+        assert session.get("https://www.bbc.co.uk/page") == "page"
+
+    @patch("bbc_meet_spotify.http_session.requests.Session")
+    def test_error_raised_when_host_overloaded_and_page_not_cached(self, mock_session: MagicMock, tmp_path):
+        mock_get = mock_session.return_value.get
+        response = _response(503, "error page")
+        response.raise_for_status.side_effect = requests.HTTPError()
+        mock_get.return_value = response
+        session = CachedSession(tmp_path, max_retries=0)
+
+        with pytest.raises(requests.HTTPError):
+            session.get("https://www.bbc.co.uk/page")
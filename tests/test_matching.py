@@ -0,0 +1,44 @@
+from bbc_meet_spotify.matching import rank_candidates
+from bbc_meet_spotify.music import Music
+
+
+def _track(name: str, *artists: str, track_id: str = None) -> dict:
+    return {"id": track_id or name, "name": name, "artists": [{"name": artist} for artist in artists]}
+
+
+def test_exact_match_ranked_above_versions():
+    candidates = [_track("Title - Radio Edit", "Artist"), _track("Title", "Artist"), _track("Title (Live)", "Artist")]
+    matches = rank_candidates(Music("Artist", "Title"), candidates)
+    assert [x.candidate["name"] for x in matches] == ["Title", "Title (Live)", "Title - Radio Edit"]
+    assert matches[0].confidence == 1.0
+
+
+def test_sanitized_forms_match_without_another_search():
+    matches = rank_candidates(Music("St. Etienne", "Dont Stop"), [_track("Don't Stop", "St Etienne")])
+    assert matches[0].confidence == 1.0
+
+
+def test_featuring_variants_match():
+    candidates = [_track("Title (feat. Someone)", "Artist", "Someone")]
+    matches = rank_candidates(Music("Artist ft. Someone", "Title"), candidates)
+    assert matches[0].confidence > 0.9
+
+
+def test_artists_listed_together_match():
+    candidates = [_track("Title", "Artist", "Other Band")]
+    matches = rank_candidates(Music("Artist & Other Band", "Title"), candidates)
+    assert matches[0].confidence == 1.0
+
+
+def test_other_artists_and_titles_rejected():
+    candidates = [_track("Title", "Karaoke Stars"), _track("Something Else", "Artist")]
+    assert rank_candidates(Music("Artist", "Title"), candidates) == []
+
+
+def test_ties_go_to_shortest_name_then_spotify_order():
+    candidates = [_track("Title Remastered 2011", "Artist", track_id="1"),
+                  _track("Title Remix", "Artist", track_id="2"),
+                  _track("Title Dub", "Artist", track_id="3"),
+                  _track("Title Mix", "Artist", track_id="4")]
+    matches = rank_candidates(Music("Artist", "Title"), candidates)
+    assert [x.candidate["id"] for x in matches] == ["3", "4", "2", "1"]
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from bbc_meet_spotify.metrics import Metrics
+
+
+class TestMetrics:
+    def setup(self):
+        self.metrics = Metrics(max_slowest=2)
+
+    def test_stage_timings_split_by_labels(self):
+        self.metrics.observe("bbc_fetch", 1.0, host="a")
+        self.metrics.observe("bbc_fetch", 3.0, host="a")
+        self.metrics.observe("bbc_fetch", 2.0, host="b")
+
+        stages = self.metrics.get_report()["stages"]
+
+        assert stages == [
+            {"stage": "bbc_fetch", "labels": {"host": "a"}, "count": 2, "total_seconds": 4.0, "max_seconds": 3.0},
+            {"stage": "bbc_fetch", "labels": {"host": "b"}, "count": 1, "total_seconds": 2.0, "max_seconds": 2.0},
+        ]
+
+    def test_timer_records_when_stage_raises(self):
+        with pytest.raises(ValueError):
+            with self.metrics.time("spotify_request", method="search"):
+                raise ValueError()
+
+        assert self.metrics.get_report()["stages"][0]["count"] == 1
+
+    def test_only_slowest_items_kept(self):
+        for seconds, url in [(1.0, "fast"), (3.0, "slowest"), (2.0, "slow"), (0.5, "fastest")]:
+            self.metrics.observe("bbc_fetch", seconds, url)
+
+        slowest = self.metrics.get_report()["slowest"]["bbc_fetch"]
+
+        assert [x["item"] for x in slowest] == ["slowest", "slow"]
+
+    def test_json_report(self, tmp_path):
+        self.metrics.increment("bbc_fetch_bytes", 100, host="a")
+        self.metrics.write_report(tmp_path / "report.json")
+
+        report = json.loads((tmp_path / "report.json").read_text())
+
+        assert report["counters"] == [{"name": "bbc_fetch_bytes", "labels": {"host": "a"}, "value": 100}]
+
+    def test_prometheus_textfile(self, tmp_path):
+        self.metrics.observe("spotify_request", 0.5, method="search")
+        self.metrics.increment("spotify_errors", method="search", status="429")
+        self.metrics.write_prometheus(tmp_path / "metrics.prom")
+
+        lines = (tmp_path / "metrics.prom").read_text().splitlines()
+
+        assert 'bbc_meet_spotify_stage_calls_total{stage="spotify_request",method="search"} 1' in lines
+        assert 'bbc_meet_spotify_stage_seconds_total{stage="spotify_request",method="search"} 0.5' in lines
+        assert 'bbc_meet_spotify_spotify_errors_total{method="search",status="429"} 1' in lines
+        assert list(tmp_path.iterdir()) == [tmp_path / "metrics.prom"]
@@ -0,0 +1,63 @@
+import random
+
+from bbc_meet_spotify.mirror import plan_mirror, reorder
+
+
+def _apply(current: list, plan) -> list:
+    playlist = list(current)
+    for position, item in plan.removals:
+        assert playlist[position] == item
+        del playlist[position]
+    for range_start, insert_before, range_length in plan.moves:
+        playlist = reorder(playlist, range_start, insert_before, range_length)
+    for position, items in plan.additions:
+        playlist[position:position] = items
+    return playlist
+
+
+def test_no_changes_when_playlist_matches():
+    plan = plan_mirror(["a", "b", "c"], ["a", "b", "c"])
+    assert plan.removals == [] and plan.moves == [] and plan.additions == []
+
+
+def test_dropped_and_repeated_items_removed_last_first():
+    plan = plan_mirror(["a", "x", "b", "a", "y"], ["a", "b"])
+    assert plan.removals == [(4, "y"), (3, "a"), (1, "x")]
+    assert plan.moves == []
+
+
+def test_unavailable_items_removed():
+    plan = plan_mirror(["a", None, "b", None], ["a", "b"])
+    assert plan.removals == [(3, None), (1, None)]
+
+
+def test_only_items_out_of_order_are_moved():
+    plan = plan_mirror(["d", "a", "b", "c"], ["a", "b", "c", "d"])
+    assert plan.moves == [(0, 4, 1)]
+
+
+def test_reorder_moves_runs_either_way():
+    assert reorder(list("abcdef"), 1, 5, 2) == list("adebcf")
+    assert reorder(list("abcdef"), 3, 0, 3) == list("defabc")
+
+
+def test_runs_of_items_moved_together():
+    current = [f"track{x}" for x in range(100)]
+    target = current[60:] + current[:60]
+    plan = plan_mirror(current, target)
+    assert plan.moves == [(60, 0, 40)]
+    assert _apply(current, plan) == target
+
+
+def test_new_items_added_in_runs():
+    plan = plan_mirror(["b", "d"], ["a", "b", "c", "x", "d", "e"])
+    assert plan.additions == [(0, ["a"]), (2, ["c", "x"]), (5, ["e"])]
+
+
+def test_plan_turns_playlist_into_target():
+    rng = random.Random(0)
+    items = [f"track{x}" for x in range(20)]
+    for _ in range(500):
+        current = [rng.choice(items) for _ in range(rng.randint(0, 15))]
+        target = rng.sample(items, rng.randint(0, 15))
+        assert _apply(current, plan_mirror(current, target)) == target
@@ -1,3 +1,5 @@
+import pickle
+
 from bbc_meet_spotify.music import Music
 
 
@@ -18,3 +20,33 @@ def test_to_string():
     music = Music("artist", "title")
     music = music.to_string()
     assert music == "artist: title"
+
+
+def test_clean_strings_matches_clean_string():
+    strings = ["Beyoncé feat. Jay-Z", "Sigur Rós", "Christine and the Queens ft. Caroline Polachek", "Sigur Rós"]
+    assert Music.clean_strings(strings) == [Music.clean_string(string) for string in strings]
+
+
+def test_clean_pairs():
+    pairs = Music.clean_pairs([("Sigur Rós", "Hoppípolla"), ("Flume ft. Toro Y Moi", "The Difference")])
+    assert pairs == [("sigur ros", "hoppipolla"), ("flume", "the difference")]
+
+
+def test_music_is_immutable():
+    music = Music("artist", "title")
+    try:
+        music.title = "other"
+        assert False
+    except AttributeError:
+        pass
+
+
+def test_equal_music_hashes_equal():
+    assert Music("Artist", "Title feat. Someone") == Music("artist", "title")
+    assert hash(Music("Artist", "Title feat. Someone")) == hash(Music("artist", "title"))
+    assert len({Music("artist", "title"), Music("ARTIST", "TITLE")}) == 1
+
+
+def test_music_can_be_pickled():
+    music = Music("artist", "title")
+    assert pickle.loads(pickle.dumps(music)) == music
@@ -0,0 +1,57 @@
+from pathlib import Path
+
+from bbc_meet_spotify.music import Music
+from bbc_meet_spotify.playlist_history import PlaylistHistory
+
+
+class TestPlaylistHistory:
+    def setup(self):
+        self.toml_history = Path(__file__).parent / "resources" / "dance_party_2021_test.toml"
+
+    def test_music_added_is_found(self, tmp_path):
+        history = PlaylistHistory(tmp_path / "history.sqlite", "playlist")
+        history.add_music([Music("Artist", "Title")])
+
+        assert history.contains("artist", "title")
+        assert not history.contains("artist", "other title")
+        assert not PlaylistHistory(tmp_path / "history.sqlite", "other playlist").contains("artist", "title")
+
+    def test_parsed_shows_kept_in_order(self, tmp_path):
+        history = PlaylistHistory(tmp_path / "history.sqlite", "playlist")
+        history.add_parsed_shows(["https://www.bbc.co.uk/programmes/2", "https://www.bbc.co.uk/programmes/1"])
+        history.add_parsed_shows(["https://www.bbc.co.uk/programmes/1", "https://www.bbc.co.uk/programmes/3"])
+
+        assert PlaylistHistory(tmp_path / "history.sqlite", "playlist").get_parsed_shows() == [
+            "https://www.bbc.co.uk/programmes/2",
+            "https://www.bbc.co.uk/programmes/1",
+            "https://www.bbc.co.uk/programmes/3",
+        ]
+
+    def test_crawled_episodes_kept_until_parsed(self, tmp_path):
+        history = PlaylistHistory(tmp_path / "history.sqlite", "playlist")
+        history.add_crawled_episode("https://www.bbc.co.uk/programmes/1", "https://www.bbc.co.uk/programmes/2",
+                                    [("Artist", "Title")])
+        history.add_crawled_episode("https://www.bbc.co.uk/programmes/2", None, [])
+
+        history = PlaylistHistory(tmp_path / "history.sqlite", "playlist")
+        assert sorted(history.get_crawled_episodes()) == [
+            ("https://www.bbc.co.uk/programmes/1", "https://www.bbc.co.uk/programmes/2", [("Artist", "Title")]),
+            ("https://www.bbc.co.uk/programmes/2", None, []),
+        ]
+        history.add_parsed_shows(["https://www.bbc.co.uk/programmes/1"])
+        assert history.get_crawled_episodes() == [("https://www.bbc.co.uk/programmes/2", None, [])]
+
+    def test_toml_history_migrated(self, tmp_path):
+        history = PlaylistHistory(tmp_path / "history.sqlite", "playlist")
+        history.migrate_toml(self.toml_history)
+
+        assert history.get_parsed_shows() == ["https://www.bbc.co.uk/programmes/m000qx9p"]
+        assert history.contains("high contrast", "remind me")
+        assert history.contains("“little” louie vega, the martinez brothers, marc e. bassy", "let it go")
+
+    def test_toml_history_only_migrated_once(self, tmp_path, caplog):
+        history = PlaylistHistory(tmp_path / "history.sqlite", "playlist")
+        history.migrate_toml(self.toml_history)
+        history.migrate_toml(self.toml_history)
+
+        assert caplog.text.count("Migrated playlist history") == 1
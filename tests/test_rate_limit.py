@@ -0,0 +1,69 @@
+from unittest.mock import patch
+
+import pytest
+
+from bbc_meet_spotify.rate_limit import CircuitBreaker, CircuitOpenError, TokenBucket
+
+
+class TestTokenBucket:
+    @patch("bbc_meet_spotify.rate_limit.time")
+    def test_waits_when_no_tokens(self, mock_time):
+        mock_time.monotonic.return_value = 0
+        mock_time.sleep.side_effect = lambda seconds: setattr(mock_time.monotonic, "return_value",
+                                                              mock_time.monotonic.return_value + seconds)
+        bucket = TokenBucket(rate=2, capacity=2)
+        for _ in range(3):
+            bucket.acquire()
+
+        mock_time.sleep.assert_called_once_with(0.5)
+
+    @patch("bbc_meet_spotify.rate_limit.time")
+    def test_pause_waits_for_retry_after(self, mock_time):
+        mock_time.monotonic.return_value = 0
+        mock_time.sleep.side_effect = lambda seconds: setattr(mock_time.monotonic, "return_value",
+                                                              mock_time.monotonic.return_value + seconds)
+        bucket = TokenBucket(rate=10)
+        bucket.pause(3)
+        bucket.acquire()
+
+        assert mock_time.monotonic.return_value >= 3
+
+
+class TestCircuitBreaker:
+    @patch("bbc_meet_spotify.rate_limit.time")
+    def test_opens_after_repeated_failures(self, mock_time):
+        mock_time.monotonic.return_value = 0
+        breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+        breaker.record_failure()
+        breaker.before_request()
+        breaker.record_failure()
+
+        with pytest.raises(CircuitOpenError):
+            breaker.before_request()
+
+    @patch("bbc_meet_spotify.rate_limit.time")
+    def test_one_trial_request_after_reset_time(self, mock_time):
+        mock_time.monotonic.return_value = 0
+        breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+        breaker.record_failure()
+        mock_time.monotonic.return_value = 30
+
+        breaker.before_request()
+        with pytest.raises(CircuitOpenError):
+            breaker.before_request()
+        breaker.record_success()
+        breaker.before_request()
+        assert not breaker.is_open
+
+    @patch("bbc_meet_spotify.rate_limit.time")
+    def test_reopens_when_trial_request_fails(self, mock_time):
+        mock_time.monotonic.return_value = 0
+        breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+        breaker.record_failure()
+        mock_time.monotonic.return_value = 30
+        breaker.before_request()
+        breaker.record_failure()
+
+        with pytest.raises(CircuitOpenError):
+            breaker.before_request()
+
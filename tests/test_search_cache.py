@@ -0,0 +1,91 @@
+import sqlite3
+import time
+from unittest.mock import patch
+
+from bbc_meet_spotify.music import Music
+from bbc_meet_spotify.search_cache import SearchCache
+
+
+class TestSearchCache:
+    def test_cached_id_persisted(self, tmp_path):
+        SearchCache(tmp_path / "cache.sqlite").set(Music("artist", "title"), "spotify-id")
+        cache = SearchCache(tmp_path / "cache.sqlite")
+
+        assert cache.get(Music("Artist", "Title")) == "spotify-id"
+        assert cache.get(Music("artist", "title"), "album") is None
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    @patch("bbc_meet_spotify.search_cache.time.time")
+    def test_expired_id_not_returned(self, mock_time):
+        mock_time.return_value = 0
+        cache = SearchCache(":memory:", ttl_days=1)
+        cache.set(Music("artist", "title"), "spotify-id")
+
+        mock_time.return_value = 24 * 60 * 60 + 1
+        assert cache.get(Music("artist", "title")) is None
+
+    @patch("bbc_meet_spotify.search_cache.time.time")
+    def test_least_recently_used_evicted(self, mock_time):
+        cache = SearchCache(":memory:", max_entries=2)
+        for timestamp, title in enumerate(["one", "two"]):
+            mock_time.return_value = timestamp
+            cache.set(Music("artist", title), title)
+        mock_time.return_value = 2
+        cache.get(Music("artist", "one"))
+        mock_time.return_value = 3
+        cache.set(Music("artist", "three"), "three")
+
+        assert cache.get(Music("artist", "one")) == "one"
+        assert cache.get(Music("artist", "two")) is None
+        assert cache.get(Music("artist", "three")) == "three"
+
+    def test_songs_counted_by_artist(self):
+        cache = SearchCache(":memory:")
+        cache.set(Music("artist", "one"), "1")
+        cache.set(Music("artist", "two"), "2")
+        cache.set(Music("artist", "album"), "3", "album")
+        cache.set(Music("other", "one"), "4")
+
+        assert cache.count_songs_by_artist(["artist", "other", "missing"]) == {"artist": 2, "other": 1}
+
+    @patch("bbc_meet_spotify.search_cache.time.time")
+    def test_artist_catalog_expires(self, mock_time):
+        mock_time.return_value = 0
+        cache = SearchCache(":memory:", catalog_ttl_days=1)
+        cache.set_artist_catalog("artist", [{"id": "1", "name": "title", "artists": [{"name": "artist"}]}])
+        cache.set_artist_catalog("missing artist", [])
+
+        assert cache.get_artist_catalogs(["artist", "missing artist", "other"]) == {
+            "artist": [{"id": "1", "name": "title", "artists": [{"name": "artist"}]}], "missing artist": []
+        }
+        mock_time.return_value = 24 * 60 * 60 + 1
+        assert cache.get_artist_catalogs(["artist"]) == {}
+
+    @patch("bbc_meet_spotify.search_cache.time.time")
+    def test_least_recently_used_catalogs_and_albums_evicted(self, mock_time):
+        cache = SearchCache(":memory:", max_entries=2, max_catalogs=2)
+        for timestamp, name in enumerate(["one", "two"]):
+            mock_time.return_value = timestamp
+            cache.set_artist_catalog(name, [])
+            cache.set_album_track_ids({name: [name]})
+        mock_time.return_value = 2
+        cache.get_artist_catalogs(["one"])
+        cache.get_album_track_ids(["one"])
+        mock_time.return_value = 3
+        cache.set_artist_catalog("three", [])
+        cache.set_album_track_ids({"three": ["three"]})
+
+        assert list(cache.get_artist_catalogs(["one", "two", "three"])) == ["one", "three"]
+        assert cache.get_album_track_ids(["one", "two", "three"]) == {"one": ["one"], "three": ["three"]}
+
+    def test_catalogs_cached_before_eviction_are_kept(self, tmp_path):
+        connection = sqlite3.connect(str(tmp_path / "cache.sqlite"))
+        with connection:
+            connection.execute("CREATE TABLE artist_catalogs (artist TEXT PRIMARY KEY, tracks TEXT NOT NULL, "
+                               "created REAL NOT NULL)")
+            connection.execute("INSERT INTO artist_catalogs VALUES ('artist', '[]', ?)", (time.time(),))
+        connection.close()
+
+        cache = SearchCache(tmp_path / "cache.sqlite")
+
+        assert cache.get_artist_catalogs(["artist"]) == {"artist": []}
@@ -32,15 +32,30 @@ class TestSpotify:
         mock_spotipy_client_instance = mock_spotipy_client.return_value
         mock_spotipy_client_instance.get_playlist.return_value = {"id": "1"}
         mock_spotipy_client_instance.get_album.side_effect = [{"id": "1"}, {"id": "2"}]
-        mock_spotipy_client_instance.add_music_to_playlist.side_effect = [None, None]
+        mock_spotipy_client_instance.get_album_track_ids.return_value = {"1": ["a", "b"], "2": ["c"]}
+        mock_spotipy_client_instance.add_music_to_playlist.return_value = None
         spotify = Spotify()
         album1 = Music("artist1", "title1")
         album2 = Music("artist2", "title2")
         spotify.add_albums("test-playlist-name", [album1, album2])
         mock_spotipy_client_instance.get_album.assert_has_calls([call(album1), call(album2)])
-        assert mock_spotipy_client_instance.add_music_to_playlist.call_count == 2
+        mock_spotipy_client_instance.get_album_track_ids.assert_called_once_with(["1", "2"])
+        mock_spotipy_client_instance.add_music_to_playlist.assert_called_once_with("1", ["a", "b", "c"])
         assert spotify.music_not_found == []
 
+    @patch("bbc_meet_spotify.spotify.SpotipyClient")
+    def test_add_albums_continues_after_missing_album(self, mock_spotipy_client: MagicMock):
+        mock_spotipy_client_instance = mock_spotipy_client.return_value
+        mock_spotipy_client_instance.get_playlist.return_value = {"id": "1"}
+        mock_spotipy_client_instance.get_album.side_effect = [MusicNotFoundError(), {"id": "2"}]
+        mock_spotipy_client_instance.get_album_track_ids.return_value = {"2": ["c"]}
+        spotify = Spotify()
+        spotify.search_cache.set_album_track_ids({"2": ["cached"]})
+        spotify.add_albums("test-playlist-name", [Music("artist1", "title1"), Music("artist2", "title2")])
+        mock_spotipy_client_instance.get_album_track_ids.assert_not_called()
+        mock_spotipy_client_instance.add_music_to_playlist.assert_called_once_with("1", ["cached"])
+        assert spotify.music_not_found == ["artist1: title1"]
+
     @patch("bbc_meet_spotify.spotify.SpotipyClient")
     def test_add_songs(self, mock_spotipy_client: MagicMock):
         mock_spotipy_client_instance = mock_spotipy_client.return_value
@@ -58,26 +73,120 @@ class TestSpotify:
         assert spotify.music_not_found == []
 
     @patch("bbc_meet_spotify.spotify.SpotipyClient")
-    def test_add_songs_sanitizes_input(self, mock_spotipy_client: MagicMock):
+    def test_add_songs_searches_once_when_not_found(self, mock_spotipy_client: MagicMock):
         mock_spotipy_client_instance = mock_spotipy_client.return_value
         mock_spotipy_client_instance.get_playlist.return_value = {"id": "1"}
-        mock_spotipy_client_instance.get_song.side_effect = [MusicNotFoundError(), "1"]
+        mock_spotipy_client_instance.get_song.side_effect = [MusicNotFoundError()]
         spotify = Spotify()
-        unsanitized_music = Music("artist'1", " title1 ")
-        sanitized_music = Music("artist1", "title1")
+        unsanitized_music = Music("artist'1", "title1")
         spotify.add_songs("test-playlist-name", [unsanitized_music])
-        mock_spotipy_client_instance.get_song.assert_has_calls([call(unsanitized_music), call(sanitized_music)])
-        mock_spotipy_client_instance.add_music_to_playlist.assert_called_with("1", ["1"])
-        assert spotify.music_not_found == []
+        mock_spotipy_client_instance.get_song.assert_called_once_with(unsanitized_music)
+        assert spotify.music_not_found == ["artist'1: title1"]
 
     @patch("bbc_meet_spotify.spotify.SpotipyClient")
     def test_add_songs_exception(self, mock_spotipy_client: MagicMock):
         mock_spotipy_client_instance = mock_spotipy_client.return_value
         mock_spotipy_client_instance.get_playlist.return_value = {"id": "1"}
-        mock_spotipy_client_instance.get_song.side_effect = [MusicNotFoundError(), MusicNotFoundError()]
+        mock_spotipy_client_instance.get_song.side_effect = [MusicNotFoundError()]
         spotify = Spotify()
         song1 = Music("artist1", "title1")
         spotify.add_songs("test-playlist-name", [song1])
-        mock_spotipy_client_instance.get_song.assert_called_with(song1)
+        mock_spotipy_client_instance.get_song.assert_called_once_with(song1)
         mock_spotipy_client_instance.add_music_to_playlist.assert_not_called()
         assert spotify.music_not_found == ["artist1: title1"]
+
+    @patch("bbc_meet_spotify.spotify.SpotipyClient")
+    def test_add_songs_uses_search_cache(self, mock_spotipy_client: MagicMock):
+        mock_spotipy_client_instance = mock_spotipy_client.return_value
+        mock_spotipy_client_instance.get_playlist.return_value = {"id": "1"}
+        mock_spotipy_client_instance.get_song.side_effect = [{"id": "2"}]
+        spotify = Spotify()
+        search_cache = spotify.search_cache
+        search_cache.set(Music("artist1", "title1"), "1")
+        song1 = Music("artist1", "title1")
+        song2 = Music("artist2", "title2")
+        spotify.add_songs("test-playlist-name", [song1, song2])
+        mock_spotipy_client_instance.get_song.assert_called_once_with(song2)
+        mock_spotipy_client_instance.add_music_to_playlist.assert_called_with("1", ["1", "2"])
+        assert search_cache.get(song2) == "2"
+
+    @patch("bbc_meet_spotify.spotify.SpotipyClient")
+    def test_add_songs_concurrently_keeps_order(self, mock_spotipy_client: MagicMock):
+        mock_spotipy_client_instance = mock_spotipy_client.return_value
+        mock_spotipy_client_instance.get_playlist.return_value = {"id": "1"}
+        mock_spotipy_client_instance.get_song.side_effect = lambda song: {"id": song.title}
+        mock_spotipy_client_instance.get_artist_catalog.return_value = []
+        spotify = Spotify(max_workers=4)
+        songs = [Music("artist", f"title{i}") for i in range(20)]
+        spotify.add_songs("test-playlist-name", songs)
+        mock_spotipy_client_instance.add_music_to_playlist.assert_called_with("1", [f"title{i}" for i in range(20)])
+
+    @patch("bbc_meet_spotify.spotify.SpotipyClient")
+    def test_add_songs_matches_artist_catalog(self, mock_spotipy_client: MagicMock):
+        mock_spotipy_client_instance = mock_spotipy_client.return_value
+        mock_spotipy_client_instance.get_playlist.return_value = {"id": "1"}
+        mock_spotipy_client_instance.get_artist_catalog.return_value = [
+            {"id": "a", "name": "Title A", "artists": [{"name": "Artist"}]},
+            {"id": "b", "name": "Title B - Radio Edit", "artists": [{"name": "Artist"}]},
+        ]
+        mock_spotipy_client_instance.get_song.side_effect = [{"id": "c"}, {"id": "other"}, {"id": "d"}]
+        spotify = Spotify(min_songs_for_catalog=2)
+        songs = [Music("artist", "title a"), Music("artist", "title b"), Music("artist", "title c"),
+                 Music("other", "title")]
+        spotify.add_songs("test-playlist-name", songs)
+        spotify.add_songs("test-playlist-name", [Music("artist", "title d")])
+        mock_spotipy_client_instance.get_artist_catalog.assert_called_once_with("artist")
+        mock_spotipy_client_instance.get_song.assert_has_calls([call(songs[2]), call(songs[3]),
+                                                               call(Music("artist", "title d"))])
+        mock_spotipy_client_instance.add_music_to_playlist.assert_any_call("1", ["a", "b", "c", "other"])
+
+    @patch("bbc_meet_spotify.spotify.SpotipyClient")
+    def test_artist_catalog_fetched_for_artist_across_playlists(self, mock_spotipy_client: MagicMock):
+        mock_spotipy_client_instance = mock_spotipy_client.return_value
+        mock_spotipy_client_instance.get_playlist.return_value = {"id": "1"}
+        mock_spotipy_client_instance.get_song.side_effect = lambda song: {"id": song.title}
+        mock_spotipy_client_instance.get_artist_catalog.return_value = [
+            {"id": f"title {x}", "name": f"Title {x}", "artists": [{"name": "Artist"}]} for x in range(6)
+        ]
+        spotify = Spotify()
+        for playlist in range(3):
+            spotify.add_songs(f"playlist {playlist}", [Music("artist", f"title {playlist * 2 + x}") for x in range(2)])
+        mock_spotipy_client_instance.get_artist_catalog.assert_called_once_with("artist")
+        assert mock_spotipy_client_instance.get_song.call_count == 4
+        mock_spotipy_client_instance.add_music_to_playlist.assert_called_with("1", ["title 4", "title 5"])
+
+    @patch("bbc_meet_spotify.spotify.SpotipyClient")
+    def test_stream_songs_adds_full_requests_as_batches_are_found(self, mock_spotipy_client: MagicMock):
+        mock_spotipy_client_instance = mock_spotipy_client.return_value
+        mock_spotipy_client_instance.get_playlist.return_value = {"id": "1"}
+        mock_spotipy_client_instance.get_song.side_effect = lambda song: {"id": song.title}
+        mock_spotipy_client_instance.get_artist_catalog.return_value = []
+        spotify = Spotify()
+        batches = [[Music(f"artist{i}", f"title{i}") for i in range(start, start + 60)] for start in (0, 60, 120)]
+        songs = spotify.stream_songs("test-playlist-name", iter(batches))
+        assert songs == batches[0] + batches[1] + batches[2]
+        assert mock_spotipy_client_instance.add_music_to_playlist.call_args_list == [
+            call("1", [f"title{i}" for i in range(100)]),
+            call("1", [f"title{i}" for i in range(100, 180)]),
+        ]
+
+    @patch("bbc_meet_spotify.spotify.SpotipyClient")
+    def test_mirror_songs(self, mock_spotipy_client: MagicMock):
+        mock_spotipy_client_instance = mock_spotipy_client.return_value
+        mock_spotipy_client_instance.get_playlist.return_value = {"id": "1"}
+        mock_spotipy_client_instance.get_song.side_effect = [{"id": "2"}, MusicNotFoundError(), {"id": "1"}]
+        spotify = Spotify()
+        spotify.mirror_songs("test-playlist-name", [Music("artist2", "title2"), Music("artist3", "title3"),
+                                                    Music("artist1", "title1")])
+        mock_spotipy_client_instance.mirror_playlist.assert_called_once_with("1", ["2", "1"])
+        assert spotify.music_not_found == ["artist3: title3"]
+
+    @patch("bbc_meet_spotify.spotify.SpotipyClient")
+    def test_mirror_leaves_playlist_when_nothing_found(self, mock_spotipy_client: MagicMock):
+        mock_spotipy_client_instance = mock_spotipy_client.return_value
+        mock_spotipy_client_instance.get_playlist.return_value = {"id": "1"}
+        mock_spotipy_client_instance.get_song.side_effect = [MusicNotFoundError()]
+        spotify = Spotify()
+        spotify.mirror_songs("test-playlist-name", [Music("artist1", "title1")])
+        mock_spotipy_client_instance.mirror_playlist.assert_not_called()
+
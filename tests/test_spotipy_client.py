@@ -3,9 +3,13 @@ import time
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
+from spotipy import SpotifyException
+
 from bbc_meet_spotify import MusicNotFoundError
+from bbc_meet_spotify.metrics import get_metrics
 from bbc_meet_spotify.music import Music
 from bbc_meet_spotify.spotipy_client import SpotipyClient
+from tests.fake_spotify import FakeSpotifyCatalog, FakeSpotifyServer
 
 
 def _read_file_as_json(file_path: str) -> json:
@@ -118,12 +122,12 @@ class TestSpotipyClient:
         mock_spotify_client_instance.search.return_value = _read_file_as_json(
             f"{self.resources_}/spotipy/input/search.json")
         spotipy_client = SpotipyClient(config_path=self.config)
-        track_id = spotipy_client.get_song(Music("artist", "title"))
+        track_id = spotipy_client.get_song(Music("string", "title"))
         mock_auth_manager.assert_called_with(client_id="test-client",
                                              client_secret="test-secret",
                                              redirect_uri="http://localhost:8888",
                                              scope="playlist-modify-private playlist-modify-public")
-        mock_spotify_client_instance.search.assert_called_with(q="artist:artist track:title")
+        mock_spotify_client_instance.search.assert_called_once_with(q="artist:string track:title", limit=50)
         assert track_id == _read_file_as_json(
             f"{self.resources_}/spotipy/output/get_song.json")
 
@@ -168,13 +172,13 @@ class TestSpotipyClient:
         mock_spotify_client_instance.search.return_value = _read_file_as_json(
             f"{self.resources_}/spotipy/input/search.json")
         spotipy_client = SpotipyClient(config_path=self.config)
-        tracks = spotipy_client.get_album(Music("title", "artist"))
+        album = spotipy_client.get_album(Music("string", "match"))
         mock_auth_manager.assert_called_with(client_id="test-client",
                                              client_secret="test-secret",
                                              redirect_uri="http://localhost:8888",
                                              scope="playlist-modify-private playlist-modify-public")
-        mock_spotify_client_instance.search.assert_called_with(q="artist:title album:artist")
-        assert tracks == _read_file_as_json(
+        mock_spotify_client_instance.search.assert_called_with(q="artist:string album:match", type="album")
+        assert album == _read_file_as_json(
             f"{self.resources_}/spotipy/output/get_album.json")
 
     @patch("bbc_meet_spotify.spotipy_client.SpotifyOAuth")
@@ -193,3 +197,233 @@ class TestSpotipyClient:
                                                  scope="playlist-modify-private playlist-modify-public")
         except MusicNotFoundError:
             pass
+
+    @patch("bbc_meet_spotify.spotipy_client.SpotifyOAuth")
+    @patch("bbc_meet_spotify.spotipy_client.spotipy.Spotify")
+    def test_get_album_with_punctuation_and_accents(self, mock_spotify_client: MagicMock,
+                                                    mock_auth_manager: MagicMock):
+        spotipy_client = SpotipyClient(config_path=self.config)
+        for name in ["Welfare Jazz (Deluxe)", "Hoppípolla", "Songs: Ohia"]:
+            albums = [{"id": "other", "name": "Something Else"}, {"id": "album", "name": name}]
+            mock_spotify_client.return_value.search.return_value = {"albums": {"items": albums}}
+
+            assert spotipy_client.get_album(Music("artist", name))["id"] == "album"
+
+    @patch("bbc_meet_spotify.spotipy_client.SpotifyOAuth")
+    @patch("bbc_meet_spotify.spotipy_client.spotipy.Spotify")
+    @patch("bbc_meet_spotify.spotipy_client.TokenBucket")
+    def test_rate_limited_request_retried_after_pause(self, mock_token_bucket: MagicMock,
+                                                      mock_spotify_client: MagicMock, mock_auth_manager: MagicMock):
+        mock_spotify_client_instance = mock_spotify_client.return_value
+        mock_spotify_client_instance.search.side_effect = [
+            SpotifyException(429, -1, "rate limited", headers={"Retry-After": "2"}),
+            _read_file_as_json(f"{self.resources_}/spotipy/input/search.json"),
+        ]
+        spotipy_client = SpotipyClient(config_path=self.config)
+        track = spotipy_client.get_song(Music("string", "title"))
+        mock_token_bucket.return_value.pause.assert_called_once_with(2)
+        assert mock_spotify_client_instance.search.call_count == 2
+        assert track == _read_file_as_json(f"{self.resources_}/spotipy/output/get_song.json")
+
+    @patch("bbc_meet_spotify.spotipy_client.SpotifyOAuth")
+    @patch("bbc_meet_spotify.spotipy_client.spotipy.Spotify")
+    def test_get_playlist_reads_every_page_of_playlists(self, mock_spotify_client: MagicMock,
+                                                        mock_auth_manager: MagicMock):
+        mock_spotify_client_instance = mock_spotify_client.return_value
+        mock_spotify_client_instance.user_playlists.side_effect = [
+            {"items": [{"name": f"playlist-{i}", "id": str(i)} for i in range(50)], "total": 60},
+            {"items": [{"name": f"playlist-{i}", "id": str(i)} for i in range(50, 60)], "total": 60},
+        ]
+        spotipy_client = SpotipyClient(config_path=self.config)
+        playlist = spotipy_client.get_playlist("playlist-55", False)
+        assert playlist == {"name": "playlist-55", "id": "55"}
+        assert spotipy_client.get_playlist("playlist-3", False) == {"name": "playlist-3", "id": "3"}
+        assert mock_spotify_client_instance.user_playlists.call_count == 2
+        mock_spotify_client_instance.user_playlist_create.assert_not_called()
+
+    @patch("bbc_meet_spotify.spotipy_client.SpotifyOAuth")
+    @patch("bbc_meet_spotify.spotipy_client.spotipy.Spotify")
+    def test_get_playlist_uses_cached_playlists(self, mock_spotify_client: MagicMock,
+                                                mock_auth_manager: MagicMock, tmp_path):
+        mock_spotify_client_instance = mock_spotify_client.return_value
+        mock_spotify_client_instance.current_user.return_value = {"display_name": "bbc_meet_spotify"}
+        mock_spotify_client_instance.user_playlists.return_value = {"items": [], "total": 0}
+        mock_spotify_client_instance.user_playlist_create.return_value = {"name": "new-playlist", "id": "1"}
+        SpotipyClient(config_path=self.config, cache_dir=tmp_path).get_playlist("new-playlist", False)
+
+        playlist = SpotipyClient(config_path=self.config, cache_dir=tmp_path).get_playlist("new-playlist", False)
+        assert playlist == {"name": "new-playlist", "id": "1"}
+        assert mock_spotify_client_instance.user_playlists.call_count == 1
+        assert mock_spotify_client_instance.user_playlist_create.call_count == 1
+
+    @patch("bbc_meet_spotify.spotipy_client.SpotifyOAuth")
+    @patch("bbc_meet_spotify.spotipy_client.spotipy.Spotify")
+    def test_add_music_to_playlist_reads_all_pages_and_adds_in_chunks(self, mock_spotify_client: MagicMock,
+                                                                      mock_auth_manager: MagicMock):
+        mock_spotify_client_instance = mock_spotify_client.return_value
+        mock_spotify_client_instance.playlist.return_value = {"snapshot_id": "snapshot-1"}
+        mock_spotify_client_instance.playlist_items.side_effect = [
+            {"items": [{"track": {"id": str(i)}} for i in range(100)]},
+            {"items": [{"track": {"id": str(i)}} for i in range(100, 150)] + [{"track": None}]},
+        ]
+        mock_spotify_client_instance.playlist_add_items.return_value = {"snapshot_id": "snapshot-2"}
+        spotipy_client = SpotipyClient(config_path=self.config)
+        spotipy_client.add_music_to_playlist("test-playlist-id", [str(i) for i in range(140, 400)])
+        mock_spotify_client_instance.playlist.assert_called_with("test-playlist-id", fields="snapshot_id")
+        assert mock_spotify_client_instance.playlist_items.call_count == 2
+        add_items_calls = mock_spotify_client_instance.playlist_add_items.call_args_list
+        assert [len(x.args[1]) for x in add_items_calls] == [100, 100, 50]
+        assert add_items_calls[0].args[1][0] == "150"
+
+    @patch("bbc_meet_spotify.spotipy_client.SpotifyOAuth")
+    @patch("bbc_meet_spotify.spotipy_client.spotipy.Spotify")
+    def test_add_music_to_playlist_uses_cache_for_unchanged_snapshot(self, mock_spotify_client: MagicMock,
+                                                                     mock_auth_manager: MagicMock, tmp_path):
+        mock_spotify_client_instance = mock_spotify_client.return_value
+        mock_spotify_client_instance.current_user.return_value = {"display_name": "bbc_meet_spotify"}
+        mock_spotify_client_instance.playlist.side_effect = [{"snapshot_id": "snapshot-1"},
+                                                             {"snapshot_id": "snapshot-2"}]
+        mock_spotify_client_instance.playlist_items.return_value = {"items": [{"track": {"id": "1"}}]}
+        mock_spotify_client_instance.playlist_add_items.return_value = {"snapshot_id": "snapshot-2"}
+        SpotipyClient(config_path=self.config, cache_dir=tmp_path).add_music_to_playlist("test-playlist-id", ["2"])
+
+        spotipy_client = SpotipyClient(config_path=self.config, cache_dir=tmp_path)
+        spotipy_client.add_music_to_playlist("test-playlist-id", ["1", "2"])
+        assert mock_spotify_client_instance.playlist_items.call_count == 1
+        assert mock_spotify_client_instance.playlist_add_items.call_count == 1
+
+    @patch("bbc_meet_spotify.spotipy_client.SpotifyOAuth")
+    @patch("bbc_meet_spotify.spotipy_client.spotipy.Spotify")
+    def test_get_album_track_ids_in_batches_with_pagination(self, mock_spotify_client: MagicMock,
+                                                            mock_auth_manager: MagicMock):
+        mock_spotify_client_instance = mock_spotify_client.return_value
+        mock_spotify_client_instance.albums.side_effect = lambda album_ids: {"albums": [
+            {"id": album_id, "tracks": {"items": [{"id": f"{album_id}-1"}], "total": 2 if album_id == "0" else 1}}
+            for album_id in album_ids
+        ]}
+        mock_spotify_client_instance.album_tracks.return_value = {"items": [{"id": "0-2"}]}
+        spotipy_client = SpotipyClient(config_path=self.config)
+        album_track_ids = spotipy_client.get_album_track_ids([str(i) for i in range(25)])
+        assert mock_spotify_client_instance.albums.call_count == 2
+        mock_spotify_client_instance.album_tracks.assert_called_once_with("0", limit=50, offset=1)
+        assert album_track_ids["0"] == ["0-1", "0-2"]
+        assert album_track_ids["24"] == ["24-1"]
+
+
+class TestSpotipyClientWithFakeSpotify:
+    def setup(self):
+        self.fake_spotify = FakeSpotifyServer(FakeSpotifyCatalog(1000, playlists=120)).start()
+
+    def teardown(self):
+        self.fake_spotify.stop()
+
+    def spotipy_client(self, tmp_path) -> SpotipyClient:
+        config = tmp_path / "config.toml"
+        config.write_text(f'api_url = "{self.fake_spotify.url}"\n')
+        return SpotipyClient(config_path=config, requests_per_second=1000)
+
+    def test_existing_playlist_found_on_later_page(self, tmp_path):
+        playlist = self.spotipy_client(tmp_path).get_playlist("playlist 110", add_date_prefix=False)
+
+        assert playlist["id"] == "playlist110"
+        assert self.fake_spotify.request_counts["GET /v1/users/fake-user/playlists"] == 3
+        assert self.fake_spotify.request_counts["POST /v1/users/fake-user/playlists"] == 0
+
+    def test_songs_added_in_chunks(self, tmp_path):
+        spotipy_client = self.spotipy_client(tmp_path)
+        playlist_id = spotipy_client.get_playlist("new playlist", add_date_prefix=False)["id"]
+        song_ids = [spotipy_client.get_song(Music(f"artist {x // 20}", f"title {x}"))["id"] for x in range(250)]
+
+        spotipy_client.add_music_to_playlist(playlist_id, song_ids)
+
+        assert self.fake_spotify.catalog.playlists[playlist_id]["tracks"] == song_ids
+        assert self.fake_spotify.request_counts["POST /v1/playlists/id/tracks"] == 3
+
+    def test_playlist_mirrored_with_minimal_changes(self, tmp_path):
+        spotipy_client = self.spotipy_client(tmp_path)
+        playlist_id = spotipy_client.get_playlist("new playlist", add_date_prefix=False)["id"]
+        tracks = self.fake_spotify.catalog.playlists[playlist_id]["tracks"]
+        tracks.extend(f"track{x}" for x in range(150))
+        # drop the first 120 tracks, move one track and add 110 new tracks in two places
+        target = ["track149"] + [f"track{x}" for x in range(120, 149)] + [f"track{x}" for x in range(200, 310)]
+        target.insert(5, "track500")
+
+        plan = spotipy_client.mirror_playlist(playlist_id, target)
+
+        assert self.fake_spotify.catalog.playlists[playlist_id]["tracks"] == target
+        assert len(plan.removals) == 120
+        assert plan.moves == [(29, 0, 1)]
+        assert self.fake_spotify.request_counts["DELETE /v1/playlists/id/tracks"] == 2
+        assert self.fake_spotify.request_counts["PUT /v1/playlists/id/tracks"] == 1
+        assert self.fake_spotify.request_counts["POST /v1/playlists/id/tracks"] == 3
+
+    def test_playlist_mirror_moves_runs_in_one_request(self, tmp_path):
+        spotipy_client = self.spotipy_client(tmp_path)
+        playlist_id = spotipy_client.get_playlist("new playlist", add_date_prefix=False)["id"]
+        tracks = self.fake_spotify.catalog.playlists[playlist_id]["tracks"]
+        tracks.extend(f"track{x}" for x in range(150))
+        target = tracks[100:] + tracks[:100]
+
+        plan = spotipy_client.mirror_playlist(playlist_id, target)
+
+        assert self.fake_spotify.catalog.playlists[playlist_id]["tracks"] == target
+        assert plan.moves == [(100, 0, 50)]
+        assert self.fake_spotify.request_counts["PUT /v1/playlists/id/tracks"] == 1
+
+    def test_playlist_with_unavailable_songs_mirrored(self, tmp_path):
+        spotipy_client = self.spotipy_client(tmp_path)
+        playlist_id = spotipy_client.get_playlist("new playlist", add_date_prefix=False)["id"]
+        tracks = self.fake_spotify.catalog.playlists[playlist_id]["tracks"]
+        tracks.extend(f"track{x}" for x in range(150))
+        tracks[3] = None
+        target = [f"track{x}" for x in range(149, 0, -1)]
+
+        plan = spotipy_client.mirror_playlist(playlist_id, target)
+
+        assert self.fake_spotify.catalog.playlists[playlist_id]["tracks"] == target
+        assert len(plan.removals) == 150 and plan.moves == [] and plan.additions == [(0, target)]
+        assert self.fake_spotify.request_counts["PUT /v1/playlists/id/tracks"] == 1
+        assert self.fake_spotify.request_counts["POST /v1/playlists/id/tracks"] == 1
+        assert self.fake_spotify.request_counts["DELETE /v1/playlists/id/tracks"] == 0
+
+    def test_album_tracks(self, tmp_path):
+        spotipy_client = self.spotipy_client(tmp_path)
+        album_id = spotipy_client.get_album(Music("artist 1", "album 3"))["id"]
+
+        assert spotipy_client.get_album_track_ids([album_id]) == {"album3": [f"track{x}" for x in range(30, 40)]}
+
+    def test_artist_catalog(self, tmp_path):
+        catalog = self.spotipy_client(tmp_path).get_artist_catalog("artist 2")
+
+        assert sorted(track["id"] for track in catalog) == sorted(f"track{x}" for x in range(40, 60))
+        assert catalog[0] == {"id": "track40", "name": "title 40", "artists": [{"name": "artist 2"}]}
+
+    def test_artist_catalog_requests_limited(self, tmp_path):
+        self.fake_spotify.stop()
+        catalog = FakeSpotifyCatalog(1000)
+        catalog.artists["artist0"]["albums"] = list(catalog.albums.values())
+        self.fake_spotify = FakeSpotifyServer(catalog).start()
+        spotipy_client = self.spotipy_client(tmp_path)
+        requests = self.fake_spotify.request_counts["total"]
+
+        tracks = spotipy_client.get_artist_catalog("artist 0")
+
+        assert self.fake_spotify.request_counts["total"] - requests == 4
+        assert len(tracks) == 10 * SpotipyClient.artist_catalog_albums
+
+    def test_artist_catalog_empty_when_artist_not_found(self, tmp_path):
+        assert self.spotipy_client(tmp_path).get_artist_catalog("artist 2 and artist 3") == []
+
+    def test_rate_limited_requests_retried(self, tmp_path):
+        self.fake_spotify.rate_limit_every = 2
+        self.fake_spotify.retry_after = 0
+        spotipy_client = self.spotipy_client(tmp_path)
+
+        get_metrics().reset()
+
+        songs = [spotipy_client.get_song(Music("artist 0", f"title {x}")) for x in range(5)]
+
+        assert [song["id"] for song in songs] == [f"track{x}" for x in range(5)]
+        rate_limited = [x for x in get_metrics().get_report()["counters"] if x["name"] == "spotify_errors"]
+        assert rate_limited == [{"name": "spotify_errors", "labels": {"method": "search", "status": "429"},
+                                 "value": self.fake_spotify.rate_limited}]
@@ -0,0 +1,39 @@
+from unittest.mock import MagicMock
+
+from bbc_meet_spotify.watch import PlaylistWatcher
+
+
+def _bbc_sounds(name: str, fingerprints: list) -> MagicMock:
+    bbc_sounds = MagicMock(playlist_suffix=name, playlist={"poll_minutes": 0})
+    bbc_sounds.get_page_fingerprint.side_effect = fingerprints
+    return bbc_sounds
+
+
+class TestPlaylistWatcher:
+    def test_only_changed_pages_synced(self):
+        bbc_sounds = _bbc_sounds("playlist", ["a", "a", "b"])
+        sync = MagicMock()
+        PlaylistWatcher([bbc_sounds], sync).run(max_polls=3)
+
+        assert sync.call_count == 2
+
+    def test_shows_synced_every_poll(self):
+        bbc_sounds = _bbc_sounds("show", [None, None])
+        sync = MagicMock()
+        PlaylistWatcher([bbc_sounds], sync).run(max_polls=2)
+
+        assert sync.call_count == 2
+
+    def test_failed_sync_retried_next_poll(self):
+        bbc_sounds = _bbc_sounds("playlist", ["a", "a", "a"])
+        sync = MagicMock(side_effect=[ValueError(), None, None])
+        PlaylistWatcher([bbc_sounds], sync).run(max_polls=3)
+
+        assert sync.call_count == 2
+
+    def test_each_playlist_polled(self):
+        playlists = [_bbc_sounds("one", ["a"]), _bbc_sounds("two", ["a"])]
+        sync = MagicMock()
+        PlaylistWatcher(playlists, sync, interval_minutes=60).run(max_polls=2)
+
+        assert [x.args[0] for x in sync.call_args_list] == playlists